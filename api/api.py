@@ -1,7 +1,25 @@
-from flask import Flask, jsonify, request
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import psycopg2
-from psycopg2.extras import RealDictCursor
+
+from batch import (COMMENTS_INSERT_SQL, MAINTENANCE_INSERT_SQL, TREES_INSERT_SQL, TREES_TEMPLATE, Batch,
+                   comment_row, maintenance_row, tree_row)
+from columnar import MIMETYPES as COLUMNAR_MIMETYPES, columnar_chunks
+from dossier import dossier_ids, read_dossiers, section_limits
+from db_pool import ConnectionPool, PoolError
+from metrics import TimedCursor, api_metrics
+from pagination import Page
+from parishes import read_parishes, zoom_level
+from response_cache import DataVersions, ResponseCache
+from spatial import NEAR_WHERE, NEAREST_SQL, nearest_params, neighbour_count, search_point, search_radius
+from streaming import STREAM_ITERSIZE, feature_collection_chunks, primed
+from tiles import TileCache, tile_query, valid_tile
 
 app = Flask(__name__)
 CORS(app)
@@ -15,33 +33,197 @@ DB_CONFIG = {
     "port": "5432"
 }
 
+# Connection pool configuration (override through environment variables)
+POOL_CONFIG = {
+    "minconn": int(os.environ.get("GREENGRID_POOL_MIN", 1)),
+    "maxconn": int(os.environ.get("GREENGRID_POOL_MAX", 10)),
+    "max_uses": int(os.environ.get("GREENGRID_POOL_MAX_USES", 1000)),       # checkouts before a connection is recycled
+    "max_lifetime": float(os.environ.get("GREENGRID_POOL_MAX_LIFETIME", 1800)),  # seconds before a connection is recycled
+    "timeout": float(os.environ.get("GREENGRID_POOL_TIMEOUT", 5)),          # seconds a request waits for a connection
+    "max_waiting": int(os.environ.get("GREENGRID_POOL_MAX_WAITING", 50)),   # requests allowed to queue for a connection
+    "ping_after": float(os.environ.get("GREENGRID_POOL_PING_AFTER", 30)),   # idle seconds before a health-check ping
+}
+
+# Vector tile cache bounds (override through environment variables)
+TILE_CACHE_CONFIG = {
+    "max_entries": int(os.environ.get("GREENGRID_TILE_CACHE_ENTRIES", 10000)),
+    "max_bytes": int(os.environ.get("GREENGRID_TILE_CACHE_BYTES", 64 * 1024 * 1024)),
+}
+
+# Rows per server-side cursor round trip when streaming GeoJSON
+STREAM_CONFIG = {
+    "itersize": int(os.environ.get("GREENGRID_STREAM_ITERSIZE", STREAM_ITERSIZE)),
+}
+
+# Response cache bounds and how often table generations are re-read (override through environment variables)
+RESPONSE_CACHE_CONFIG = {
+    "max_entries": int(os.environ.get("GREENGRID_CACHE_ENTRIES", 256)),
+    "max_bytes": int(os.environ.get("GREENGRID_CACHE_BYTES", 256 * 1024 * 1024)),
+    "max_entry_bytes": int(os.environ.get("GREENGRID_CACHE_ENTRY_BYTES", 64 * 1024 * 1024)),
+}
+VERSION_REVALIDATE_AFTER = float(os.environ.get("GREENGRID_CACHE_REVALIDATE", 5))
+
+# Statements slower than this are logged with their parameters (0 disables the slow-query log)
+SLOW_QUERY_MS = float(os.environ.get("GREENGRID_SLOW_QUERY_MS", 0))
+
+_pool = None
+_pool_lock = threading.Lock()
+tile_cache = TileCache(**TILE_CACHE_CONFIG)
+response_cache = ResponseCache(**RESPONSE_CACHE_CONFIG)
+
+# Latency, size and row histograms of every request and DB statement, served on /metrics
+api_metrics.slow_query_ms = SLOW_QUERY_MS
+app.wsgi_app = api_metrics.middleware(app.wsgi_app)
+api_metrics.collect("greengrid_pool", lambda: _pool.stats() if _pool is not None else {})
+api_metrics.collect("greengrid_tile_cache", lambda: tile_cache.stats())
+api_metrics.collect("greengrid_response_cache", lambda: response_cache.stats())
+
+
+def get_pool() -> ConnectionPool:
+    """Create the process-wide connection pool on first use and return it."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(**POOL_CONFIG, **DB_CONFIG, cursor_factory=TimedCursor)
+    return _pool
+
+
+@contextmanager
 def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+    """
+    Borrow a pooled connection for the duration of a `with` block.
+
+    The connection always goes back to the pool; anything not committed when
+    the block exits (normally or through an exception) is rolled back.
+    The wait for the connection is recorded in the API metrics.
+    """
+    started = time.perf_counter()
+    with get_pool().connection() as conn:
+        api_metrics.acquired(time.perf_counter() - started)
+        yield conn
+
+
+def list_trees(where: str, params=()):
+    """
+    Answer a tree listing request in the format asked for by the client.
+
+    The `format` parameter (or, without it, the `Accept` header) selects:
+    - json (default): list of rows with `geometry` as a GeoJSON string.
+    - geojson: GeoJSON FeatureCollection streamed through a server-side cursor.
+    - arrow: Apache Arrow IPC stream with WKB geometry.
+    - parquet: GeoParquet file with WKB geometry.
+
+    `after`/`limit` select a keyset page ordered by tree_id and `fields`
+    projects columns; when another page follows, its cursor is returned in
+    the `X-Next-Cursor` and `Link` headers.
+
+    Args:
+        where (str): SQL condition on the `pa.trees` alias `t`.
+        params: Parameters for the placeholders in `where`.
+    """
+    try:
+        page = Page.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    fmt = request.args.get('format')
+    if fmt is None:
+        offered = {"application/json": "json", "application/geo+json": "geojson",
+                   **{mimetype: name for name, mimetype in COLUMNAR_MIMETYPES.items()}}
+        fmt = offered[request.accept_mimetypes.best_match(list(offered), default="application/json")]
+
+    if fmt == "geojson":
+        chunks = feature_collection_chunks(get_db_connection, page, where, params, STREAM_CONFIG["itersize"])
+        response = Response(primed(chunks), mimetype="application/geo+json")
+    elif fmt in COLUMNAR_MIMETYPES:
+        chunks = columnar_chunks(get_db_connection, fmt, page, where, params, STREAM_CONFIG["itersize"])
+        response = Response(primed(chunks), mimetype=COLUMNAR_MIMETYPES[fmt])
+        if fmt == "parquet":
+            response.headers["Content-Disposition"] = "attachment; filename=trees.parquet"
+    elif fmt == "json":
+        if page.fields is None and page.limit is None and page.after is None:
+            sql = f"SELECT *, ST_AsGeoJSON(geometry) as geometry FROM pa.trees t WHERE {where}"
+        else:
+            columns = ", ".join("ST_AsGeoJSON(t.geometry) AS geometry" if name == "geometry" else f"t.{name}"
+                                for name in page.columns)
+            where, params = page.where(where, params)
+            sql = f"SELECT {columns} FROM pa.trees t WHERE {where} ORDER BY t.tree_id {page.limit_sql}"
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = [row for batch in page.batches(cur, STREAM_CONFIG["itersize"], key=lambda row: row['tree_id'])
+                    for row in batch]
+        response = jsonify(rows)
+    else:
+        return jsonify({"error": f"Unsupported format '{fmt}'"}), 400
+
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(page.next_cursor)
+        response.headers["Link"] = page.link(request.base_url, request.args)
+    return response
+
+
+# Vocabulary kinds served by /search/suggest (see pa.search_vocabulary)
+SUGGEST_KINDS = ("species", "common_name", "parish")
+
+# Materialized view and sort column behind each /stats/<dimension> (see greengrid_db/08-create_stats_views.sql)
+STATS_VIEWS = {
+    "freguesia": ("pa.stats_trees_by_freguesia", "freguesia"),
+    "species": ("pa.stats_trees_by_species", "especie"),
+    "tipologia": ("pa.stats_trees_by_tipologia", "tipologia"),
+    "manutencao": ("pa.stats_trees_by_manutencao", "manutencao"),
+}
+STATS_MAX_AGE = int(os.environ.get("GREENGRID_STATS_MAX_AGE", 300))   # seconds clients may reuse /stats responses
+
+# Above this many trees written at once, dropping the whole tile cache is cheaper than invalidating tile by tile
+BATCH_TILE_INVALIDATE_LIMIT = 100
+
+# Generation counters of pa.data_version; a change of the trees seen from another
+# process makes every cached tile stale (cached responses carry their generation)
+data_versions = DataVersions(get_db_connection, revalidate_after=VERSION_REVALIDATE_AFTER)
+data_versions.on_change(lambda table: tile_cache.clear() if table == "trees" else None)
+
+
+def batch_response(batch: Batch):
+    """Per-record results of a bulk write, with 201, 207 (partially created) or 422 (nothing created)."""
+    body, status = batch.summary()
+    return jsonify(body), status
+
+
+def atomic_batch() -> bool:
+    """True if the request asked (`atomic=true`) for all records to be written or none."""
+    return request.args.get('atomic', default='false').lower() in ('1', 'true', 'yes')
+
+
+@app.before_request
+def label_request_metrics():
+    # Label the request's metrics with its route pattern, not its URL, to keep the series bounded
+    api_metrics.set_route(request.url_rule.rule if request.url_rule else None)
+
+
+@app.errorhandler(PoolError)
+def handle_pool_error(e):
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
 
 # 1. GET ALL TREES
 @app.route('/trees', methods=['GET'])
+@response_cache.cached(data_versions, "trees")
 def get_all_trees():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT *, ST_AsGeoJSON(geometry) as geometry FROM pa.trees")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return jsonify(rows)
+    return list_trees("TRUE")
 
 # 2. GET TREE DETAILS BY ID
 @app.route('/tree/<int:id>', methods=['GET'])
 def get_tree_details(id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT *, ST_AsGeoJSON(geometry) as geometry 
-        FROM pa.trees 
-        WHERE tree_id = %s
-    """, (id,))
-    tree = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT *, ST_AsGeoJSON(geometry) as geometry 
+            FROM pa.trees 
+            WHERE tree_id = %s
+        """, (id,))
+        tree = cur.fetchone()
     return jsonify(tree if tree else {"error": "Tree not found"})
 
 # 3. GET COMMENT HISTORY BY TREE ID (with optional 'limit' parameter)
@@ -49,18 +231,15 @@ def get_tree_details(id):
 def get_comment_history(id):
     # default limit is 10 if not provided
     limit = request.args.get('limit', default=10, type=int)
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT username, comment, created_at 
-        FROM pa.comments 
-        WHERE tree_id = %s 
-        ORDER BY created_at DESC 
-        LIMIT %s
-    """, (id, limit))
-    comments = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT username, comment, created_at 
+            FROM pa.comments 
+            WHERE tree_id = %s 
+            ORDER BY created_at DESC 
+            LIMIT %s
+        """, (id, limit))
+        comments = cur.fetchall()
     return jsonify(comments)
 
 # 4. GET MAINTENANCE HISTORY BY TREE ID (with optional 'limit' parameter)
@@ -69,62 +248,64 @@ def get_maintenance_history(id):
     # default limit is 5 if not provided
     limit = request.args.get('limit', default=5, type=int)
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT m.maint_date, o.op_description, m.observation, m.officer, t.manutencao AS maintenance_authority
-        FROM pa.maintenance m
-        JOIN pa.operations o ON m.op_code = o.op_code
-        JOIN pa.trees t ON m.tree_id = t.tree_id
-        WHERE m.tree_id = %s 
-        ORDER BY m.maint_date DESC
-        LIMIT %s
-    """, (id, limit))
-    history = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT m.maint_date, o.op_description, m.observation, m.officer, t.manutencao AS maintenance_authority
+            FROM pa.maintenance m
+            JOIN pa.operations o ON m.op_code = o.op_code
+            JOIN pa.trees t ON m.tree_id = t.tree_id
+            WHERE m.tree_id = %s 
+            ORDER BY m.maint_date DESC
+            LIMIT %s
+        """, (id, limit))
+        history = cur.fetchall()
     return jsonify(history)
 
 # 5. DELETE A TREE
 @app.route('/tree/<int:id>', methods=['DELETE'])
 def delete_tree(id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM pa.trees WHERE tree_id = %s", (id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM pa.trees WHERE tree_id = %s
+            RETURNING ST_X(geometry) AS lon, ST_Y(geometry) AS lat
+        """, (id,))
+        deleted = cur.fetchone()
+        bumped = data_versions.bump(cur, "trees")
+        conn.commit()
+    data_versions.observe(bumped)
+    if deleted:
+        tile_cache.invalidate_point(deleted['lon'], deleted['lat'])
     return jsonify({"message": f"Tree {id} and its associated records deleted."})
 
 # 6. EDIT TREE DETAILS
 @app.route('/tree/<int:id>', methods=['PUT'])
 def edit_tree(id):
     data = request.json
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # 1. Check if the tree exists first
-        cur.execute("SELECT tree_id FROM pa.trees WHERE tree_id = %s", (id,))
-        if cur.fetchone() is None:
-            return jsonify({"error": f"Tree ID {id} does not exist. Cannot update."}), 404
+    with get_db_connection() as conn, conn.cursor() as cur:
+        try:
+            # 1. Check if the tree exists first
+            cur.execute("SELECT tree_id, ST_X(geometry) AS lon, ST_Y(geometry) AS lat FROM pa.trees WHERE tree_id = %s", (id,))
+            tree = cur.fetchone()
+            if tree is None:
+                return jsonify({"error": f"Tree ID {id} does not exist. Cannot update."}), 404
 
-        # 2. Proceed with the update if it exists
-        cur.execute("""
-            UPDATE pa.trees 
-            SET nome_vulga = %s, especie = %s, tipologia = %s, local = %s, morada = %s, pap = %s, manutencao = %s, ocupacao = %s, freguesia = %s
-            WHERE tree_id = %s
-        """, (data.get('nome_vulga'), data.get('especie'), data.get('tipologia'), 
-              data.get('local'), data.get('morada'), data.get('pap'), data.get('manutencao'), 
-              data.get('ocupacao'), data.get('freguesia'), id))
-        
-        conn.commit()
-        return jsonify({"message": f"Tree {id} updated successfully"})
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+            # 2. Proceed with the update if it exists
+            cur.execute("""
+                UPDATE pa.trees 
+                SET nome_vulga = %s, especie = %s, tipologia = %s, local = %s, morada = %s, pap = %s, manutencao = %s, ocupacao = %s, freguesia = %s
+                WHERE tree_id = %s
+            """, (data.get('nome_vulga'), data.get('especie'), data.get('tipologia'), 
+                  data.get('local'), data.get('morada'), data.get('pap'), data.get('manutencao'), 
+                  data.get('ocupacao'), data.get('freguesia'), id))
+            bumped = data_versions.bump(cur, "trees")
+            
+            conn.commit()
+            data_versions.observe(bumped)
+            tile_cache.invalidate_point(tree['lon'], tree['lat'])
+            return jsonify({"message": f"Tree {id} updated successfully"})
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
 
 # 7. ADD A NEW COMMENT
 @app.route('/tree/<int:id>/comment', methods=['POST'])
@@ -134,84 +315,58 @@ def add_comment(id):
     if not data.get('username') or not data.get('comment'):
         return jsonify({"error": "Missing username or comment text"}), 400
         
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            INSERT INTO pa.comments (username, tree_id, comment) 
-            VALUES (%s, %s, %s)
-        """, (data['username'], id, data['comment']))
-        
-        conn.commit()
-        return jsonify({"message": "Comment added successfully"}), 201
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("""
+                INSERT INTO pa.comments (username, tree_id, comment) 
+                VALUES (%s, %s, %s)
+            """, (data['username'], id, data['comment']))
+            
+            conn.commit()
+            return jsonify({"message": "Comment added successfully"}), 201
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
 
 # 8. ADD NEW MAINTENANCE STATUS
 @app.route('/tree/<int:id>/maintenance', methods=['POST'])
 def add_maintenance(id):
     data = request.json
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            INSERT INTO pa.maintenance (tree_id, op_code, observation, officer, maint_date) 
-            VALUES (%s, %s, %s, %s, %s)
-        """, (id, data['op_code'], data.get('observation', ''), data.get('officer', ''), data['maint_date']))
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("""
+                INSERT INTO pa.maintenance (tree_id, op_code, observation, officer, maint_date) 
+                VALUES (%s, %s, %s, %s, %s)
+            """, (id, data['op_code'], data.get('observation', ''), data.get('officer', ''), data['maint_date']))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
     return jsonify({"message": "Maintenance record added"})
 
 # 9. GET TREES WITHIN A FREGUESIA
 @app.route('/trees/freguesia/<string:name>', methods=['GET'])
+@response_cache.cached(data_versions, "trees")
 def get_trees_by_freguesia(name):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT *, ST_AsGeoJSON(geometry) as geometry FROM pa.trees WHERE freguesia ILIKE %s", (f"%{name}%",))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return jsonify(rows)
+    return list_trees("t.freguesia ILIKE %s", (f"%{name}%",))
 
 # 10. GET TREES BY SPECIES
 @app.route('/trees/species/<string:species>', methods=['GET'])
+@response_cache.cached(data_versions, "trees")
 def get_trees_by_species(species):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT *, ST_AsGeoJSON(geometry) as geometry FROM pa.trees WHERE especie ILIKE %s", (f"%{species}%",))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return jsonify(rows)
+    return list_trees("t.especie ILIKE %s", (f"%{species}%",))
 
 # 11. GET TREES WITHIN BUFFER (Radius in meters)
 @app.route('/trees/near', methods=['GET'])
 def get_trees_near():
-    lat = request.args.get('lat', type=float)
-    lon = request.args.get('lon', type=float)
-    radius = request.args.get('radius', default=100, type=float) # in meters
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # Use ST_DWithin with geography for meter-based radius
-    cur.execute("""
-        SELECT *, ST_AsGeoJSON(geometry) as geometry 
-        FROM pa.trees 
-        WHERE ST_DWithin(geometry::geography, ST_MakePoint(%s, %s)::geography, %s)
-    """, (lon, lat, radius))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return jsonify(rows)
+    try:
+        lon, lat = search_point(request.args)
+        radius = search_radius(request.args) # in meters
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # ST_DWithin with geography for meter-based radius, answered by the idx_trees_geog expression index
+    return list_trees(NEAR_WHERE, (lon, lat, radius))
 
 # 12. CREATE NEW TREE
 @app.route('/tree', methods=['POST'])
@@ -223,32 +378,286 @@ def create_tree():
     if not tree_id:
         return jsonify({"error": "Missing Tree ID"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        try:
+            # Check if the Tree ID already exists
+            cur.execute("SELECT tree_id FROM pa.trees WHERE tree_id = %s", (tree_id,))
+            if cur.fetchone():
+                return jsonify({"error": f"Tree ID {tree_id} already exists in the database."}), 409
 
-    try:
-        # Check if the Tree ID already exists
-        cur.execute("SELECT tree_id FROM pa.trees WHERE tree_id = %s", (tree_id,))
-        if cur.fetchone():
-            return jsonify({"error": f"Tree ID {tree_id} already exists in the database."}), 409
+            # If it doesn't exist, proceed with the INSERT
+            cur.execute("""
+                INSERT INTO pa.trees (tree_id, especie, nome_vulga, tipologia, local, morada, pap, manutencao, ocupacao, freguesia, geometry)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326))
+                RETURNING ST_X(geometry) AS lon, ST_Y(geometry) AS lat
+            """, (tree_id, data.get('especie'), data.get('nome_vulga'), data.get('tipologia'), 
+                  data.get('local'), data.get('morada'), data.get('pap'), data.get('manutencao'), 
+                  data.get('ocupacao'), data.get('freguesia'), data.get('lon'), data.get('lat')))
+            created = cur.fetchone()
+            bumped = data_versions.bump(cur, "trees")
+            
+            conn.commit()
+            data_versions.observe(bumped)
+            tile_cache.invalidate_point(created['lon'], created['lat'])
+            return jsonify({"message": "Tree created successfully"}), 201
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
+
+# 13. CONNECTION POOL STATISTICS
+@app.route('/pool/stats', methods=['GET'])
+def get_pool_stats():
+    return jsonify(get_pool().stats())
+
+# 14. GET VECTOR TILE OF TREES (Mapbox Vector Tile, XYZ scheme)
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_tree_tile(z, x, y):
+    if not valid_tile(z, x, y):
+        return jsonify({"error": f"Tile {z}/{x}/{y} does not exist"}), 400
 
-        # If it doesn't exist, proceed with the INSERT
+    # Notices trees changed by another process (at most every VERSION_REVALIDATE_AFTER seconds),
+    # whose listener clears the tile cache before it is read
+    data_versions.current("trees")
+    key = (z, x, y)
+    tile = tile_cache.get(key)
+    if tile is None:
+        # Read the generation first so a tile rendered before a concurrent write is not cached
+        generation = tile_cache.generation
+        sql, params = tile_query(z, x, y)
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            row = cur.fetchone()
+        tile = bytes(row['tile']) if row and row['tile'] is not None else b""
+        tile_cache.put(key, tile, generation)
+
+    response = Response(tile, mimetype="application/vnd.mapbox-vector-tile")
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return response
+
+# 15. VECTOR TILE CACHE STATISTICS
+@app.route('/tiles/stats', methods=['GET'])
+def get_tile_cache_stats():
+    return jsonify(tile_cache.stats())
+
+# 16. RESPONSE CACHE STATISTICS
+@app.route('/cache/stats', methods=['GET'])
+def get_response_cache_stats():
+    return jsonify(response_cache.stats())
+
+# 17. SEARCH SUGGESTIONS (species, common names and parishes, with optional 'kind' and 'limit')
+@app.route('/search/suggest', methods=['GET'])
+def search_suggest():
+    q = request.args.get('q', default='').strip()
+    kind = request.args.get('kind')
+    # default limit is 10 if not provided
+    limit = min(max(request.args.get('limit', default=10, type=int), 1), 1000)
+    if kind is not None and kind not in SUGGEST_KINDS:
+        return jsonify({"error": f"'kind' must be one of {', '.join(SUGGEST_KINDS)}"}), 400
+
+    # Escape LIKE wildcards typed by the user
+    pattern = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    with get_db_connection() as conn, conn.cursor() as cur:
+        # Substring and trigram-similarity matches are both answered by idx_vocabulary_term_trgm;
+        # prefix matches rank first, then closer spellings, then more common terms
         cur.execute("""
-            INSERT INTO pa.trees (tree_id, especie, nome_vulga, tipologia, local, morada, pap, manutencao, ocupacao, freguesia, geometry)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326))
-        """, (tree_id, data.get('especie'), data.get('nome_vulga'), data.get('tipologia'), 
-              data.get('local'), data.get('morada'), data.get('pap'), data.get('manutencao'), 
-              data.get('ocupacao'), data.get('freguesia'), data.get('lon'), data.get('lat')))
-        
-        conn.commit()
-        return jsonify({"message": "Tree created successfully"}), 201
-
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+            SELECT kind, term, tree_count
+            FROM pa.search_vocabulary
+            WHERE (%(kind)s IS NULL OR kind = %(kind)s)
+              AND (%(q)s = '' OR term ILIKE '%%' || %(pattern)s || '%%' OR term %% %(q)s)
+            ORDER BY term ILIKE %(pattern)s || '%%' DESC,
+                     similarity(term, %(q)s) DESC,
+                     tree_count DESC,
+                     term
+            LIMIT %(limit)s
+        """, {"kind": kind, "q": q, "pattern": pattern, "limit": limit})
+        suggestions = cur.fetchall()
+
+    response = jsonify(suggestions)
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return response
+
+# 18. PAP DISTRIBUTION (25 cm classes, for the whole city or one 'freguesia')
+@app.route('/stats/pap', methods=['GET'])
+@response_cache.cached(data_versions, "stats", max_age=STATS_MAX_AGE)
+def get_pap_distribution():
+    scope = request.args.get('freguesia', default='Lisboa')
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT pap_class, pap_from, pap_to, tree_count
+            FROM pa.stats_pap_distribution
+            WHERE scope = %s
+            ORDER BY pap_class
+        """, (scope,))
+        classes = cur.fetchall()
+    if not classes:
+        return jsonify({"error": "Parish not found"}), 404
+    return jsonify({"scope": scope, "classes": classes})
+
+# 19. TREE STATISTICS BY PARISH, SPECIES, TYPOLOGY OR MAINTENANCE (precomputed by the ETL)
+@app.route('/stats/<string:dimension>', methods=['GET'])
+@response_cache.cached(data_versions, "stats", max_age=STATS_MAX_AGE)
+def get_stats(dimension):
+    if dimension not in STATS_VIEWS:
+        return jsonify({"error": f"Unknown statistic, use one of: pap, {', '.join(STATS_VIEWS)}"}), 404
+    view, key = STATS_VIEWS[dimension]
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM {view} ORDER BY tree_count DESC, {key}")
+        return jsonify(cur.fetchall())
+
+# 20. GET THE K NEAREST TREES TO A POINT (with optional 'k' parameter)
+@app.route('/trees/nearest', methods=['GET'])
+def get_trees_nearest():
+    try:
+        lon, lat = search_point(request.args)
+        # default k is 10 if not provided
+        k = neighbour_count(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with get_db_connection() as conn, conn.cursor() as cur:
+        # KNN ordering (<->) walks idx_trees_geog, closest tree first
+        cur.execute(NEAREST_SQL, nearest_params(lon, lat, k))
+        return jsonify(cur.fetchall())
+
+# 21. CREATE TREES IN BULK (JSON array of tree records, optional 'atomic' parameter)
+@app.route('/trees/batch', methods=['POST'])
+def create_trees_batch():
+    try:
+        batch = Batch.from_json(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    batch.validate(tree_row)
+
+    with get_db_connection() as conn, conn.cursor() as cur:
+        try:
+            batch.reject_existing(cur, 0, "pa.trees", "tree_id", "Tree ID")
+            # ON CONFLICT skips trees created concurrently since the check; they are reported as existing
+            created = batch.insert(cur, TREES_INSERT_SQL, TREES_TEMPLATE, key=(0, "tree_id"))
+            if batch.rejected and atomic_batch():
+                conn.rollback()
+                batch.abort()
+                return batch_response(batch)
+            bumped = data_versions.bump(cur, "trees") if created else None
+
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    for index, tree in created:
+        batch.accept(index, tree_id=tree['tree_id'])
+    if bumped:
+        data_versions.observe(bumped)
+        if len(created) > BATCH_TILE_INVALIDATE_LIMIT:
+            tile_cache.clear()
+        else:
+            for _, tree in created:
+                tile_cache.invalidate_point(tree['lon'], tree['lat'])
+    return batch_response(batch)
+
+# 22. ADD COMMENTS IN BULK (JSON array of comment records with tree_id, optional 'atomic' parameter)
+@app.route('/comments/batch', methods=['POST'])
+def add_comments_batch():
+    try:
+        batch = Batch.from_json(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    batch.validate(comment_row)
+
+    with get_db_connection() as conn, conn.cursor() as cur:
+        try:
+            batch.require(cur, 1, "pa.trees", "tree_id", "Tree ID")
+            batch.require(cur, 0, "pa.users", "username", "User")
+            if batch.rejected and atomic_batch():
+                batch.abort()
+                return batch_response(batch)
+            batch.assign_ids(cur, "pa.comments", "id")
+            created = batch.insert(cur, COMMENTS_INSERT_SQL, key=(0, "id"))
+
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    for index, comment in created:
+        batch.accept(index, id=comment['id'])
+    return batch_response(batch)
+
+# 23. ADD MAINTENANCE RECORDS IN BULK (JSON array of maintenance records with tree_id, optional 'atomic' parameter)
+@app.route('/maintenance/batch', methods=['POST'])
+def add_maintenance_batch():
+    try:
+        batch = Batch.from_json(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    batch.validate(maintenance_row)
+
+    with get_db_connection() as conn, conn.cursor() as cur:
+        try:
+            batch.require(cur, 0, "pa.trees", "tree_id", "Tree ID")
+            batch.require(cur, 1, "pa.operations", "op_code", "Operation code")
+            if batch.rejected and atomic_batch():
+                batch.abort()
+                return batch_response(batch)
+            batch.assign_ids(cur, "pa.maintenance", "maintenance_id")
+            created = batch.insert(cur, MAINTENANCE_INSERT_SQL, key=(0, "maintenance_id"))
+
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    for index, record in created:
+        batch.accept(index, maintenance_id=record['maintenance_id'])
+    return batch_response(batch)
+
+# 24. GET TREE DOSSIER: DETAILS, COMMENTS AND MAINTENANCE IN ONE QUERY (optional 'comments' and 'maintenance' limits)
+@app.route('/tree/<int:id>/dossier', methods=['GET'])
+def get_tree_dossier(id):
+    try:
+        limits = section_limits(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with get_db_connection() as conn, conn.cursor() as cur:
+        dossiers = read_dossiers(cur, [id], limits)
+    if not dossiers:
+        return jsonify({"error": "Tree not found"}), 404
+    return Response(dossiers[0][1], mimetype="application/json")
+
+# 25. GET DOSSIERS OF SEVERAL TREES ('ids' comma-separated, optional 'comments' and 'maintenance' limits)
+@app.route('/trees/dossier', methods=['GET'])
+def get_trees_dossier():
+    try:
+        ids = dossier_ids(request.args)
+        limits = section_limits(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with get_db_connection() as conn, conn.cursor() as cur:
+        dossiers = read_dossiers(cur, ids, limits)
+    found = {tree_id for tree_id, _ in dossiers}
+    missing = [tree_id for tree_id in ids if tree_id not in found]
+    # The dossiers are already JSON text; only the envelope is built here
+    body = '{"trees": [' + ",".join(dossier for _, dossier in dossiers) + '], "missing": ' + json.dumps(missing) + '}'
+    return Response(body, mimetype="application/json")
+
+# 26. PARISH CHOROPLETH: TREES, DENSITY PER KM² AND SPECIES RICHNESS WITH BOUNDARIES SIMPLIFIED FOR THE 'zoom'
+@app.route('/parishes', methods=['GET'])
+@response_cache.cached(data_versions, "stats", max_age=STATS_MAX_AGE)
+def get_parishes():
+    try:
+        zoom = zoom_level(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with get_db_connection() as conn, conn.cursor() as cur:
+        # Precomputed by the ETL post-load step; Postgres renders the whole collection
+        collection = read_parishes(cur, zoom)
+    return Response(collection, mimetype="application/geo+json")
+
+# 27. PROMETHEUS METRICS: REQUEST LATENCY, RESPONSE SIZE AND ROWS PER ROUTE, DB TIME PER STATEMENT, POOL AND CACHES
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(api_metrics.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,262 @@
+import math
+from datetime import date
+
+from psycopg2.extras import execute_values
+
+# Most records accepted in one batch request, and rows per multi-row INSERT statement
+MAX_BATCH_SIZE = 10000
+BATCH_PAGE_SIZE = 1000
+
+# Column names and maximum lengths of the text fields, as declared in greengrid_db/03-create_pa_tables.sql
+TREE_TEXT_FIELDS = {"especie": 255, "nome_vulga": 255, "tipologia": 100, "local": 255, "morada": 255,
+                    "manutencao": 100, "ocupacao": 100, "freguesia": 100}
+MAINTENANCE_TEXT_FIELDS = {"observation": 255, "officer": 100}
+# Largest perimeter accepted, below what pa.trees.pap NUMERIC(10, 2) can hold (< 1e8)
+MAX_PAP = 99999999.99
+
+TREES_INSERT_SQL = """
+    INSERT INTO pa.trees (tree_id, especie, nome_vulga, tipologia, local, morada, pap, manutencao, ocupacao, freguesia, geometry)
+    VALUES %s
+    ON CONFLICT (tree_id) DO NOTHING
+    RETURNING tree_id, ST_X(geometry) AS lon, ST_Y(geometry) AS lat
+"""
+TREES_TEMPLATE = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326))"
+
+# Comments and maintenance records get their ids from `Batch.assign_ids` before the INSERT,
+# so the RETURNING rows can be matched to the records by id
+COMMENTS_INSERT_SQL = """
+    INSERT INTO pa.comments (id, username, tree_id, comment)
+    VALUES %s
+    RETURNING id
+"""
+
+MAINTENANCE_INSERT_SQL = """
+    INSERT INTO pa.maintenance (maintenance_id, tree_id, op_code, observation, officer, maint_date)
+    VALUES %s
+    RETURNING maintenance_id
+"""
+
+
+# ------------------------------------
+# ----------Per-record checks---------
+
+def _integer(item: dict, name: str, required: bool = True):
+    value = item.get(name)
+    if value is None:
+        if required:
+            raise ValueError(f"Missing '{name}'")
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"'{name}' must be an integer")
+    return value
+
+
+def _number(item: dict, name: str, low: float = None, high: float = None):
+    value = item.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"'{name}' must be a number")
+    # JSON NaN and Infinity parse as floats; Python ints are always finite
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(f"'{name}' must be a finite number")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise ValueError(f"'{name}' out of range")
+    return value
+
+
+def _text(item: dict, name: str, max_length: int = None, required: bool = False):
+    value = item.get(name)
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"Missing '{name}'")
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"'{name}' must be a string")
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f"'{name}' is longer than {max_length} characters")
+    return value
+
+
+def tree_row(item: dict) -> tuple:
+    """Validate a tree record; return its values in TREES_TEMPLATE order."""
+    tree_id = _integer(item, "tree_id")
+    lon = _number(item, "lon", -180, 180)
+    lat = _number(item, "lat", -90, 90)
+    if (lon is None) != (lat is None):
+        raise ValueError("'lon' and 'lat' must be given together")
+    pap = _number(item, "pap", 0, MAX_PAP)
+    text = {name: _text(item, name, length) for name, length in TREE_TEXT_FIELDS.items()}
+    return (tree_id, text["especie"], text["nome_vulga"], text["tipologia"], text["local"], text["morada"],
+            pap, text["manutencao"], text["ocupacao"], text["freguesia"], lon, lat)
+
+
+def comment_row(item: dict) -> tuple:
+    """Validate a comment record; return (username, tree_id, comment)."""
+    username = _text(item, "username", 50, required=True)
+    comment = _text(item, "comment", required=True)
+    return username, _integer(item, "tree_id"), comment
+
+
+def maintenance_row(item: dict) -> tuple:
+    """Validate a maintenance record; return (tree_id, op_code, observation, officer, maint_date)."""
+    tree_id = _integer(item, "tree_id")
+    op_code = _integer(item, "op_code")
+    maint_date = _text(item, "maint_date", required=True)
+    try:
+        maint_date = date.fromisoformat(maint_date)
+    except ValueError:
+        raise ValueError("'maint_date' must be an ISO date (YYYY-MM-DD)") from None
+    observation = _text(item, "observation", MAINTENANCE_TEXT_FIELDS["observation"]) or ""
+    officer = _text(item, "officer", MAINTENANCE_TEXT_FIELDS["officer"]) or ""
+    return tree_id, op_code, observation, officer, maint_date
+
+
+# ------------------------------------
+# ----------Batch---------------------
+
+class Batch:
+    """
+    Records of one bulk write request and the outcome of each of them.
+
+    Records are checked one by one in Python (`validate`) and then against
+    the database with one set-based query per reference (`require`,
+    `reject_existing`), so a batch of thousands of records costs a handful
+    of round trips. The valid rows are written with multi-row INSERTs
+    (`insert`) in the caller's transaction.
+
+    Args:
+        items (list): The JSON records of the request, in request order.
+    """
+
+    def __init__(self, items: list):
+        self.items = items
+        self.results = [None] * len(items)
+        self.rows = {}   # index -> validated row, for records not rejected yet
+
+    @classmethod
+    def from_json(cls, data) -> "Batch":
+        """
+        Build a batch from a request body (a JSON array of objects).
+
+        Raises:
+            ValueError: If the body is not a non-empty array of at most MAX_BATCH_SIZE objects.
+        """
+        if not isinstance(data, list) or not data:
+            raise ValueError("Expected a non-empty JSON array of records")
+        if len(data) > MAX_BATCH_SIZE:
+            raise ValueError(f"A batch holds at most {MAX_BATCH_SIZE} records")
+        return cls(data)
+
+    def reject(self, index: int, error: str) -> None:
+        self.rows.pop(index, None)
+        self.results[index] = {"index": index, "status": "error", "error": error}
+
+    def validate(self, check) -> None:
+        """Turn every record into a row with `check`, rejecting those it raises ValueError for."""
+        for index, item in enumerate(self.items):
+            if not isinstance(item, dict):
+                self.reject(index, "Record must be a JSON object")
+                continue
+            try:
+                self.rows[index] = check(item)
+            except ValueError as e:
+                self.reject(index, str(e))
+
+    def values(self, position: int) -> set:
+        """Distinct values at `position` of the rows still accepted."""
+        return {row[position] for row in self.rows.values() if row[position] is not None}
+
+    def require(self, cur, position: int, table: str, column: str, label: str) -> None:
+        """Reject rows whose value at `position` does not exist in `table.column` (one query)."""
+        values = self.values(position)
+        if not values:
+            return
+        cur.execute(f"SELECT {column} FROM {table} WHERE {column} = ANY(%s)", (list(values),))
+        known = {row[column] for row in cur.fetchall()}
+        for index, row in list(self.rows.items()):
+            if row[position] is not None and row[position] not in known:
+                self.reject(index, f"{label} {row[position]} does not exist")
+
+    def reject_existing(self, cur, position: int, table: str, column: str, label: str) -> None:
+        """Reject rows whose key at `position` is repeated in the batch or already in `table.column`."""
+        seen = set()
+        for index, row in sorted(self.rows.items()):
+            if row[position] in seen:
+                self.reject(index, f"{label} {row[position]} is repeated in the batch")
+            seen.add(row[position])
+        values = self.values(position)
+        if not values:
+            return
+        cur.execute(f"SELECT {column} FROM {table} WHERE {column} = ANY(%s)", (list(values),))
+        taken = {row[column] for row in cur.fetchall()}
+        for index, row in list(self.rows.items()):
+            if row[position] in taken:
+                self.reject(index, f"{label} {row[position]} already exists")
+
+    def assign_ids(self, cur, table: str, column: str) -> None:
+        """
+        Draw a new id for every accepted row from the sequence of a serial column (one query).
+
+        The id is prepended to each row, so it must be the first column of the
+        INSERT and the rows' other positions move by one.
+        """
+        indexes = sorted(self.rows)
+        if not indexes:
+            return
+        cur.execute("SELECT nextval(pg_get_serial_sequence(%s, %s)) AS id FROM generate_series(1, %s)",
+                    (table, column, len(indexes)))
+        for index, row in zip(indexes, cur.fetchall()):
+            self.rows[index] = (row['id'],) + self.rows[index]
+
+    def insert(self, cur, sql: str, template: str = None, *, key: tuple) -> list:
+        """
+        Insert the accepted rows with multi-row INSERT statements.
+
+        PostgreSQL does not guarantee that RETURNING rows follow the VALUES
+        order, so they are matched to the records by a key the records carry:
+        their own (e.g. tree_id) or one drawn with `assign_ids`.
+
+        Args:
+            cur: Cursor of the caller's transaction.
+            sql (str): INSERT ... VALUES %s ... RETURNING statement.
+            template (str): Row template for `execute_values` (default: one %s per value).
+            key (tuple): (row position, returned column) identifying records in
+                the RETURNING rows. Records the statement skipped (ON CONFLICT
+                DO NOTHING) are rejected.
+
+        Returns:
+            list: (index, returned row) pairs of the inserted records.
+        """
+        indexes = sorted(self.rows)
+        if not indexes:
+            return []
+        returned = execute_values(cur, sql, [self.rows[i] for i in indexes], template=template,
+                                  page_size=BATCH_PAGE_SIZE, fetch=True)
+        position, column = key
+        by_key = {self.rows[i][position]: i for i in indexes}
+        inserted = [(by_key[row[column]], row) for row in returned]
+        for index in set(indexes) - {i for i, _ in inserted}:
+            self.reject(index, f"{column} {self.rows[index][position]} already exists")
+        return inserted
+
+    def abort(self) -> None:
+        """Mark every record still pending as skipped (an atomic batch with rejected records)."""
+        for index in self.rows:
+            self.results[index] = {"index": index, "status": "skipped",
+                                   "error": "Not written: other records of the atomic batch were rejected"}
+        self.rows.clear()
+
+    def accept(self, index: int, **fields) -> None:
+        self.results[index] = {"index": index, "status": "created", **fields}
+
+    @property
+    def rejected(self) -> int:
+        return sum(1 for r in self.results if r is not None and r["status"] == "error")
+
+    def summary(self) -> tuple:
+        """Return the response body and status: 201 if every record was created, 207 if some, 422 if none."""
+        created = sum(1 for r in self.results if r is not None and r["status"] == "created")
+        status = 201 if created == len(self.items) else 207 if created else 422
+        body = {"created": created, "failed": len(self.items) - created, "results": self.results}
+        return body, status
@@ -0,0 +1,152 @@
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from metrics import TimedTupleCursor
+from pagination import Page
+from streaming import STREAM_ITERSIZE
+
+# Column order and Arrow types of the exported tree table; geometry is WKB
+TREE_SCHEMA = pa.schema([
+    ("tree_id", pa.int32()),
+    ("nome_vulga", pa.string()),
+    ("especie", pa.string()),
+    ("tipologia", pa.string()),
+    ("pap", pa.float64()),
+    ("manutencao", pa.string()),
+    ("ocupacao", pa.string()),
+    ("local", pa.string()),
+    ("morada", pa.string()),
+    ("freguesia", pa.string()),
+    ("geometry", pa.binary()),
+])
+
+# GeoParquet 1.0 file metadata; a missing "crs" means OGC:CRS84 (lon/lat WGS 84)
+GEOPARQUET_METADATA = {
+    "version": "1.0.0",
+    "primary_column": "geometry",
+    "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Point"]}},
+}
+
+# SQL expression producing each exported column in its Arrow type
+COLUMN_SQL = {
+    "pap": "t.pap::float8",
+    "geometry": "ST_AsBinary(t.geometry)",
+}
+
+COLUMNAR_SQL = """
+    SELECT {columns}
+    FROM pa.trees t
+    WHERE {where}
+    ORDER BY t.tree_id
+    {limit}
+"""
+
+MIMETYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def page_schema(page: Page) -> pa.Schema:
+    """Arrow schema of the columns requested by a page, in request order."""
+    return pa.schema([TREE_SCHEMA.field(name) for name in page.columns])
+
+
+def record_batches(cur, page: Page, schema: pa.Schema, batch_size: int):
+    """
+    Turn the rows of an executed cursor into Arrow record batches.
+
+    Each batch of rows is transposed into columns and handed to Arrow in
+    one call per column, so no per-row dict is ever built.
+    """
+    geometry = schema.get_field_index("geometry")
+    for rows in page.batches(cur, batch_size):
+        columns = list(zip(*rows))
+        if geometry >= 0:
+            # psycopg2 returns bytea as memoryview; Arrow wants bytes
+            columns[geometry] = [bytes(g) if g is not None else None for g in columns[geometry]]
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only file object that hands out what was written since the last drain.
+
+    Unlike a truncated BytesIO it keeps `tell()` monotonic, which the Parquet
+    writer relies on to record column chunk offsets in the footer.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def columnar_chunks(connection, fmt: str, page: Page, where: str, params, batch_size: int = STREAM_ITERSIZE):
+    """
+    Yield `pa.trees` rows as an Arrow IPC stream or a GeoParquet file.
+
+    Rows come from a named (server-side) cursor `batch_size` at a time; each
+    batch becomes one Arrow record batch (or one Parquet row group) and its
+    encoded bytes are yielded straight away.
+
+    Args:
+        connection: Context manager factory that lends a database connection.
+        fmt (str): "arrow" or "parquet".
+        page (Page): Keyset position, page size and field projection.
+        where (str): SQL condition on the `t` alias (trusted, parameterised).
+        params: Parameters for the placeholders in `where`.
+        batch_size (int): Rows per record batch / row group.
+
+    Yields:
+        bytes: Consecutive pieces of the encoded output.
+    """
+    where, params = page.where(where, params)
+    schema = page_schema(page)
+    columns = ", ".join(COLUMN_SQL.get(name, f"t.{name}") for name in page.columns)
+    with connection() as conn:
+        with conn.cursor(name="tree_columnar", cursor_factory=TimedTupleCursor) as cur:
+            cur.itersize = batch_size
+            cur.execute(COLUMNAR_SQL.format(columns=columns, where=where, limit=page.limit_sql), params)
+            batches = record_batches(cur, page, schema, batch_size)
+            batch = next(batches, None)
+
+            sink = ChunkSink()
+            if fmt == "arrow":
+                writer = pa.ipc.new_stream(sink, schema)
+            else:
+                if "geometry" in schema.names:
+                    schema = schema.with_metadata({"geo": json.dumps(GEOPARQUET_METADATA)})
+                writer = pq.ParquetWriter(sink, schema, compression="zstd")
+            yield sink.drain()
+
+            while batch is not None:
+                writer.write_batch(batch)
+                yield sink.drain()
+                batch = next(batches, None)
+
+            writer.close()
+            yield sink.drain()
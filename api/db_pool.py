@@ -0,0 +1,266 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolError(Exception):
+    """Raised when a connection cannot be borrowed from the pool."""
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection became available within the wait timeout."""
+
+
+class PoolExhausted(PoolError):
+    """Raised when the wait queue is already full and the request is rejected."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe, process-wide pool of psycopg2 connections.
+
+    Connections are opened lazily up to `maxconn`, checked for health when
+    they are borrowed and recycled once they have served `max_uses` checkouts
+    or lived for `max_lifetime` seconds. Callers that find the pool empty wait
+    in a bounded queue (`max_waiting`) for at most `timeout` seconds.
+
+    Args:
+        minconn (int): Connections opened eagerly when the pool is created.
+        maxconn (int): Upper bound of simultaneously open connections.
+        max_uses (int): Checkouts after which a connection is closed and replaced.
+        max_lifetime (float): Seconds after which a connection is closed and replaced.
+        timeout (float): Seconds a caller waits for a free connection.
+        max_waiting (int): Callers allowed to wait at the same time.
+        ping_after (float): Idle seconds after which a `SELECT 1` is sent on checkout.
+        **connect_kwargs: Passed through to `psycopg2.connect`.
+    """
+
+    def __init__(self, minconn: int = 1, maxconn: int = 10, max_uses: int = 1000,
+                 max_lifetime: float = 1800.0, timeout: float = 5.0, max_waiting: int = 50,
+                 ping_after: float = 30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Pool requires 0 <= minconn <= maxconn and maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_uses = max_uses
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.ping_after = ping_after
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []     # LIFO stack of idle connections, hottest on top
+        self._meta = {}     # id(conn) -> {"created", "uses", "returned"}
+        self._waiting = 0
+        self._opening = 0   # slots reserved by callers currently connecting
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "rollbacks": 0,
+            "wait_time_total": 0.0,
+        }
+
+        for _ in range(minconn):
+            conn = self._open()
+            self._idle.append(conn)
+
+    # ------------------------------------
+    # ------Connection life cycle---------
+
+    def _open(self):
+        # Called without holding the lock so a slow handshake never blocks other callers
+        conn = psycopg2.connect(**self.connect_kwargs)
+        now = time.monotonic()
+        with self._cond:
+            self._meta[id(conn)] = {"created": now, "uses": 0, "returned": now}
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _discard(self, conn) -> None:
+        self._meta.pop(id(conn), None)
+        self._stats["connections_closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn) -> bool:
+        meta = self._meta[id(conn)]
+        return (meta["uses"] >= self.max_uses
+                or time.monotonic() - meta["created"] >= self.max_lifetime)
+
+    def _healthy(self, conn, idle_for: float) -> bool:
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if idle_for < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    # ------------------------------------
+    # ------------Borrow / return---------
+
+    def getconn(self, timeout: float = None):
+        """
+        Borrow a healthy connection, waiting up to `timeout` seconds if necessary.
+
+        Raises:
+            PoolExhausted: If `max_waiting` callers are already queued.
+            PoolTimeout: If no connection became available in time.
+            PoolError: If the pool has been closed.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            conn, idle_for = self._reserve(deadline, timeout)
+
+            if conn is None:
+                # A slot was reserved for a brand new connection
+                try:
+                    conn = self._open()
+                finally:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                return self._checkout(conn, started)
+
+            if self._healthy(conn, idle_for):
+                return self._checkout(conn, started)
+
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+                self._discard(conn)
+                self._cond.notify()
+
+    def _reserve(self, deadline: float, timeout: float):
+        """Pop an idle connection or reserve a slot to open one, waiting if neither is possible."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+
+                while self._idle:
+                    conn = self._idle.pop()
+                    if self._expired(conn):
+                        self._stats["recycled"] += 1
+                        self._discard(conn)
+                        continue
+                    return conn, time.monotonic() - self._meta[id(conn)]["returned"]
+
+                if len(self._meta) + self._opening < self.maxconn:
+                    self._opening += 1
+                    return None, 0.0
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {timeout:.1f}s")
+                if self._waiting >= self.max_waiting:
+                    self._stats["rejected"] += 1
+                    raise PoolExhausted("Too many requests waiting for a database connection")
+
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _checkout(self, conn, started: float):
+        with self._cond:
+            self._meta[id(conn)]["uses"] += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += time.monotonic() - started
+        return conn
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        """
+        Return a borrowed connection, rolling back any transaction left open.
+
+        Args:
+            conn: The connection obtained from `getconn`.
+            discard (bool): Close the connection instead of keeping it idle.
+        """
+        rolled_back = False
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                    rolled_back = True
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if id(conn) not in self._meta:
+                return
+            if rolled_back:
+                self._stats["rollbacks"] += 1
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            elif self._expired(conn):
+                self._stats["recycled"] += 1
+                self._discard(conn)
+            else:
+                self._meta[id(conn)]["returned"] = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """
+        Borrow a connection for the duration of a `with` block.
+
+        The connection is always handed back to the pool. An exception raised
+        inside the block rolls the transaction back before it propagates, and
+        connections that broke at the protocol level are discarded.
+        """
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            # putconn() rolls back whatever was not committed; broken connections are dropped
+            self.putconn(conn, discard=bool(conn.closed))
+
+    # ------------------------------------
+    # -------------Housekeeping-----------
+
+    def stats(self) -> dict:
+        """Return a snapshot of pool sizing and counters."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "open": len(self._meta),
+                "idle": len(self._idle),
+                "in_use": len(self._meta) - len(self._idle),
+                "waiting": self._waiting,
+                "max_waiting": self.max_waiting,
+            })
+        snapshot["wait_time_total"] = round(snapshot["wait_time_total"], 6)
+        return snapshot
+
+    def closeall(self) -> None:
+        """Close idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._cond.notify_all()
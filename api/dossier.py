@@ -0,0 +1,100 @@
+import os
+
+# Entries per section when the request does not ask for a limit (override through environment variables)
+DOSSIER_CONFIG = {
+    "comments": int(os.environ.get("GREENGRID_DOSSIER_COMMENTS", 10)),
+    "maintenance": int(os.environ.get("GREENGRID_DOSSIER_MAINTENANCE", 5)),
+}
+# Upper bound of a section limit and of the ids of one /trees/dossier request
+MAX_SECTION_LIMIT = 1000
+MAX_DOSSIER_IDS = 100
+
+# One JSON document per tree: its attributes, its latest comments and
+# maintenance events and the total count of each, in the order of the
+# requested ids. Each section is a LATERAL subquery reading only its tree's
+# rows through idx_comm_tree_id / idx_maint_tree_id, and Postgres renders the
+# document as text, so Python neither runs extra queries nor re-encodes it.
+# params: ids (int[]), comments (int), maintenance (int)
+DOSSIER_SQL = """
+    SELECT t.tree_id,
+           ((to_jsonb(t) - 'geometry') || jsonb_build_object(
+               'geometry', ST_AsGeoJSON(t.geometry),
+               'comment_count', c.total,
+               'comments', c.entries,
+               'maintenance_count', m.total,
+               'maintenance', m.entries
+           ))::text AS dossier
+    FROM unnest(%(ids)s::int[]) WITH ORDINALITY AS requested(tree_id, position)
+    JOIN pa.trees t ON t.tree_id = requested.tree_id
+    CROSS JOIN LATERAL (
+        SELECT (SELECT count(*) FROM pa.comments WHERE tree_id = t.tree_id) AS total,
+               COALESCE(jsonb_agg(latest ORDER BY latest.created_at DESC), '[]'::jsonb) AS entries
+        FROM (
+            SELECT username, comment, created_at
+            FROM pa.comments
+            WHERE tree_id = t.tree_id
+            ORDER BY created_at DESC
+            LIMIT %(comments)s
+        ) latest
+    ) c
+    CROSS JOIN LATERAL (
+        SELECT (SELECT count(*) FROM pa.maintenance WHERE tree_id = t.tree_id) AS total,
+               COALESCE(jsonb_agg(latest ORDER BY latest.maint_date DESC), '[]'::jsonb) AS entries
+        FROM (
+            SELECT mt.maint_date, o.op_description, mt.observation, mt.officer,
+                   t.manutencao AS maintenance_authority
+            FROM pa.maintenance mt
+            JOIN pa.operations o ON mt.op_code = o.op_code
+            WHERE mt.tree_id = t.tree_id
+            ORDER BY mt.maint_date DESC
+            LIMIT %(maintenance)s
+        ) latest
+    ) m
+    ORDER BY requested.position
+"""
+
+
+def section_limits(args) -> dict:
+    """
+    Read the `comments` and `maintenance` section limits of a dossier request.
+
+    Raises:
+        ValueError: If a limit is not an integer between 0 and MAX_SECTION_LIMIT.
+    """
+    limits = {}
+    for section, default in DOSSIER_CONFIG.items():
+        error = f"'{section}' must be an integer between 0 and {MAX_SECTION_LIMIT}"
+        # Parsed here, not with args.get(type=int), which falls back to the default on malformed values
+        try:
+            limit = int(args[section]) if section in args else default
+        except ValueError:
+            raise ValueError(error) from None
+        if not 0 <= limit <= MAX_SECTION_LIMIT:
+            raise ValueError(error)
+        limits[section] = limit
+    return limits
+
+
+def dossier_ids(args) -> list:
+    """
+    Read the comma-separated `ids` of a /trees/dossier request, dropping repeats.
+
+    Raises:
+        ValueError: If `ids` is missing, malformed or lists more than MAX_DOSSIER_IDS trees.
+    """
+    try:
+        ids = [int(i) for i in args.get('ids', default='').split(',') if i.strip()]
+    except ValueError:
+        raise ValueError("'ids' must be a comma-separated list of tree ids") from None
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValueError("Missing 'ids'")
+    if len(ids) > MAX_DOSSIER_IDS:
+        raise ValueError(f"At most {MAX_DOSSIER_IDS} ids per request")
+    return ids
+
+
+def read_dossiers(cur, ids: list, limits: dict) -> list:
+    """Run DOSSIER_SQL; return (tree_id, dossier JSON text) pairs in the order of `ids`."""
+    cur.execute(DOSSIER_SQL, {"ids": ids, **limits})
+    return [(row['tree_id'], row['dossier']) for row in cur.fetchall()]
@@ -0,0 +1,310 @@
+import json
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+# Histogram upper bounds: seconds, bytes and rows
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# Statement label: the verb and first schema-qualified relation, e.g. "SELECT pa.trees"
+STATEMENT_RELATION = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+([a-z_][a-z0-9_]*\.[a-z_][a-z0-9_]*)", re.IGNORECASE)
+STATEMENT_SCAN = 1000       # Characters of a statement searched for its label (bulk INSERTs run to megabytes)
+SLOW_QUERY_MAX_CHARS = 2000  # Statement and parameter text kept in a slow-query log line
+
+slow_query_log = logging.getLogger("greengrid.slow_queries")
+
+
+def statement_name(query) -> str:
+    """Low-cardinality label of a SQL statement, e.g. "SELECT pa.trees" or "INSERT pa.comments"."""
+    if isinstance(query, bytes):
+        query = query[:STATEMENT_SCAN].decode("utf-8", "replace")
+    else:
+        query = str(query)[:STATEMENT_SCAN]
+    words = query.split(None, 1)
+    verb = words[0].upper() if words else ""
+    relation = STATEMENT_RELATION.search(query)
+    return f"{verb} {relation.group(1).lower()}" if relation else verb
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    Thread-safe Prometheus histogram with one series per combination of label values.
+
+    Args:
+        name (str): Metric name.
+        description (str): HELP text.
+        labels (tuple): Label names.
+        buckets (tuple): Increasing bucket upper bounds (+Inf is implicit).
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}   # label values -> [bucket counts..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        """Exposition lines: cumulative buckets, sum and count of every series."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(counts) for labels, counts in self._series.items()}
+        for label_values, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class ApiMetrics:
+    """
+    Request and database metrics of the API process, in the Prometheus text format.
+
+    `middleware` wraps the WSGI application and measures every request until
+    its body has been sent, so streamed responses count in full: latency by
+    method, route and status, response size and rows read from the database.
+    `TimedCursor`/`TimedTupleCursor` time every statement, split into
+    "execute" (the round trip of `execute`) and "serialize" (turning the
+    result into Python rows; for server-side cursors this includes fetching
+    them), and `get_db_connection` reports the time spent waiting for a
+    pooled connection ("acquire"). Statements slower than `slow_query_ms`
+    are logged with their parameters to the "greengrid.slow_queries" logger.
+
+    Metrics are kept per process: with several workers each one serves its own.
+
+    Args:
+        slow_query_ms (float): Threshold of the slow-query log, in milliseconds (0 disables it).
+    """
+
+    def __init__(self, slow_query_ms: float = 0):
+        self.slow_query_ms = slow_query_ms
+        self.requests = Histogram("greengrid_http_request_duration_seconds",
+                                  "Time from receiving a request to sending the last byte of its response.",
+                                  ("method", "route", "status"), LATENCY_BUCKETS)
+        self.response_bytes = Histogram("greengrid_http_response_size_bytes", "Response body size.",
+                                        ("method", "route"), SIZE_BUCKETS)
+        self.response_rows = Histogram("greengrid_http_response_rows", "Rows read from the database per request.",
+                                       ("method", "route"), ROW_BUCKETS)
+        self.db_acquire = Histogram("greengrid_db_acquire_seconds", "Time spent waiting for a pooled connection.",
+                                    ("route",), LATENCY_BUCKETS)
+        self.db_statements = Histogram("greengrid_db_statement_seconds",
+                                       "Time of a SQL statement by phase: execute or serialize.",
+                                       ("route", "statement", "phase"), LATENCY_BUCKETS)
+        self._collectors = []
+        self._local = threading.local()
+
+    # ------------------------------------
+    # ---------Request bookkeeping--------
+
+    def current(self):
+        """Bookkeeping of the request handled by this thread, or None outside requests."""
+        return getattr(self._local, "request", None)
+
+    def route(self) -> str:
+        request = self.current()
+        return request["route"] if request else "none"
+
+    def set_route(self, route: str) -> None:
+        """Label the current request with its URL rule (from a Flask `before_request` hook)."""
+        request = self.current()
+        if request is not None:
+            request["route"] = route or "unmatched"
+
+    def middleware(self, app):
+        """WSGI middleware measuring each request of `app`."""
+        metrics = self
+
+        def measured(environ, start_response):
+            request = {"route": "unmatched", "status": "500", "rows": 0,
+                       "method": environ.get("REQUEST_METHOD", ""), "started": time.perf_counter()}
+            metrics._local.request = request
+
+            def capture(status, headers, exc_info=None):
+                request["status"] = status.split(" ", 1)[0]
+                return start_response(status, headers, exc_info)
+
+            try:
+                body = app(environ, capture)
+            except BaseException:
+                metrics._finish(request, 0)
+                raise
+            return _MeasuredBody(body, lambda size: metrics._finish(request, size))
+
+        return measured
+
+    def _finish(self, request: dict, size: int) -> None:
+        method, route = request["method"], request["route"]
+        self.requests.observe(time.perf_counter() - request["started"], method, route, request["status"])
+        self.response_bytes.observe(size, method, route)
+        self.response_rows.observe(request["rows"], method, route)
+        if self.current() is request:
+            self._local.request = None
+
+    # ------------------------------------
+    # ---------Database bookkeeping-------
+
+    def acquired(self, seconds: float) -> None:
+        """Record the wait for a pooled connection."""
+        self.db_acquire.observe(seconds, self.route())
+
+    def statement(self, query, params, execute: float, serialize: float, rows: int) -> None:
+        """Record one SQL statement and log it if it was slow."""
+        route = self.route()
+        name = statement_name(query)
+        self.db_statements.observe(execute, route, name, "execute")
+        self.db_statements.observe(serialize, route, name, "serialize")
+        if self.slow_query_ms and (execute + serialize) * 1000 >= self.slow_query_ms:
+            if isinstance(query, bytes):
+                query = query[:SLOW_QUERY_MAX_CHARS].decode("utf-8", "replace")
+            slow_query_log.warning(json.dumps({
+                "route": route, "statement": name, "ms": round((execute + serialize) * 1000, 1),
+                "execute_ms": round(execute * 1000, 1), "serialize_ms": round(serialize * 1000, 1), "rows": rows,
+                "sql": " ".join(str(query).split())[:SLOW_QUERY_MAX_CHARS],
+                "params": repr(params)[:SLOW_QUERY_MAX_CHARS] if params is not None else None,
+            }))
+
+    def fetched(self, rows: int) -> None:
+        """Count rows read by the current request."""
+        request = self.current()
+        if request is not None:
+            request["rows"] += rows
+
+    # ------------------------------------
+    # ------------Exposition--------------
+
+    def collect(self, prefix: str, snapshot) -> None:
+        """Expose the numeric values of `snapshot()` (e.g. a `stats()` method) as gauges named `<prefix>_<key>`."""
+        self._collectors.append((prefix, snapshot))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for histogram in (self.requests, self.response_bytes, self.response_rows, self.db_acquire, self.db_statements):
+            lines += histogram.render()
+        for prefix, snapshot in self._collectors:
+            for key, value in (snapshot() or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines += [f"# TYPE {prefix}_{key} gauge", f"{prefix}_{key} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+class _MeasuredBody:
+    """Response iterable counting the bytes sent and reporting them when the server closes it."""
+
+    def __init__(self, body, done):
+        self.body = body
+        self.done = done
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.done(self.size)
+
+
+# Process-wide metrics, shared by the API and its cursors
+api_metrics = ApiMetrics()
+
+
+class TimedCursorMixin:
+    """Time `execute` and the fetches of each statement and report them to `api_metrics` when it is done."""
+
+    _statement = None
+
+    def execute(self, query, vars=None):
+        self._report()
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._statement = [query, vars, time.perf_counter() - started, 0.0, 0]
+
+    def _fetched(self, started: float, rows: int) -> None:
+        if self._statement is not None:
+            self._statement[3] += time.perf_counter() - started
+            self._statement[4] += rows
+        api_metrics.fetched(rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __iter__(self):
+        rows = super().__iter__()
+        while True:
+            started = time.perf_counter()
+            row = next(rows, None)
+            self._fetched(started, row is not None)
+            if row is None:
+                return
+            yield row
+
+    def _report(self) -> None:
+        if self._statement is not None:
+            api_metrics.statement(*self._statement)
+            self._statement = None
+
+    def close(self):
+        self._report()
+        return super().close()
+
+
+class TimedCursor(TimedCursorMixin, RealDictCursor):
+    """`RealDictCursor` (rows as dicts) reporting its statements to `api_metrics`."""
+
+
+class TimedTupleCursor(TimedCursorMixin, extensions.cursor):
+    """Plain tuple cursor reporting its statements to `api_metrics`."""
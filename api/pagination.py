@@ -0,0 +1,104 @@
+from urllib.parse import urlencode
+
+# Columns of pa.trees that can be requested with `fields=`; tree_id is always returned
+TREE_FIELDS = ["tree_id", "nome_vulga", "especie", "tipologia", "pap", "manutencao",
+               "ocupacao", "local", "morada", "freguesia", "geometry"]
+
+MAX_PAGE_SIZE = 10000
+
+
+class Page:
+    """
+    Keyset pagination and field projection of a tree listing.
+
+    Pages are ordered by `tree_id`; `after` is the last id of the previous
+    page, so every page is read with an index range scan on the primary key
+    and deep pages cost the same as the first one.
+
+    Args:
+        after (int): Return trees with `tree_id` greater than this value.
+        limit (int): Maximum number of trees in the page (None for all).
+        fields (list[str]): Columns to return (None for all).
+    """
+
+    def __init__(self, after: int = None, limit: int = None, fields: list = None):
+        self.after = after
+        self.limit = limit
+        self.fields = fields
+        self.next_cursor = None
+
+    @classmethod
+    def from_args(cls, args) -> "Page":
+        """
+        Build a page from request arguments (`after`, `limit`, `fields`).
+
+        Raises:
+            ValueError: If an argument is malformed or names an unknown field.
+        """
+        after = args.get('after', type=int)
+        limit = args.get('limit', type=int)
+        if 'after' in args and after is None:
+            raise ValueError("'after' must be an integer tree_id")
+        if 'limit' in args and (limit is None or not 1 <= limit <= MAX_PAGE_SIZE):
+            raise ValueError(f"'limit' must be an integer between 1 and {MAX_PAGE_SIZE}")
+
+        fields = None
+        if args.get('fields'):
+            fields = [f.strip() for f in args['fields'].split(',') if f.strip()]
+            unknown = [f for f in fields if f not in TREE_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+            # tree_id always comes first: it is the pagination key
+            fields = ["tree_id"] + [f for f in fields if f != "tree_id"]
+        return cls(after, limit, fields)
+
+    @property
+    def columns(self) -> list:
+        """Requested columns, in TREE_FIELDS order when no projection was asked for."""
+        return self.fields or TREE_FIELDS
+
+    def where(self, where: str, params) -> tuple:
+        """Add the keyset condition to a listing's WHERE clause."""
+        if self.after is None:
+            return where, tuple(params)
+        return f"({where}) AND t.tree_id > %s", tuple(params) + (self.after,)
+
+    @property
+    def limit_sql(self) -> str:
+        """LIMIT clause fetching one row more than the page, to know whether another page follows."""
+        return "" if self.limit is None else f"LIMIT {int(self.limit) + 1}"
+
+    def batches(self, cur, size: int, key=lambda row: row[0]):
+        """
+        Yield the rows of an executed listing query in lists of at most `size`.
+
+        Without a limit the cursor is read batch by batch. With a limit the
+        bounded page is read up front so `next_cursor` is known before the
+        first batch is handed out.
+
+        Args:
+            cur: Executed cursor ordered by tree_id.
+            size (int): Rows per batch.
+            key: Function returning the tree_id of a row.
+        """
+        if self.limit is None:
+            rows = cur.fetchmany(size)
+            while rows:
+                yield rows
+                rows = cur.fetchmany(size)
+            return
+
+        rows = cur.fetchmany(self.limit + 1)
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            self.next_cursor = key(rows[-1])
+        for start in range(0, len(rows), size):
+            yield rows[start:start + size]
+
+    def link(self, base_url: str, args) -> str:
+        """Return the `Link: <...>; rel="next"` header value for the next page, if any."""
+        if self.next_cursor is None:
+            return None
+        query = {k: v for k, v in args.items(multi=True) if k != 'after'}
+        query['after'] = self.next_cursor
+        return f'<{base_url}?{urlencode(query)}>; rel="next"'
@@ -0,0 +1,59 @@
+# Zoom levels accepted by /parishes (XYZ scheme, as the vector tiles)
+MIN_ZOOM = 0
+MAX_ZOOM = 22
+DEFAULT_ZOOM = 11
+
+# The parish choropleth as one GeoJSON FeatureCollection, rendered by Postgres
+# from pa.parish_choropleth (greengrid_db/08-create_stats_views.sql): for every
+# parish, the boundary of the most detailed zoom band starting at or below the
+# requested zoom, with its tree count, density and species richness.
+# params: zoom (int)
+PARISHES_SQL = """
+    SELECT json_build_object(
+        'type', 'FeatureCollection',
+        'zoom_band', min(zoom_band),
+        'features', COALESCE(json_agg(json_build_object(
+            'type', 'Feature',
+            'id', id,
+            'geometry', geometry::json,
+            'properties', json_build_object(
+                'id', id,
+                'freguesia', freguesia,
+                'tree_count', tree_count,
+                'species_count', species_count,
+                'area_km2', area_km2,
+                'density_km2', density_km2
+            )
+        ) ORDER BY freguesia), '[]'::json)
+    )::text AS collection
+    FROM (
+        SELECT DISTINCT ON (id) *
+        FROM pa.parish_choropleth
+        WHERE min_zoom <= %(zoom)s
+        ORDER BY id, min_zoom DESC
+    ) band
+"""
+
+
+def zoom_level(args) -> int:
+    """
+    Read the `zoom` of a /parishes request (default: DEFAULT_ZOOM).
+
+    Raises:
+        ValueError: If `zoom` is not an integer between MIN_ZOOM and MAX_ZOOM.
+    """
+    error = f"'zoom' must be an integer between {MIN_ZOOM} and {MAX_ZOOM}"
+    # Parsed here, not with args.get(type=int), which falls back to the default on malformed values
+    try:
+        zoom = int(args['zoom']) if 'zoom' in args else DEFAULT_ZOOM
+    except ValueError:
+        raise ValueError(error) from None
+    if not MIN_ZOOM <= zoom <= MAX_ZOOM:
+        raise ValueError(error)
+    return zoom
+
+
+def read_parishes(cur, zoom: int) -> str:
+    """Run PARISHES_SQL; return the FeatureCollection as GeoJSON text."""
+    cur.execute(PARISHES_SQL, {"zoom": zoom})
+    return cur.fetchone()['collection']
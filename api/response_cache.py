@@ -0,0 +1,251 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, make_response, request
+
+# Bumps the generation of a table inside the caller's transaction
+BUMP_SQL = """
+    INSERT INTO pa.data_version (table_name, generation, updated_at)
+    VALUES (%s, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (table_name) DO UPDATE
+        SET generation = pa.data_version.generation + 1,
+            updated_at = CURRENT_TIMESTAMP
+    RETURNING generation, updated_at
+"""
+
+VERSION_SQL = "SELECT generation, updated_at FROM pa.data_version WHERE table_name = %s"
+
+# Response headers that belong to the body and are replayed on cache hits
+CACHED_HEADERS = ("Content-Disposition", "X-Next-Cursor", "Link")
+
+
+class DataVersions:
+    """
+    Per-table generation counters backed by the `pa.data_version` table.
+
+    Writes made through this process are observed immediately; writes made
+    elsewhere (the ETL load, other API workers) are picked up by re-reading
+    the table at most every `revalidate_after` seconds. Listeners registered
+    with `on_change` are told when such an outside change is noticed.
+
+    Args:
+        connection: Context manager factory that lends a database connection.
+        revalidate_after (float): Seconds a known generation is trusted.
+    """
+
+    def __init__(self, connection, revalidate_after: float = 5.0):
+        self.connection = connection
+        self.revalidate_after = revalidate_after
+        self._versions = {}   # table -> (generation, updated_at, checked_at)
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def on_change(self, callback) -> None:
+        """Register `callback(table)` for changes made outside this process."""
+        self._listeners.append(callback)
+
+    def current(self, table: str) -> tuple:
+        """Return `(generation, last_modified)` for a table, re-reading it if stale."""
+        with self._lock:
+            known = self._versions.get(table)
+        if known is None or time.monotonic() - known[2] >= self.revalidate_after:
+            return self.refresh(table)
+        return known[0], known[1]
+
+    def refresh(self, table: str) -> tuple:
+        """Read the generation of a table from the database."""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute(VERSION_SQL, (table,))
+            row = cur.fetchone()
+        if row is None:
+            return self._store(table, 0, datetime.fromtimestamp(0, timezone.utc), external=True)
+        return self._store(table, row['generation'], row['updated_at'], external=True)
+
+    def bump(self, cur, table: str) -> tuple:
+        """
+        Increment the generation of a table within the caller's transaction.
+
+        Call `observe` with the result once the transaction has committed.
+        """
+        cur.execute(BUMP_SQL, (table,))
+        row = cur.fetchone()
+        return table, row['generation'], row['updated_at']
+
+    def observe(self, bumped: tuple) -> None:
+        """Record a generation produced by `bump` after its transaction committed."""
+        table, generation, updated_at = bumped
+        self._store(table, generation, updated_at, external=False)
+
+    def _store(self, table: str, generation: int, updated_at, external: bool) -> tuple:
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        with self._lock:
+            known = self._versions.get(table)
+            if known is not None and known[0] > generation:
+                # A concurrent bump already moved past this value
+                return known[0], known[1]
+            changed = known is not None and known[0] != generation
+            self._versions[table] = (generation, updated_at, time.monotonic())
+        if changed and external:
+            for callback in self._listeners:
+                callback(table)
+        return generation, updated_at
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of response bodies, bounded by entry count and bytes.
+
+    Entries are stored together with the table generation they were built
+    from and are only served while that generation is still current.
+
+    Args:
+        max_entries (int): Maximum number of cached responses.
+        max_bytes (int): Maximum total size of the cached bodies.
+        max_entry_bytes (int): Responses larger than this are never cached.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 256 * 1024 * 1024,
+                 max_entry_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self._entries = OrderedDict()   # key -> (generation, body, mimetype, headers)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key, generation: int):
+        """Return the cached entry for `key` if it was built from `generation`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, generation: int, body: bytes, mimetype: str, headers: dict) -> None:
+        """Store a response body, evicting the least recently used ones beyond the bounds."""
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (generation, body, mimetype, headers)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[1])
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Return a snapshot of cache size and counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+            }
+
+    def _tee(self, chunks, key, generation: int, mimetype: str, headers: dict):
+        """Pass a streamed body through, keeping a copy to cache if it stays small enough."""
+        captured, size = [], 0
+        try:
+            for chunk in chunks:
+                if captured is not None:
+                    data = chunk.encode() if isinstance(chunk, str) else chunk
+                    size += len(data)
+                    if size <= self.max_entry_bytes:
+                        captured.append(data)
+                    else:
+                        captured = None
+                yield chunk
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+        if captured is not None:
+            self.put(key, generation, b"".join(captured), mimetype, headers)
+
+    def cached(self, versions: DataVersions, table: str, max_age: int = 0):
+        """
+        Decorate a GET view so its responses are cached and conditionally served.
+
+        The cache key is the route path, its sorted query arguments and the
+        `Accept` header. The ETag combines the table generation with that key,
+        so an `If-None-Match` with the current ETag is answered with 304
+        without running the view or touching the cache.
+
+        Args:
+            versions (DataVersions): Generation counters of the source tables.
+            table (str): Table whose generation the responses depend on.
+            max_age (int): Seconds clients and proxies may reuse a response
+                without revalidating; 0 makes them revalidate every time.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                generation, last_modified = versions.current(table)
+                key = (request.path, tuple(sorted(request.args.items(multi=True))),
+                       request.headers.get("Accept", ""))
+                digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+                etag = f"{table}-{generation}-{digest}"
+                last_modified = last_modified.replace(microsecond=0)
+
+                if etag in request.if_none_match or (
+                        not request.if_none_match and request.if_modified_since
+                        and last_modified <= request.if_modified_since):
+                    with self._lock:
+                        self.not_modified += 1
+                    response = Response(status=304)
+                    return self._validators(response, etag, last_modified, max_age)
+
+                entry = self.get(key, generation)
+                if entry is not None:
+                    _, body, mimetype, headers = entry
+                    response = Response(body, mimetype=mimetype, headers=headers)
+                    return self._validators(response, etag, last_modified, max_age)
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    headers = {k: v for k, v in response.headers.items() if k in CACHED_HEADERS}
+                    if response.is_streamed:
+                        response.response = self._tee(response.response, key, generation,
+                                                      response.mimetype, headers)
+                    else:
+                        self.put(key, generation, response.get_data(), response.mimetype, headers)
+                    self._validators(response, etag, last_modified, max_age)
+                return response
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _validators(response: Response, etag: str, last_modified, max_age: int = 0) -> Response:
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        if max_age:
+            response.headers["Cache-Control"] = f"public, max-age={max_age}"
+        else:
+            response.headers["Cache-Control"] = "no-cache"   # always revalidate, 304 is cheap
+        response.vary.add("Accept")
+        return response
@@ -0,0 +1,92 @@
+# Proximity queries on pa.trees.
+#
+# Both queries go through `t.geometry::geography`, which matches the expression
+# index idx_trees_geog (greengrid_db/04-create_indexes.sql) exactly: the radius
+# filter becomes an index range scan followed by an exact distance check, and
+# the nearest-neighbour ordering walks the same index (KNN) instead of sorting
+# every tree by distance. Any other spelling of the expression loses the index.
+
+# Longitude/latitude bounds accepted for a search point (WGS 84)
+MAX_LON = 180.0
+MAX_LAT = 90.0
+# Upper bounds of the radius (meters) and of the number of neighbours
+MAX_RADIUS = 20000.0   # beyond the whole of Lisbon
+MAX_NEIGHBOURS = 1000
+# Defaults of the radius (meters) and of the number of neighbours
+DEFAULT_RADIUS = 100.0
+DEFAULT_NEIGHBOURS = 10
+
+# WHERE condition of /trees/near; params: (lon, lat, radius in meters)
+NEAR_WHERE = "ST_DWithin(t.geometry::geography, ST_MakePoint(%s, %s)::geography, %s)"
+
+# The k trees closest to a point; params: (lon, lat, lon, lat, k)
+NEAREST_SQL = """
+    SELECT t.*, ST_AsGeoJSON(t.geometry) AS geometry,
+           round(ST_Distance(t.geometry::geography, ST_MakePoint(%s, %s)::geography)::numeric, 2)::float8
+               AS distance_m
+    FROM pa.trees t
+    ORDER BY t.geometry::geography <-> ST_MakePoint(%s, %s)::geography
+    LIMIT %s
+"""
+
+
+def search_point(args) -> tuple:
+    """
+    Read the `lon`/`lat` arguments of a proximity search.
+
+    Returns:
+        tuple: (lon, lat) in degrees.
+
+    Raises:
+        ValueError: If a coordinate is missing, malformed or out of range.
+    """
+    try:
+        lon = float(args['lon'])
+        lat = float(args['lat'])
+    except (KeyError, ValueError):
+        raise ValueError("'lat' and 'lon' are required decimal degrees") from None
+    if not (-MAX_LON <= lon <= MAX_LON and -MAX_LAT <= lat <= MAX_LAT):
+        raise ValueError("'lat' or 'lon' out of range")
+    return lon, lat
+
+
+# The arguments are parsed here, not with args.get(type=...), which falls
+# back to the default when a value is malformed instead of rejecting it.
+
+def search_radius(args) -> float:
+    """
+    Read the `radius` of a /trees/near request, in meters (default: DEFAULT_RADIUS).
+
+    Raises:
+        ValueError: If `radius` is not a number greater than 0 and at most MAX_RADIUS.
+    """
+    error = f"'radius' must be between 0 and {MAX_RADIUS:g} meters"
+    try:
+        radius = float(args['radius']) if 'radius' in args else DEFAULT_RADIUS
+    except ValueError:
+        raise ValueError(error) from None
+    if not 0 < radius <= MAX_RADIUS:
+        raise ValueError(error)
+    return radius
+
+
+def neighbour_count(args) -> int:
+    """
+    Read the `k` of a /trees/nearest request (default: DEFAULT_NEIGHBOURS).
+
+    Raises:
+        ValueError: If `k` is not an integer between 1 and MAX_NEIGHBOURS.
+    """
+    error = f"'k' must be an integer between 1 and {MAX_NEIGHBOURS}"
+    try:
+        k = int(args['k']) if 'k' in args else DEFAULT_NEIGHBOURS
+    except ValueError:
+        raise ValueError(error) from None
+    if not 1 <= k <= MAX_NEIGHBOURS:
+        raise ValueError(error)
+    return k
+
+
+def nearest_params(lon: float, lat: float, k: int) -> tuple:
+    """Parameters of NEAREST_SQL for the `k` trees closest to (lon, lat)."""
+    return lon, lat, lon, lat, k
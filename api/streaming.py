@@ -0,0 +1,90 @@
+from metrics import TimedTupleCursor
+from pagination import Page
+
+# Rows fetched per round trip by the server-side cursor; also the number of features per chunk
+STREAM_ITERSIZE = 2000
+
+# Postgres renders each row as a complete GeoJSON Feature, so Python only joins text
+FEATURE_SQL = """
+    SELECT t.tree_id,
+           json_build_object(
+               'type', 'Feature',
+               'id', t.tree_id,
+               'geometry', {geometry},
+               'properties', {properties}
+           )::text
+    FROM pa.trees t
+    WHERE {where}
+    ORDER BY t.tree_id
+    {limit}
+"""
+
+
+def feature_sql(page: Page, where: str) -> str:
+    """Build the Feature query for a page, projecting only the requested fields."""
+    if page.fields is None:
+        properties = "to_jsonb(t) - 'geometry'"
+    else:
+        pairs = ", ".join(f"'{f}', t.{f}" for f in page.fields if f != "geometry")
+        properties = f"jsonb_build_object({pairs})"
+    geometry = "ST_AsGeoJSON(t.geometry)::json" if "geometry" in page.columns else "NULL"
+    return FEATURE_SQL.format(geometry=geometry, properties=properties, where=where, limit=page.limit_sql)
+
+
+def feature_collection_chunks(connection, page: Page, where: str, params, itersize: int = STREAM_ITERSIZE):
+    """
+    Yield a GeoJSON FeatureCollection of `pa.trees` as text chunks.
+
+    Rows are read through a named (server-side) cursor, `itersize` at a time,
+    so memory stays flat regardless of how many trees match. The first chunk
+    is yielded as soon as the first rows (or, for a limited page, the whole
+    page and therefore `page.next_cursor`) are known.
+
+    Args:
+        connection: Context manager factory that lends a database connection,
+            e.g. `get_db_connection`. It stays borrowed until the generator ends
+            or is closed.
+        page (Page): Keyset position, page size and field projection.
+        where (str): SQL condition on the `t` alias (trusted, parameterised).
+        params: Parameters for the placeholders in `where`.
+        itersize (int): Features fetched and emitted per chunk.
+
+    Yields:
+        str: Consecutive pieces of the FeatureCollection document.
+    """
+    where, params = page.where(where, params)
+    with connection() as conn:
+        # Plain tuple cursor: (tree_id, feature text) per row, no per-row dicts
+        with conn.cursor(name="tree_features", cursor_factory=TimedTupleCursor) as cur:
+            cur.itersize = itersize
+            cur.execute(feature_sql(page, where), params)
+            batches = page.batches(cur, itersize)
+            batch = next(batches, None)
+            yield '{"type": "FeatureCollection", "features": ['
+            separator = ""
+            while batch is not None:
+                yield separator + ",".join(row[1] for row in batch)
+                separator = ","
+                batch = next(batches, None)
+            yield "]}"
+
+
+def primed(chunks):
+    """
+    Start a chunk generator before the response is returned.
+
+    Running it to its first chunk borrows the connection and executes the
+    query inside the request, so pool or SQL errors still become regular
+    error responses. Closing the returned iterator (e.g. when the client
+    disconnects) closes the generator and hands the connection back.
+    """
+    first = next(chunks)
+
+    def body():
+        try:
+            yield first
+            yield from chunks
+        finally:
+            chunks.close()
+
+    return body()
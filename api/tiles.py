@@ -0,0 +1,261 @@
+import math
+import threading
+from collections import OrderedDict
+
+# Half the width of the Web Mercator (EPSG:3857) world, in meters
+MERCATOR_EXTENT = 20037508.342789244
+# Tile geometry resolution and the buffer (in tile units) kept around each tile edge
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MAX_ZOOM = 22
+
+# Attributes encoded per zoom band, highest band first. Below the lowest band
+# trees are aggregated into grid cells carrying only a `tree_count`.
+TILE_ZOOM_BANDS = [
+    (16, ["tree_id", "nome_vulga", "especie", "tipologia", "pap", "freguesia"]),
+    (14, ["tree_id", "especie"]),
+]
+# Grid cells per tile side used when aggregating trees at low zooms
+CLUSTER_GRID = 64
+
+
+# ------------------------------------
+# ----------Tile coordinate math------
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    """Return True if (z, x, y) addresses an existing XYZ tile."""
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z: int, x: int, y: int, buffer: float = 0.0) -> tuple:
+    """
+    Return the Web Mercator bounds of an XYZ tile.
+
+    Args:
+        z, x, y (int): Tile address.
+        buffer (float): Extra margin as a fraction of the tile width.
+
+    Returns:
+        tuple: (xmin, ymin, xmax, ymax) in EPSG:3857 meters.
+    """
+    size = 2 * MERCATOR_EXTENT / 2 ** z
+    margin = size * buffer
+    xmin = -MERCATOR_EXTENT + x * size
+    ymax = MERCATOR_EXTENT - y * size
+    return (xmin - margin, ymax - size - margin, xmin + size + margin, ymax + margin)
+
+
+def mercator_to_lonlat(mx: float, my: float) -> tuple:
+    """Convert EPSG:3857 meters to EPSG:4326 degrees."""
+    lon = mx / MERCATOR_EXTENT * 180.0
+    lat = math.degrees(2 * math.atan(math.exp(my / MERCATOR_EXTENT * math.pi)) - math.pi / 2)
+    return lon, lat
+
+
+def lonlat_to_mercator(lon: float, lat: float) -> tuple:
+    """Convert EPSG:4326 degrees to EPSG:3857 meters."""
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    mx = lon * MERCATOR_EXTENT / 180.0
+    my = math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) * MERCATOR_EXTENT / math.pi
+    return mx, my
+
+
+def tiles_covering_point(lon: float, lat: float, z: int, buffer: float = TILE_BUFFER / TILE_EXTENT):
+    """
+    Yield every tile at zoom `z` whose buffered extent contains the point.
+
+    A point close to a tile edge is also drawn by the neighbouring tile
+    because of the tile buffer, so those tiles are returned as well.
+    """
+    mx, my = lonlat_to_mercator(lon, lat)
+    n = 2 ** z
+    size = 2 * MERCATOR_EXTENT / n
+    margin = size * buffer
+    x0 = int(math.floor((mx - margin + MERCATOR_EXTENT) / size))
+    x1 = int(math.floor((mx + margin + MERCATOR_EXTENT) / size))
+    y0 = int(math.floor((MERCATOR_EXTENT - my - margin) / size))
+    y1 = int(math.floor((MERCATOR_EXTENT - my + margin) / size))
+    for x in range(max(x0, 0), min(x1, n - 1) + 1):
+        for y in range(max(y0, 0), min(y1, n - 1) + 1):
+            yield (z, x, y)
+
+
+# ------------------------------------
+# ------------Tile SQL----------------
+
+def tile_query(z: int, x: int, y: int) -> tuple:
+    """
+    Build the ST_AsMVT query and parameters for one tile.
+
+    The candidate rows are selected with `geometry && <4326 envelope>`, which
+    is answered by the `idx_trees_geom` GIST index, and only then projected to
+    Web Mercator for ST_AsMVTGeom.
+
+    Returns:
+        tuple: (sql, params) ready for `cursor.execute`.
+    """
+    tile = tile_bounds(z, x, y)
+    buffered = tile_bounds(z, x, y, TILE_BUFFER / TILE_EXTENT)
+    lon0, lat0 = mercator_to_lonlat(buffered[0], buffered[1])
+    lon1, lat1 = mercator_to_lonlat(buffered[2], buffered[3])
+    params = {
+        "xmin": tile[0], "ymin": tile[1], "xmax": tile[2], "ymax": tile[3],
+        "lon0": lon0, "lat0": lat0, "lon1": lon1, "lat1": lat1,
+        "extent": TILE_EXTENT, "buffer": TILE_BUFFER,
+    }
+
+    for min_zoom, columns in TILE_ZOOM_BANDS:
+        if z >= min_zoom:
+            attrs = ", ".join(f"t.{col}" for col in columns)
+            sql = f"""
+                WITH mvtgeom AS (
+                    SELECT ST_AsMVTGeom(
+                               ST_Transform(t.geometry, 3857),
+                               ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 3857),
+                               %(extent)s, %(buffer)s, true
+                           ) AS geom,
+                           {attrs}
+                    FROM pa.trees t
+                    WHERE t.geometry && ST_MakeEnvelope(%(lon0)s, %(lat0)s, %(lon1)s, %(lat1)s, 4326)
+                )
+                SELECT ST_AsMVT(mvtgeom.*, 'trees', %(extent)s, 'geom') AS tile
+                FROM mvtgeom
+                WHERE geom IS NOT NULL
+            """
+            return sql, params
+
+    # Low zooms: snap trees to a coarse grid and emit one point per occupied cell
+    params["cell"] = (tile[2] - tile[0]) / CLUSTER_GRID
+    sql = """
+        WITH points AS (
+            SELECT ST_Transform(t.geometry, 3857) AS geom
+            FROM pa.trees t
+            WHERE t.geometry && ST_MakeEnvelope(%(lon0)s, %(lat0)s, %(lon1)s, %(lat1)s, 4326)
+        ),
+        clusters AS (
+            SELECT ST_AsMVTGeom(
+                       ST_Centroid(ST_Collect(geom)),
+                       ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 3857),
+                       %(extent)s, %(buffer)s, true
+                   ) AS geom,
+                   count(*) AS tree_count
+            FROM points
+            GROUP BY ST_SnapToGrid(geom, %(cell)s)
+        )
+        SELECT ST_AsMVT(clusters.*, 'trees', %(extent)s, 'geom') AS tile
+        FROM clusters
+        WHERE geom IS NOT NULL
+    """
+    return sql, params
+
+
+# ------------------------------------
+# ------------Tile cache--------------
+
+class TileCache:
+    """
+    Thread-safe LRU cache of encoded tiles, bounded by entry count and bytes.
+
+    Args:
+        max_entries (int): Maximum number of cached tiles.
+        max_bytes (int): Maximum total size of the cached tile bodies.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._tiles = OrderedDict()   # (z, x, y) -> bytes, least recently used first
+        self._zooms = {}              # z -> number of cached tiles at that zoom
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so tiles rendered before a write are never stored after it
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        """Return the cached tile for `key` or None, marking it as recently used."""
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put(self, key: tuple, tile: bytes, generation: int = None) -> None:
+        """
+        Store a tile, evicting the least recently used ones beyond the bounds.
+
+        Args:
+            key (tuple): (z, x, y) tile address.
+            tile (bytes): Encoded tile body.
+            generation (int): Value of `generation` read before the tile was
+                rendered; the tile is dropped if an invalidation happened since.
+        """
+        if len(tile) > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._remove(key)
+            self._tiles[key] = tile
+            self._bytes += len(tile)
+            self._zooms[key[0]] = self._zooms.get(key[0], 0) + 1
+            while len(self._tiles) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._tiles)))
+                self.evictions += 1
+
+    def _remove(self, key: tuple) -> bool:
+        tile = self._tiles.pop(key, None)
+        if tile is None:
+            return False
+        self._bytes -= len(tile)
+        self._zooms[key[0]] -= 1
+        if not self._zooms[key[0]]:
+            del self._zooms[key[0]]
+        return True
+
+    def invalidate_point(self, lon: float, lat: float) -> int:
+        """
+        Drop every cached tile, at any zoom, that draws the given location.
+
+        Returns:
+            int: Number of tiles removed.
+        """
+        if lon is None or lat is None:
+            return 0
+        removed = 0
+        with self._lock:
+            self.generation += 1
+            for z in list(self._zooms):
+                for key in tiles_covering_point(lon, lat, z):
+                    removed += self._remove(key)
+            self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        """Drop every cached tile."""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._tiles)
+            self._tiles.clear()
+            self._zooms.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Return a snapshot of cache size and counters."""
+        with self._lock:
+            return {
+                "entries": len(self._tiles),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,107 @@
+"""
+Compare the write throughput of the single-record and bulk API endpoints.
+
+For every record kind the script writes the same number of records twice:
+once with one request per record (`POST /tree/<id>/comment`,
+`POST /tree/<id>/maintenance`, `POST /tree`) and once through the batch
+endpoints (`/comments/batch`, `/maintenance/batch`, `/trees/batch`), and
+reports records per second for both.
+
+The records are really written: run it against a development database.
+Comments and maintenance records are attached to existing trees; created
+trees get ids from `--tree-id-base` upwards and are deleted again unless
+`--keep` is given.
+
+Usage:
+    python greengrid_bench/api_batch.py --base-url http://127.0.0.1:5000 --records 2000 --batch-size 500
+"""
+import argparse
+import itertools
+import time
+
+import requests
+
+KINDS = ["comments", "maintenance", "trees"]
+
+# Baixa, Lisbon
+LON, LAT = -9.1394, 38.7107
+
+
+def make_records(kind: str, count: int, tree_ids: list, args) -> list:
+    """Build `count` records of a kind, spread over the given existing trees."""
+    trees = itertools.cycle(tree_ids)
+    if kind == "comments":
+        return [{"tree_id": next(trees), "username": args.username, "comment": f"benchmark comment {i}"}
+                for i in range(count)]
+    if kind == "maintenance":
+        return [{"tree_id": next(trees), "op_code": 4, "observation": f"benchmark inspection {i}",
+                 "officer": "bench", "maint_date": "2026-01-01"} for i in range(count)]
+    return [{"tree_id": args.tree_id_base + i, "especie": "Benchmark sp.", "nome_vulga": "Benchmark",
+             "pap": 50, "freguesia": "Santa Maria Maior", "lon": LON + i * 1e-6, "lat": LAT}
+            for i in range(count)]
+
+
+def single_url(base_url: str, kind: str, record: dict) -> str:
+    if kind == "comments":
+        return f"{base_url}/tree/{record['tree_id']}/comment"
+    if kind == "maintenance":
+        return f"{base_url}/tree/{record['tree_id']}/maintenance"
+    return f"{base_url}/tree"
+
+
+def write_single(session: requests.Session, base_url: str, kind: str, records: list) -> float:
+    """Write records one request at a time; return the elapsed seconds."""
+    started = time.perf_counter()
+    for record in records:
+        session.post(single_url(base_url, kind, record), json=record).raise_for_status()
+    return time.perf_counter() - started
+
+
+def write_batches(session: requests.Session, base_url: str, kind: str, records: list, batch_size: int) -> float:
+    """Write records through the batch endpoint; return the elapsed seconds."""
+    started = time.perf_counter()
+    for start in range(0, len(records), batch_size):
+        r = session.post(f"{base_url}/{kind}/batch", json=records[start:start + batch_size])
+        if r.status_code != 201:
+            raise RuntimeError(f"{kind}/batch answered {r.status_code}: {r.text[:200]}")
+    return time.perf_counter() - started
+
+
+def delete_trees(session: requests.Session, base_url: str, records: list) -> None:
+    for record in records:
+        session.delete(f"{base_url}/tree/{record['tree_id']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark single-record vs bulk writes of the GreenGrid API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--records", type=int, default=2000, help="Records written per kind and path")
+    parser.add_argument("--batch-size", type=int, default=500, help="Records per batch request")
+    parser.add_argument("--kinds", nargs="+", default=KINDS, choices=KINDS)
+    parser.add_argument("--username", default="saba_f", help="Existing user the comments are written as")
+    parser.add_argument("--tree-id-base", type=int, default=900000000, help="First id of the created trees")
+    parser.add_argument("--keep", action="store_true", help="Keep the created trees")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    session = requests.Session()
+    r = session.get(f"{base_url}/trees", params={"limit": 1000, "fields": "tree_id"})
+    r.raise_for_status()
+    tree_ids = [row["tree_id"] for row in r.json()]
+
+    print(f"{base_url} ({args.records} records per run, batches of {args.batch_size})")
+    print(f"{'kind':<13}{'single rec/s':>14}{'batch rec/s':>14}{'speed-up':>10}")
+    for kind in args.kinds:
+        records = make_records(kind, args.records, tree_ids, args)
+        single = write_single(session, base_url, kind, records)
+        if kind == "trees":
+            # the batch run creates the same ids again
+            delete_trees(session, base_url, records)
+        batched = write_batches(session, base_url, kind, records, args.batch_size)
+        if kind == "trees" and not args.keep:
+            delete_trees(session, base_url, records)
+        print(f"{kind:<13}{args.records / single:>14.0f}{args.records / batched:>14.0f}{single / batched:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
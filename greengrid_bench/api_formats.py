@@ -0,0 +1,83 @@
+"""
+Compare the tree listing output formats of the GreenGrid API.
+
+For every format the script downloads the same listing several times and
+reports the payload size, time to first byte, total transfer time and the
+client-side decode time (including the second `JSON.parse` of the geometry
+string that the default JSON format requires).
+
+Usage:
+    python greengrid_bench/api_formats.py --base-url http://127.0.0.1:5000 --path /trees --repeat 5
+"""
+import argparse
+import io
+import json
+import statistics
+import time
+
+import requests
+
+FORMATS = ["json", "geojson", "arrow", "parquet"]
+
+
+def decode(fmt: str, body: bytes) -> int:
+    """Decode a response body the way a client would and return the number of trees."""
+    if fmt == "json":
+        rows = json.loads(body)
+        for row in rows:
+            row["geometry"] = json.loads(row["geometry"])
+        return len(rows)
+    if fmt == "geojson":
+        return len(json.loads(body)["features"])
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if fmt == "arrow":
+        return pa.ipc.open_stream(body).read_all().num_rows
+    return pq.read_table(io.BytesIO(body)).num_rows
+
+
+def measure(session: requests.Session, url: str, fmt: str) -> dict:
+    """Download one listing in the given format and time each phase."""
+    started = time.perf_counter()
+    with session.get(url, params={"format": fmt}, stream=True) as r:
+        r.raise_for_status()
+        chunks = r.iter_content(chunk_size=64 * 1024)
+        first = next(chunks, b"")
+        ttfb = time.perf_counter() - started
+        body = first + b"".join(chunks)
+    transfer = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = decode(fmt, body)
+    decoding = time.perf_counter() - started
+    return {"bytes": len(body), "ttfb": ttfb, "transfer": transfer, "decode": decoding, "rows": rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark GreenGrid API output formats")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--path", default="/trees", help="Tree listing route to download")
+    parser.add_argument("--repeat", type=int, default=5, help="Downloads per format (median is reported)")
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    args = parser.parse_args()
+
+    url = f"{args.base_url.rstrip('/')}{args.path}"
+    session = requests.Session()
+    results = {}
+    for fmt in args.formats:
+        measure(session, url, fmt)  # warm-up: connection pool, database cache
+        runs = [measure(session, url, fmt) for _ in range(args.repeat)]
+        results[fmt] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+    baseline = results.get("json")
+    print(f"{url} (median of {args.repeat} runs)")
+    print(f"{'format':<9}{'rows':>9}{'MB':>10}{'vs json':>9}{'ttfb ms':>10}{'transfer ms':>13}{'decode ms':>11}{'total ms':>10}")
+    for fmt, r in results.items():
+        ratio = f"{r['bytes'] / baseline['bytes']:.2f}x" if baseline else "-"
+        print(f"{fmt:<9}{int(r['rows']):>9}{r['bytes'] / 1e6:>10.2f}{ratio:>9}{r['ttfb'] * 1e3:>10.1f}"
+              f"{r['transfer'] * 1e3:>13.1f}{r['decode'] * 1e3:>11.1f}{(r['transfer'] + r['decode']) * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
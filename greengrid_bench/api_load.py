@@ -0,0 +1,411 @@
+"""
+Concurrent load test of every API route, with latency percentiles and requests per second.
+
+The driver first discovers real tree ids, coordinates, parishes and species
+through the API (a few trees of every parish), so it works on the ETL data
+as well as on data from `api_seed.py`. Then, for each `--clients` level,
+that many closed-loop clients (one thread and HTTP session each) send
+requests back to back for `--warmup` plus `--duration` seconds, each
+request picking a route at random by its weight in ROUTES. Only requests
+started after the warm-up are measured: latency until the whole body is
+read, status and size. The per-route p50/p95/p99 and requests per second
+of each level are printed and, with `--output`, written as JSON for
+`api_report.py` to compare runs.
+
+The write routes really write. They only touch trees the driver creates
+itself, with ids from `--write-id-base` upwards (a pool of `--write-trees`
+created up front, plus the ones `POST /tree` creates and `DELETE` removes
+again); comments and maintenance records go to those trees. Everything the
+run created is deleted at the end unless `--keep` is given. `--read-only`
+leaves the database untouched.
+
+With `--db-breakdown` the API's /metrics are read before and after each
+level to show where the database time went: the statements with the most
+total time, and the time spent waiting for a pooled connection.
+
+Usage (from the repository root, with the API running):
+    python greengrid_bench/api_load.py --base-url http://127.0.0.1:5000 --clients 1 8 32 --duration 30
+    python greengrid_bench/api_load.py --read-only --routes "GET /trees/near" "GET /trees/nearest" --clients 16
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from api_report import print_summary, summarize
+
+WRITE_ID_BASE = 900_000_000
+BENCH_USER = "bench_user_000"    # Created by api_seed.py; comments need an existing user
+TILE_ZOOMS = [12, 13, 14, 15, 16]
+PAGE = 100                       # `limit` of the listing routes
+METRIC_LINE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+METRIC_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# ------------------------------------
+# --------Data used by the routes-----
+
+class Workload:
+    """
+    Trees, parishes and species to build requests from, and the trees owned by the driver.
+
+    Args:
+        trees (list): (tree_id, lon, lat) of existing trees.
+        parishes (list): Parish names.
+        species (list): Species names.
+        write_id_base (int): First tree id the driver may create.
+    """
+
+    def __init__(self, trees: list, parishes: list, species: list, write_id_base: int):
+        self.trees = trees
+        self.parishes = parishes
+        self.species = species
+        self.next_id = write_id_base
+        self.username = BENCH_USER
+        self.pool = []       # Owned trees that stay for the whole run: edited, commented, maintained
+        self.created = []    # Owned trees created by POST /tree, which DELETE removes again
+        self.lock = threading.Lock()
+
+    def new_id(self) -> int:
+        with self.lock:
+            self.next_id += 1
+            return self.next_id - 1
+
+    def take_created(self):
+        with self.lock:
+            return self.created.pop() if self.created else None
+
+    def add_created(self, tree_id: int) -> None:
+        with self.lock:
+            self.created.append(tree_id)
+
+
+def discover(session: requests.Session, base_url: str, per_parish: int) -> tuple:
+    """Trees, parishes and species of the database, read through the API."""
+    def get(path, **params):
+        response = session.get(f"{base_url}{path}", params=params, timeout=120)
+        response.raise_for_status()
+        return response.json()
+
+    parishes = [row["freguesia"] for row in get("/stats/freguesia") if row.get("freguesia")]
+    species = [row["especie"] for row in get("/stats/species") if row.get("especie")]
+    trees = []
+    for parish in parishes:
+        for row in get(f"/trees/freguesia/{quote(parish, safe='')}", fields="tree_id,geometry", limit=per_parish):
+            lon, lat = json.loads(row["geometry"])["coordinates"]
+            trees.append((row["tree_id"], lon, lat))
+    if not trees:
+        raise SystemExit("No trees found: load the database with the ETL or api_seed.py first")
+    return trees, parishes, species
+
+
+def tree_record(tree_id: int, lon: float, lat: float, rng: random.Random, workload: Workload) -> dict:
+    return {"tree_id": tree_id, "especie": rng.choice(workload.species or ["Benchmark sp."]),
+            "nome_vulga": "Benchmark", "tipologia": "Arruamento", "pap": rng.randint(20, 300),
+            "freguesia": rng.choice(workload.parishes or [None]),
+            "lon": lon + rng.uniform(-1e-4, 1e-4), "lat": lat + rng.uniform(-1e-4, 1e-4)}
+
+
+def tile(lon: float, lat: float, z: int) -> tuple:
+    """XYZ tile containing a point."""
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return z, x, y
+
+
+# ------------------------------------
+# --------------Routes----------------
+
+# Each builder returns the request for one call of its route: method, path,
+# query parameters, JSON body and a callback receiving the status, or None
+# when the route has nothing to work on yet (the client then picks another).
+
+def _get(path, params=None):
+    return "GET", path, params, None, None
+
+
+def _post(path, body, done=None, method="POST"):
+    return method, path, None, body, done
+
+
+def random_tree(w, rng):
+    return rng.choice(w.trees)
+
+
+def near(w, rng, **params):
+    _, lon, lat = random_tree(w, rng)
+    return {"lon": lon, "lat": lat, **params}
+
+
+def build_search(w, rng):
+    words = [name for name in w.species + w.parishes if len(name) >= 3]
+    return _get("/search/suggest", {"q": rng.choice(words)[:rng.randint(2, 5)] if words else "a",
+                                    "kind": rng.choice(["species", "common_name", "parish", None]),
+                                    "limit": 10})
+
+
+def build_create(w, rng):
+    _, lon, lat = random_tree(w, rng)
+    new_id = w.new_id()
+
+    def done(status):
+        if status == 201:
+            w.add_created(new_id)
+
+    return _post("/tree", tree_record(new_id, lon, lat, rng, w), done)
+
+
+def build_delete(w, rng):
+    tree_id = w.take_created()
+    return None if tree_id is None else ("DELETE", f"/tree/{tree_id}", None, None, None)
+
+
+def build_edit(w, rng):
+    _, lon, lat = random_tree(w, rng)
+    return _post(f"/tree/{rng.choice(w.pool)}", tree_record(None, lon, lat, rng, w), method="PUT") if w.pool else None
+
+
+def build_comment(w, rng):
+    return _post(f"/tree/{rng.choice(w.pool)}/comment",
+                 {"username": w.username, "comment": "load test comment"}) if w.pool else None
+
+
+def build_maintenance(w, rng):
+    return _post(f"/tree/{rng.choice(w.pool)}/maintenance",
+                 {"op_code": 4, "maint_date": "2026-01-01", "observation": "load test", "officer": "bench"}
+                 ) if w.pool else None
+
+
+def build_trees_batch(w, rng):
+    records = [tree_record(w.new_id(), lon, lat, rng, w) for _, lon, lat in rng.sample(w.trees, min(20, len(w.trees)))]
+
+    def done(status):
+        # Trees rejected by a partially accepted batch are deleted in vain at the end, which is harmless
+        if 0 < status < 400:
+            for record in records:
+                w.add_created(record["tree_id"])
+
+    return _post("/trees/batch", records, done)
+
+
+def build_comments_batch(w, rng):
+    return _post("/comments/batch", [{"tree_id": rng.choice(w.pool), "username": w.username,
+                                      "comment": "load test comment"} for _ in range(20)]) if w.pool else None
+
+
+def build_maintenance_batch(w, rng):
+    return _post("/maintenance/batch", [{"tree_id": rng.choice(w.pool), "op_code": 4, "maint_date": "2026-01-01",
+                                         "observation": "load test", "officer": "bench"} for _ in range(20)]
+                 ) if w.pool else None
+
+
+# "METHOD rule" (as labelled in /metrics): (weight, writes, builder)
+ROUTES = {
+    "GET /trees": (3, False, lambda w, rng: _get("/trees", {"after": random_tree(w, rng)[0], "limit": PAGE})),
+    "GET /tree/<int:id>": (10, False, lambda w, rng: _get(f"/tree/{random_tree(w, rng)[0]}")),
+    "GET /tree/<int:id>/comments": (6, False, lambda w, rng: _get(f"/tree/{random_tree(w, rng)[0]}/comments")),
+    "GET /tree/<int:id>/maintenance": (6, False, lambda w, rng: _get(f"/tree/{random_tree(w, rng)[0]}/maintenance")),
+    "DELETE /tree/<int:id>": (1, True, build_delete),
+    "PUT /tree/<int:id>": (2, True, build_edit),
+    "POST /tree/<int:id>/comment": (3, True, build_comment),
+    "POST /tree/<int:id>/maintenance": (2, True, build_maintenance),
+    "GET /trees/freguesia/<string:name>": (4, False, lambda w, rng: _get(
+        f"/trees/freguesia/{quote(rng.choice(w.parishes), safe='')}", {"limit": PAGE})),
+    "GET /trees/species/<string:species>": (4, False, lambda w, rng: _get(
+        f"/trees/species/{quote(rng.choice(w.species), safe='')}", {"limit": PAGE})),
+    "GET /trees/near": (8, False, lambda w, rng: _get("/trees/near", near(w, rng, radius=rng.choice([50, 100, 250, 500])))),
+    "POST /tree": (2, True, build_create),
+    "GET /pool/stats": (1, False, lambda w, rng: _get("/pool/stats")),
+    "GET /tiles/<int:z>/<int:x>/<int:y>.mvt": (10, False, lambda w, rng: _get(
+        "/tiles/{}/{}/{}.mvt".format(*tile(*random_tree(w, rng)[1:], rng.choice(TILE_ZOOMS))))),
+    "GET /tiles/stats": (1, False, lambda w, rng: _get("/tiles/stats")),
+    "GET /cache/stats": (1, False, lambda w, rng: _get("/cache/stats")),
+    "GET /search/suggest": (8, False, build_search),
+    "GET /stats/pap": (2, False, lambda w, rng: _get("/stats/pap", {"freguesia": rng.choice(w.parishes)}
+                                                     if rng.random() < 0.5 else None)),
+    "GET /stats/<string:dimension>": (4, False, lambda w, rng: _get(
+        f"/stats/{rng.choice(['freguesia', 'species', 'tipologia', 'manutencao'])}")),
+    "GET /trees/nearest": (8, False, lambda w, rng: _get("/trees/nearest", near(w, rng, k=rng.choice([1, 10, 50])))),
+    "POST /trees/batch": (1, True, build_trees_batch),
+    "POST /comments/batch": (1, True, build_comments_batch),
+    "POST /maintenance/batch": (1, True, build_maintenance_batch),
+    "GET /tree/<int:id>/dossier": (8, False, lambda w, rng: _get(f"/tree/{random_tree(w, rng)[0]}/dossier")),
+    "GET /trees/dossier": (3, False, lambda w, rng: _get("/trees/dossier", {
+        "ids": ",".join(str(t[0]) for t in rng.sample(w.trees, min(20, len(w.trees))))})),
+    "GET /parishes": (2, False, lambda w, rng: _get("/parishes", {"zoom": rng.choice([10, 12, 14])})),
+    "GET /metrics": (1, False, lambda w, rng: _get("/metrics")),
+}
+
+
+# ------------------------------------
+# --------------Driver----------------
+
+def client(base_url: str, workload: Workload, routes: list, seed: int, measure_from: float, stop: float) -> list:
+    """One closed-loop client; returns (route, status, latency, bytes) of the requests started after `measure_from`."""
+    rng = random.Random(seed)
+    names = [name for name, _ in routes]
+    weights = [weight for _, weight in routes]
+    samples = []
+    with requests.Session() as session:
+        while time.perf_counter() < stop:
+            name = rng.choices(names, weights)[0]
+            built = ROUTES[name][2](workload, rng)
+            if built is None:
+                continue
+            method, path, params, body, done = built
+            started = time.perf_counter()
+            try:
+                response = session.request(method, f"{base_url}{path}", params=params, json=body, timeout=60)
+                status, size = response.status_code, len(response.content)
+            except requests.RequestException:
+                status, size = 0, 0
+            latency = time.perf_counter() - started
+            if done is not None:
+                done(status)
+            if started >= measure_from:
+                samples.append((name, status, latency, size))
+    return samples
+
+
+def run_level(base_url: str, workload: Workload, routes: list, clients: int, args) -> dict:
+    """Run one concurrency level and summarize it per route."""
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    stop = measure_from + args.duration
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = [pool.submit(client, base_url, workload, routes, args.seed * 1000 + i, measure_from, stop)
+                   for i in range(clients)]
+        samples = [sample for future in futures for sample in future.result()]
+    seconds = max(time.perf_counter() - measure_from, 1e-9)
+    by_route = defaultdict(list)
+    for name, status, latency, size in samples:
+        by_route[name].append((status, latency, size))
+    return {"clients": clients, "seconds": round(seconds, 3),
+            "routes": {name: summarize(route_samples, seconds) for name, route_samples in sorted(by_route.items())},
+            "total": summarize([sample[1:] for sample in samples], seconds)}
+
+
+# ------------------------------------
+# -----------DB breakdown-------------
+
+def scrape(session: requests.Session, base_url: str) -> dict:
+    """Sums and counts of the database histograms in /metrics, by metric and labels."""
+    values = {}
+    for line in session.get(f"{base_url}/metrics", timeout=60).text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match and match.group(1) in ("greengrid_db_statement_seconds_sum", "greengrid_db_statement_seconds_count",
+                                        "greengrid_db_acquire_seconds_sum", "greengrid_db_acquire_seconds_count"):
+            labels = tuple(METRIC_LABEL.findall(match.group(2)))
+            values[(match.group(1), labels)] = float(match.group(3))
+    return values
+
+
+def db_breakdown(before: dict, after: dict, top: int) -> list:
+    """Statements (and connection waits) of a level with the most database time, from two scrapes."""
+    totals = defaultdict(lambda: [0.0, 0])
+    for (metric, labels), value in after.items():
+        delta = value - before.get((metric, labels), 0.0)
+        labels = dict(labels)
+        if metric.startswith("greengrid_db_acquire"):
+            key = (labels["route"], "(connection wait)")
+        elif labels.get("phase") == "execute" or metric.endswith("_sum"):
+            key = (labels["route"], labels["statement"])
+        else:
+            continue    # Counts appear once per phase; count the "execute" ones
+        totals[key][0 if metric.endswith("_sum") else 1] += delta
+    rows = [{"route": route, "statement": statement, "calls": int(calls), "seconds": round(seconds, 3),
+             "mean_ms": round(seconds / calls * 1000, 2) if calls else None}
+            for (route, statement), (seconds, calls) in totals.items() if calls]
+    return sorted(rows, key=lambda row: -row["seconds"])[:top]
+
+
+# ------------------------------------
+# ---------Owned trees setup----------
+
+def create_pool(session: requests.Session, base_url: str, workload: Workload, size: int, rng: random.Random) -> None:
+    """Create the owned trees the edit, comment and maintenance routes work on."""
+    records = [tree_record(workload.new_id(), lon, lat, rng, workload)
+               for _, lon, lat in rng.choices(workload.trees, k=size)]
+    response = session.post(f"{base_url}/trees/batch", json=records, timeout=120)
+    response.raise_for_status()
+    workload.pool = [record["tree_id"] for record in records]
+
+
+def cleanup(session: requests.Session, base_url: str, workload: Workload) -> int:
+    """Delete every tree the run created (their comments and maintenance go with them)."""
+    deleted = 0
+    for tree_id in workload.pool + workload.created:
+        deleted += session.delete(f"{base_url}/tree/{tree_id}", timeout=60).ok
+    return deleted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test every route of the API at several concurrency levels")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16], help="Concurrency levels")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before each level")
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), help="Only these routes (default: all)")
+    parser.add_argument("--read-only", action="store_true", help="Skip the routes that write")
+    parser.add_argument("--per-parish", type=int, default=200, help="Trees discovered per parish")
+    parser.add_argument("--write-id-base", type=int, default=WRITE_ID_BASE, help="First id of the trees the run creates")
+    parser.add_argument("--write-trees", type=int, default=100, help="Owned trees edited, commented and maintained")
+    parser.add_argument("--username", default=BENCH_USER, help="Existing user writing the comments")
+    parser.add_argument("--keep", action="store_true", help="Keep the trees created by the run")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the request mix")
+    parser.add_argument("--db-breakdown", action="store_true", help="Show the database time per statement (/metrics)")
+    parser.add_argument("--top", type=int, default=10, help="Statements listed by --db-breakdown")
+    parser.add_argument("--output", help="Write the results as JSON (for api_report.py)")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    routes = [(name, weight) for name, (weight, writes, _) in ROUTES.items()
+              if (args.routes is None or name in args.routes) and not (writes and args.read_only)]
+    if not routes:
+        raise SystemExit("No routes left to run")
+    writes = any(ROUTES[name][1] for name, _ in routes)
+
+    session = requests.Session()
+    workload = Workload(*discover(session, base_url, args.per_parish), args.write_id_base)
+    workload.username = args.username
+    print(f"{len(workload.trees)} trees, {len(workload.parishes)} parishes, {len(workload.species)} species; "
+          f"{len(routes)} routes{'' if writes else ', read-only'}")
+    result = {"base_url": base_url, "started": datetime.now().isoformat(timespec="seconds"),
+              "duration": args.duration, "warmup": args.warmup, "seed": args.seed, "levels": []}
+    try:
+        if writes:
+            create_pool(session, base_url, workload, args.write_trees, random.Random(args.seed))
+        for clients in args.clients:
+            before = scrape(session, base_url) if args.db_breakdown else None
+            level = run_level(base_url, workload, routes, clients, args)
+            print_summary(level)
+            if args.db_breakdown:
+                level["db"] = db_breakdown(before, scrape(session, base_url), args.top)
+                print(f"{'route':<44}{'statement':<32}{'calls':>8}{'total s':>9}{'mean ms':>9}")
+                for row in level["db"]:
+                    print(f"{row['route']:<44}{row['statement']:<32}{row['calls']:>8}{row['seconds']:>9g}"
+                          f"{row['mean_ms']:>9g}")
+            result["levels"].append(level)
+    finally:
+        if writes and not args.keep:
+            print(f"\n{cleanup(session, base_url, workload)} trees created by the run deleted")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
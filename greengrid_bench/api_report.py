@@ -0,0 +1,110 @@
+"""
+Latency and throughput report of API load test results.
+
+`api_load.py` uses `summarize` and `print_summary` to report each
+concurrency level as it finishes. Run on its own, the script prints the
+result files written by `api_load.py --output` and, given several, compares
+the p95 latency and requests per second of every later file to the first
+one (the baseline), per route and concurrency level.
+
+Usage (from the repository root):
+    python greengrid_bench/api_report.py baseline.json candidate.json
+"""
+import argparse
+import json
+import math
+import statistics
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile `q` (0-100) of sorted values, or None without values."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def summarize(samples: list, seconds: float) -> dict:
+    """
+    Summary of the requests of one route (or of all routes).
+
+    Args:
+        samples (list): (status, latency in seconds, response bytes) of each request.
+        seconds (float): Length of the measurement window.
+
+    Return:
+        dict: Requests, errors (status >= 400 or no response), requests per
+        second and latency percentiles and mean in milliseconds.
+    """
+    latencies = sorted(latency for _, latency, _ in samples)
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for status, _, _ in samples if not status or status >= 400),
+        "rps": round(len(samples) / seconds, 1) if seconds else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "mean_ms": ms(statistics.fmean(latencies) if latencies else None),
+        "mean_bytes": round(statistics.fmean(size for _, _, size in samples)) if samples else None,
+    }
+
+
+def _cell(value) -> str:
+    return "-" if value is None else f"{value:g}"
+
+
+def print_summary(level: dict) -> None:
+    """Print the per-route table of one concurrency level, slowest p95 first, and its total."""
+    print(f"\n{level['clients']} clients, {level['seconds']:.0f}s")
+    print(f"{'route':<44}{'requests':>9}{'errors':>7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    routes = sorted(level["routes"].items(), key=lambda item: -(item[1]["p95_ms"] or 0))
+    for route, s in routes + [("total", level["total"])]:
+        print(f"{route:<44}{s['requests']:>9}{s['errors']:>7}{_cell(s['rps']):>9}{_cell(s['p50_ms']):>9}"
+              f"{_cell(s['p95_ms']):>9}{_cell(s['p99_ms']):>9}{_cell(s['max_ms']):>9}")
+
+
+def _change(new, old) -> str:
+    if new is None or not old:
+        return "-"
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def compare(baseline: dict, candidate: dict) -> None:
+    """Print the p95 and requests per second of `candidate` against `baseline`, per level and route."""
+    levels = {level["clients"]: level for level in baseline["levels"]}
+    for level in candidate["levels"]:
+        base = levels.get(level["clients"])
+        if base is None:
+            continue
+        print(f"\n{level['clients']} clients: {candidate['label']} vs {baseline['label']}")
+        print(f"{'route':<44}{'p95 ms':>9}{'change':>8}{'rps':>9}{'change':>8}")
+        routes = [(route, s, base["routes"].get(route)) for route, s in level["routes"].items()]
+        for route, s, old in sorted(routes) + [("total", level["total"], base["total"])]:
+            if old is None:
+                continue
+            print(f"{route:<44}{_cell(s['p95_ms']):>9}{_change(s['p95_ms'], old['p95_ms']):>8}"
+                  f"{_cell(s['rps']):>9}{_change(s['rps'], old['rps']):>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report and compare API load test results")
+    parser.add_argument("results", nargs="+", help="Result files of api_load.py --output (first one is the baseline)")
+    args = parser.parse_args()
+
+    runs = []
+    for fname in args.results:
+        with open(fname, encoding="utf-8") as f:
+            run = json.load(f)
+        run["label"] = fname
+        runs.append(run)
+    for run in runs:
+        print(f"\n== {run['label']}: {run['base_url']}, {run['started']}")
+        for level in run["levels"]:
+            print_summary(level)
+    for run in runs[1:]:
+        compare(runs[0], run)
+
+
+if __name__ == "__main__":
+    main()
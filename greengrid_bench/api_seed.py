@@ -0,0 +1,262 @@
+"""
+Fill the database with synthetic, realistic Lisbon trees for the API benchmarks.
+
+Trees are scattered inside the parish boundaries of
+`greengrid_etl/data/static/lisbon_parishes.shp`, so the parish of every tree
+matches the polygon it stands in, and each parish gets a share proportional
+to its area (with some variation in density). Species follow a long-tailed
+distribution over the common Lisbon street trees, and the perimeters (`pap`)
+are log-normal. Comments and maintenance records are attached to the trees,
+with a few "hot" trees collecting many of them, and are written by
+`--users` benchmark users (`bench_user_000`, ...).
+
+Rows are generated in chunks with numpy and shapely and streamed with COPY,
+so 5M trees take minutes. The same arguments always produce the same rows.
+Trees get ids from `--tree-id-base` upwards; `--clear` deletes the trees
+from earlier runs in that range first (their comments and maintenance go
+with them). Parish boundaries are loaded into `pa.parish` if it is empty.
+At the end the tables are analyzed, the search vocabulary and statistics
+views refreshed and the `pa.data_version` generations bumped, as after an
+ETL load.
+
+Usage (from the repository root):
+    python greengrid_bench/api_seed.py --trees 1000000 --clear
+    python greengrid_bench/api_seed.py --trees 10000 --comments 5000 --maintenance 20000 --seed 7
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import shapely
+
+ETL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "greengrid_etl")
+PARISH_SHAPEFILE = os.path.join(ETL_DIR, "data", "static", "lisbon_parishes.shp")
+TREE_ID_BASE = 100_000_000
+CHUNK = 200_000
+
+# Common street and park trees of Lisbon (species, common name), most frequent first
+SPECIES = [
+    ("Celtis australis", "Lódão-bastardo"), ("Platanus x hispanica", "Plátano"),
+    ("Jacaranda mimosifolia", "Jacarandá"), ("Tipuana tipu", "Tipuana"), ("Tilia tomentosa", "Tília-prateada"),
+    ("Melia azedarach", "Amargoseira"), ("Ligustrum lucidum", "Alfenheiro"), ("Pinus pinea", "Pinheiro-manso"),
+    ("Olea europaea", "Oliveira"), ("Populus nigra", "Choupo-negro"), ("Cupressus sempervirens", "Cipreste-comum"),
+    ("Robinia pseudoacacia", "Robínia"), ("Fraxinus angustifolia", "Freixo"), ("Acer negundo", "Bordo-negundo"),
+    ("Schinus molle", "Pimenteira-bastarda"), ("Quercus suber", "Sobreiro"), ("Ceratonia siliqua", "Alfarrobeira"),
+    ("Washingtonia robusta", "Palmeira-de-leque-mexicana"), ("Phoenix canariensis", "Palmeira-das-Canárias"),
+    ("Brachychiton populneus", "Braquiquíton"), ("Cercis siliquastrum", "Olaia"), ("Morus alba", "Amoreira-branca"),
+    ("Quercus ilex", "Azinheira"), ("Ulmus minor", "Ulmeiro"), ("Magnolia grandiflora", "Magnólia"),
+    ("Ficus microcarpa", "Figueira-de-cortina"), ("Citrus x aurantium", "Laranjeira-azeda"),
+    ("Prunus cerasifera", "Ameixoeira-de-jardim"), ("Grevillea robusta", "Grevílea"),
+    ("Casuarina equisetifolia", "Casuarina"),
+]
+RARE_SPECIES = 150   # Rare species ("Arbor sp. 001", ...) making up the long tail
+TIPOLOGIA = (["Arruamento", "Espaço Verde", "Logradouro", "Estabelecimento de Ensino", "Não identificada"],
+             [0.55, 0.3, 0.07, 0.05, 0.03])
+MANUTENCAO = (["CML", "Junta de Freguesia", "Entidade Privada", "Não identificada"], [0.45, 0.4, 0.05, 0.1])
+OCUPACAO = (["Caldeira", "Relvado", "Canteiro", "Pavimento", "Não identificada"], [0.5, 0.25, 0.1, 0.05, 0.1])
+LOCAL = (["Passeio", "Separador", "Praça", "Parque", "Jardim", "Não identificado"], [0.5, 0.1, 0.08, 0.15, 0.12, 0.05])
+STREET_TYPES = ["Rua", "Avenida", "Travessa", "Calçada", "Largo", "Praça", "Estrada"]
+STREET_NAMES = ["da Liberdade", "de São Bento", "do Alecrim", "da Graça", "dos Lusíadas", "de Berna", "da República",
+                "de Ceuta", "do Restelo", "das Amoreiras", "da Madalena", "do Benformoso", "de Campolide",
+                "dos Bacalhoeiros", "da Palma", "de Roma", "dos Anjos", "das Flores", "do Sol", "da Junqueira"]
+# Maintenance operations (pa.operations op_code), their frequency and observations
+OPERATIONS = ([1, 2, 3, 4, 5, 6], [0.3, 0.08, 0.1, 0.45, 0.02, 0.05])
+OBSERVATIONS = {1: "Crown thinning performed.", 2: "Pest treatment applied.", 3: "Fertilizer applied.",
+                4: "Routine visual inspection.", 5: "Tree removed for safety reasons.", 6: "Replanting."}
+OFFICERS = ["Arbor Team A", "Arbor Team B", "Inspector John", "Inspector Mary", "Pest Control Div",
+            "Maintenance Crew", "Green Lisbon Team"]
+COMMENTS = ["Beautiful tree, great shade in summer.", "Branches are touching the power lines.",
+            "Leaves are turning yellow early this year.", "Roots are lifting the pavement.",
+            "Flowering now, lovely colours.", "Looks dry, could use some water.",
+            "Broken branch after the storm.", "Birds nesting in the crown."]
+HOT_TREES = 0.01     # Share of trees collecting HOT_SHARE of the comments and maintenance
+HOT_SHARE = 0.2
+DAYS = 5 * 365       # Comments and maintenance spread over the last five years
+
+
+def species_table() -> tuple:
+    """(species, common names, Zipf-like weights) including the rare tail."""
+    pairs = SPECIES + [(f"Arbor sp. {i:03d}", f"Árvore rara {i:03d}") for i in range(1, RARE_SPECIES + 1)]
+    weights = 1 / np.arange(1, len(pairs) + 1) ** 1.2
+    return np.array([p[0] for p in pairs]), np.array([p[1] for p in pairs]), weights / weights.sum()
+
+
+def choice(rng, options: tuple, size: int) -> np.ndarray:
+    values, weights = options
+    return np.asarray(values)[rng.choice(len(values), size=size, p=weights)]
+
+
+def points_in(polygon, count: int, rng) -> tuple:
+    """`count` uniformly random points inside a polygon, by rejection sampling in its bounding box."""
+    shapely.prepare(polygon)
+    xmin, ymin, xmax, ymax = polygon.bounds
+    fill = polygon.area / ((xmax - xmin) * (ymax - ymin))
+    xs, ys, found = [], [], 0
+    while found < count:
+        n = int((count - found) / fill * 1.2) + 16
+        x = rng.uniform(xmin, xmax, n)
+        y = rng.uniform(ymin, ymax, n)
+        inside = shapely.contains_xy(polygon, x, y)
+        xs.append(x[inside])
+        ys.append(y[inside])
+        found += int(inside.sum())
+    return np.concatenate(xs)[:count], np.concatenate(ys)[:count]
+
+
+def parish_shares(parishes, total: int, rng) -> np.ndarray:
+    """Trees per parish: proportional to its area, times a log-normal density factor."""
+    # Areas in the Portuguese national grid (EPSG:3763), the Shapefile's own CRS
+    weights = parishes.geometry.to_crs(3763).area.to_numpy() * rng.lognormal(0, 0.4, len(parishes))
+    shares = np.floor(weights / weights.sum() * total).astype(int)
+    shares[np.argsort(-weights)[:total - shares.sum()]] += 1
+    return shares
+
+
+def tree_chunks(parishes, count: int, id_base: int, rng, chunk: int = CHUNK):
+    """Yield DataFrames of trees in `pa.trees` column order, `chunk` rows at most, parish by parish."""
+    species, common, weights = species_table()
+    next_id = id_base
+    for (_, parish), total in zip(parishes.iterrows(), parish_shares(parishes, count, rng)):
+        for size in [chunk] * (total // chunk) + ([total % chunk] if total % chunk else []):
+            x, y = points_in(parish.geometry, size, rng)
+            kind = rng.choice(len(species), size=size, p=weights)
+            streets = rng.integers(0, len(STREET_TYPES) * len(STREET_NAMES), size)
+            morada = [f"{STREET_TYPES[s % len(STREET_TYPES)]} {STREET_NAMES[s // len(STREET_TYPES)]}, {n}"
+                      for s, n in zip(streets, rng.integers(1, 300, size))]
+            geometry = shapely.to_wkb(shapely.set_srid(shapely.points(x, y), 4326), hex=True, include_srid=True)
+            yield pd.DataFrame({
+                "tree_id": np.arange(next_id, next_id + size),
+                "nome_vulga": common[kind],
+                "especie": species[kind],
+                "tipologia": choice(rng, TIPOLOGIA, size),
+                "pap": np.clip(rng.lognormal(np.log(90), 0.55, size), 5, 600).round(0),
+                "manutencao": choice(rng, MANUTENCAO, size),
+                "ocupacao": choice(rng, OCUPACAO, size),
+                "local": choice(rng, LOCAL, size),
+                "morada": morada,
+                "freguesia": parish["freguesia"],
+                "geometry": geometry,
+            })
+            next_id += size
+
+
+def tree_ids(rng, trees: int, id_base: int, size: int) -> np.ndarray:
+    """Trees of `size` records: HOT_SHARE of them go to a small set of hot trees, the rest anywhere."""
+    hot = rng.random(size) < HOT_SHARE
+    ids = rng.integers(0, trees, size)
+    ids[hot] = rng.integers(0, max(1, int(trees * HOT_TREES)), int(hot.sum()))
+    return id_base + ids
+
+
+def timestamps(rng, size: int) -> np.ndarray:
+    now = np.datetime64("now", "s")
+    return now - rng.integers(0, DAYS * 86400, size).astype("timedelta64[s]")
+
+
+def comment_chunks(count: int, trees: int, id_base: int, users: int, rng, chunk: int = CHUNK):
+    """Yield DataFrames of comments (username, tree_id, comment, created_at)."""
+    for start in range(0, count, chunk):
+        size = min(chunk, count - start)
+        yield pd.DataFrame({
+            "username": [f"bench_user_{u:03d}" for u in rng.integers(0, users, size)],
+            "tree_id": tree_ids(rng, trees, id_base, size),
+            "comment": np.asarray(COMMENTS)[rng.integers(0, len(COMMENTS), size)],
+            "created_at": timestamps(rng, size),
+        })
+
+
+def maintenance_chunks(count: int, trees: int, id_base: int, rng, chunk: int = CHUNK):
+    """Yield DataFrames of maintenance records (tree_id, op_code, observation, officer, maint_date)."""
+    for start in range(0, count, chunk):
+        size = min(chunk, count - start)
+        op_code = choice(rng, OPERATIONS, size)
+        yield pd.DataFrame({
+            "tree_id": tree_ids(rng, trees, id_base, size),
+            "op_code": op_code,
+            "observation": pd.Series(op_code).map(OBSERVATIONS).to_numpy(),
+            "officer": np.asarray(OFFICERS)[rng.integers(0, len(OFFICERS), size)],
+            "maint_date": timestamps(rng, size).astype("datetime64[D]"),
+        })
+
+
+def copy(cur, table: str, chunks) -> int:
+    """Stream DataFrames into a table with COPY (CSV); return the number of rows."""
+    rows = 0
+    for df in chunks:
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        rows += len(df)
+        print(f"  {table}: {rows} rows", end="\r", flush=True)
+    print()
+    return rows
+
+
+def load_parishes(cur, parishes) -> None:
+    """Insert the parish boundaries into an empty pa.parish."""
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pa.parish)")
+    if cur.fetchone()[0]:
+        return
+    cur.executemany(
+        "INSERT INTO pa.parish (id, freguesia, geometry) VALUES (%s, %s, ST_Multi(ST_GeomFromWKB(%s, 4326)))",
+        [(str(p["id"]), p["freguesia"], psycopg2.Binary(shapely.to_wkb(p.geometry))) for _, p in parishes.iterrows()])
+    print(f"  pa.parish: {len(parishes)} boundaries")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fill pa.trees, pa.comments and pa.maintenance with synthetic data")
+    parser.add_argument("--dsn", default="dbname=lisbon_greengrid user=postgres password=postgres host=localhost")
+    parser.add_argument("--trees", type=int, default=100_000, help="Trees to generate (10k to 5M)")
+    parser.add_argument("--comments", type=int, help="Comments to generate (default: half the trees)")
+    parser.add_argument("--maintenance", type=int, help="Maintenance records to generate (default: one per tree)")
+    parser.add_argument("--users", type=int, default=100, help="Benchmark users writing the comments")
+    parser.add_argument("--tree-id-base", type=int, default=TREE_ID_BASE, help="First tree id")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (same seed, same rows)")
+    parser.add_argument("--shapefile", default=PARISH_SHAPEFILE, help="Parish boundaries")
+    parser.add_argument("--clear", action="store_true", help="Delete trees from --tree-id-base upwards first")
+    args = parser.parse_args()
+    comments = args.trees // 2 if args.comments is None else args.comments
+    maintenance = args.trees if args.maintenance is None else args.maintenance
+
+    # The ETL reads and reprojects the boundaries the same way for the transformation
+    sys.path.insert(0, ETL_DIR)
+    import etl as e
+    parishes = e.read_parishes(args.shapefile)
+    rng = np.random.default_rng(args.seed)
+
+    started = time.perf_counter()
+    with psycopg2.connect(args.dsn) as conn, conn.cursor() as cur:
+        if args.clear:
+            cur.execute("DELETE FROM pa.trees WHERE tree_id >= %s", (args.tree_id_base,))
+            print(f"  pa.trees: {cur.rowcount} earlier benchmark trees deleted")
+        load_parishes(cur, parishes)
+        cur.executemany("INSERT INTO pa.users (username, first_name, last_name, email) VALUES (%s, 'Bench', %s, %s) "
+                        "ON CONFLICT DO NOTHING",
+                        [(f"bench_user_{u:03d}", f"User {u:03d}", f"bench_user_{u:03d}@example.com")
+                         for u in range(args.users)])
+        copy(cur, "pa.trees", tree_chunks(parishes, args.trees, args.tree_id_base, rng))
+        copy(cur, "pa.comments", comment_chunks(comments, args.trees, args.tree_id_base, args.users, rng))
+        copy(cur, "pa.maintenance", maintenance_chunks(maintenance, args.trees, args.tree_id_base, rng))
+        # Like the ETL post-load: derived data, then tell the API its caches are stale
+        cur.execute("SELECT pa.refresh_search_vocabulary()")
+        cur.execute("SELECT matviewname FROM pg_matviews WHERE schemaname = 'pa'")
+        for (view,) in cur.fetchall():
+            cur.execute(f"REFRESH MATERIALIZED VIEW pa.{view}")
+        cur.execute("UPDATE pa.data_version SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP "
+                    "WHERE table_name IN ('trees', 'stats', 'parish')")
+    with psycopg2.connect(args.dsn) as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE pa.trees, pa.comments, pa.maintenance, pa.parish")
+    print(f"{args.trees} trees, {comments} comments, {maintenance} maintenance records "
+          f"in {time.perf_counter() - started:.1f}s (ids {args.tree_id_base}-{args.tree_id_base + args.trees - 1})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Local stand-in for an ArcGIS FeatureServer layer serving paged GeoJSON.
+
+It answers the requests made by the ETL extraction (`etl/arcgis.py`):
+layer info (`?f=json`), `returnCountOnly`, `returnIdsOnly`, and feature
+pages selected by `resultOffset`/`resultRecordCount` or by an objectId
+range in `where`. Pages are capped at `--max-records`, and every page
+followed by more records is flagged with `exceededTransferLimit`, as
+ArcGIS does. `--fail-rate`/`--delay` inject server errors and latency so
+retries, concurrency and resume can be exercised without touching the
+real service.
+
+Features come from a GeoJSON file or are generated around Lisbon.
+
+Usage:
+    python greengrid_bench/arcgis_stub.py --features 50000 --port 8765 --fail-rate 0.05
+    # then set in greengrid_etl/config/00.yml:
+    # url: http://127.0.0.1:8765/arcgis/rest/services/trees/FeatureServer/0/query?outFields=*&where=1%3D1&f=geojson
+"""
+import argparse
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+OID = "OBJECTID"
+LAYER_PATH = "/arcgis/rest/services/trees/FeatureServer/0"
+RANGE = re.compile(rf"{OID} >= (\d+) AND {OID} <= (\d+)")
+
+
+def synthetic_features(count: int) -> list:
+    """Point features with tree-like attributes scattered over Lisbon."""
+    rng = random.Random(0)
+    return [{
+        "type": "Feature",
+        "id": i,
+        "geometry": {"type": "Point", "coordinates": [rng.uniform(-9.23, -9.09), rng.uniform(38.69, 38.80)]},
+        "properties": {OID: i, "cod_sig_new": 100000 + i, "especie_va": "Platanus x hispanica",
+                       "nome_vulga": "Plátano", "pap": str(rng.randint(20, 400))},
+    } for i in range(1, count + 1)]
+
+
+def make_handler(features: list, args):
+    by_id = {f["id"]: f for f in features}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def reply(self, status: int, doc: dict) -> None:
+            body = json.dumps(doc).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            q = dict(parse_qsl(url.query))
+            if args.delay:
+                time.sleep(args.delay)
+            if url.path == LAYER_PATH:
+                return self.reply(200, {
+                    "maxRecordCount": args.max_records, "objectIdField": OID,
+                    "advancedQueryCapabilities": {"supportsPagination": not args.no_pagination},
+                })
+            if url.path != f"{LAYER_PATH}/query":
+                return self.reply(404, {"error": {"code": 404, "message": "Not found"}})
+            if q.get("returnCountOnly") == "true":
+                return self.reply(200, {"count": len(features)})
+            if q.get("returnIdsOnly") == "true":
+                return self.reply(200, {"objectIdFieldName": OID, "objectIds": list(by_id)})
+            if random.random() < args.fail_rate:
+                return self.reply(503, {"error": {"code": 503, "message": "Injected failure"}})
+
+            match = RANGE.search(q.get("where", ""))
+            if match:
+                low, high = int(match.group(1)), int(match.group(2))
+                page = [f for i, f in by_id.items() if low <= i <= high]
+                more = any(i > high for i in by_id)
+            else:
+                offset = int(q.get("resultOffset", 0))
+                page = features[offset:offset + int(q.get("resultRecordCount", args.max_records))]
+                more = offset + len(page) < len(features)
+            # Set on every page but the last, and on pages cut at maxRecordCount
+            exceeded = more or len(page) > args.max_records
+            doc = {"type": "FeatureCollection", "features": page[:args.max_records]}
+            if exceeded:
+                doc["properties"] = {"exceededTransferLimit": True}
+            return self.reply(200, doc)
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve paged GeoJSON like an ArcGIS FeatureServer layer")
+    parser.add_argument("--file", help="GeoJSON FeatureCollection to serve (default: synthetic features)")
+    parser.add_argument("--features", type=int, default=10000, help="Synthetic features to generate")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-records", type=int, default=2000, help="Layer maxRecordCount")
+    parser.add_argument("--no-pagination", action="store_true", help="Force objectId-range paging")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of page requests answered with 503")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds added to every response")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            features = json.load(f)["features"]
+        for i, feature in enumerate(features, start=1):
+            feature["id"] = i
+            feature.setdefault("properties", {})[OID] = i
+    else:
+        features = synthetic_features(args.features)
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(features, args))
+    print(f"Serving {len(features)} features at http://127.0.0.1:{args.port}{LAYER_PATH}/query")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare the formats of the processed dataset handed from the ETL transformation to the load.
+
+The processed trees are written as GeoJSON and as GeoParquet with each
+compression codec through the ETL's own writers (`etl.write_data`), then
+read back whole and with only the configured `columns`, as `load()` does.
+The file size, write time and read times are reported, together with
+whether the dtypes survived the round trip.
+
+Usage (from the repository root, after a transformation run):
+    python greengrid_bench/etl_formats.py --rows 500000 --repeat 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ETL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "greengrid_etl")
+CODECS = ["zstd", "snappy", "gzip", "none"]
+
+
+def sample(gdf, rows: int):
+    """Repeat the dataset up to `rows` rows, with unique tree ids."""
+    if not rows or rows == len(gdf):
+        return gdf
+    copies = -(-rows // len(gdf))
+    big = pd.concat([gdf] * copies, ignore_index=True).iloc[:rows].copy()
+    big["tree_id"] = range(1, len(big) + 1)
+    return big
+
+
+def timed(repeat: int, func, *args, **kwargs):
+    """Median seconds of `repeat` calls, and the result of the last one."""
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        runs.append(time.perf_counter() - started)
+    return statistics.median(runs), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the processed dataset formats of the ETL")
+    parser.add_argument("--file", default="data/processed/trees.parquet", help="Processed dataset (relative to greengrid_etl)")
+    parser.add_argument("--config", default="config/00.yml", help="ETL configuration (relative to greengrid_etl)")
+    parser.add_argument("--rows", type=int, default=0, help="Rows to write (the dataset is repeated; default: as is)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (median is reported)")
+    parser.add_argument("--codecs", nargs="+", default=CODECS, help="GeoParquet compression codecs to compare")
+    args = parser.parse_args()
+
+    # Paths in the arguments and the configuration are relative to greengrid_etl
+    os.chdir(ETL_DIR)
+    sys.path.insert(0, ETL_DIR)
+    import etl as e
+
+    columns = e.read_config(args.config)["columns"]
+    gdf = sample(e.read_data(args.file), args.rows)
+    variants = [("geojson", "geojson", None)] + [(f"parquet/{codec}", "parquet", codec) for codec in args.codecs]
+
+    print(f"{len(gdf)} rows, median of {args.repeat} runs")
+    print(f"{'format':<16}{'MB':>9}{'write s':>10}{'read s':>9}{'columns s':>11}  dtypes kept")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, extension, codec in variants:
+            path = os.path.join(tmp, f"trees.{extension}")
+            write, _ = timed(args.repeat, e.write_data, gdf, path, compression=codec)
+            read, back = timed(args.repeat, e.read_data, path)
+            read_columns, _ = timed(args.repeat, e.read_data, path, columns=columns)
+            kept = back.dtypes.astype(str).equals(gdf.dtypes.astype(str))
+            size = os.path.getsize(path) / 1e6
+            print(f"{name:<16}{size:>9.1f}{write:>10.2f}{read:>9.2f}{read_columns:>11.2f}  {'yes' if kept else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Regression check of the ETL start-up time, from `python -X importtime`.
+
+Each scenario runs in a fresh interpreter, outside greengrid_etl (the etl
+package must not need ./config/00.yml to import), and is checked for two things:
+- the start-up scenarios (`import etl`, `main.py --help`, building the
+  pipeline) add less than `--budget-ms` to a bare interpreter;
+- every scenario loads none of the heavy libraries it has no use for
+  (`import etl` and `main.py --help` load none at all, the extraction only
+  requests, the transformation no database driver).
+
+The slowest imports of a scenario are listed to show what to make lazy.
+The exit status is 1 if any scenario fails, so it can run in CI.
+
+Usage (from the repository root):
+    python greengrid_bench/etl_importtime.py --repeat 5 --budget-ms 150
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ETL_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "greengrid_etl"))
+HEAVY = ["numpy", "pandas", "geopandas", "pyarrow", "pyogrio", "shapely",
+         "sqlalchemy", "geoalchemy2", "psycopg2", "requests"]
+DATABASE = ["sqlalchemy", "geoalchemy2", "psycopg2"]
+
+# name: (command after the interpreter, heavy libraries it may load, held to the time budget)
+SCENARIOS = {
+    "import etl": (["-c", "import etl"], [], True),
+    "main.py --help": ([os.path.join(ETL_DIR, "main.py"), "--help"], [], True),
+    "pipeline": (["-c", "import etl; etl.Pipeline"], [], True),
+    "extraction": (["-c", "import etl; etl.download_arcgis"], ["requests"], False),
+    "transformation": (["-c", "import etl; etl.read_data"], [lib for lib in HEAVY if lib not in DATABASE + ["requests"]], False),
+}
+
+
+def importtime(args: list, cwd: str) -> list:
+    """
+    Imports of one interpreter run, in the order `-X importtime` reports them.
+
+    Returns:
+        list: (module, self µs, cumulative µs, nesting depth) tuples.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ETL_DIR, os.environ.get("PYTHONPATH")]))}
+    run = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd, env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if run.returncode:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{run.stderr[-2000:]}")
+    imports = []
+    for line in run.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(own), int(cumulative), depth))
+    return imports
+
+
+def added_ms(imports: list, baseline: set) -> float:
+    """Milliseconds spent in the top-level imports a bare interpreter does not do."""
+    return sum(cum for name, _, cum, depth in imports if depth == 0 and name not in baseline) / 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the import time of the ETL package and CLI")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per scenario (median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Import time allowed per start-up scenario")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports listed per scenario")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as cwd:
+        baseline = {name for name, *_ in importtime(["-c", "pass"], cwd)}
+        print(f"{'scenario':<18}{'ms':>8}  heavy libraries loaded")
+        for name in args.scenarios:
+            command, allowed, budgeted = SCENARIOS[name]
+            try:
+                runs = [importtime(command, cwd) for _ in range(args.repeat)]
+            except RuntimeError as err:
+                failed = True
+                print(f"{name:<18}{'-':>8}  [FAIL] {str(err).strip().splitlines()[-1]}")
+                continue
+            ms = statistics.median(added_ms(imports, baseline) for imports in runs)
+            loaded = {module for module, *_ in runs[-1]}
+            heavy = [lib for lib in HEAVY if lib in loaded]
+            unexpected = [lib for lib in heavy if lib not in allowed]
+            slow = budgeted and ms > args.budget_ms
+            failed |= slow or bool(unexpected)
+            status = "FAIL" if slow or unexpected else "ok"
+            print(f"{name:<18}{ms:>8.1f}  {', '.join(heavy) or '-'}  [{status}]")
+            if unexpected:
+                print(f"{'':<18}unexpected: {', '.join(unexpected)}")
+            if slow or unexpected:
+                for module, _, cumulative, depth in sorted(
+                        (i for i in runs[-1] if i[0] not in baseline), key=lambda i: -i[2])[:args.top]:
+                    print(f"{'':<18}{cumulative / 1000:>8.1f}  {module}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare the load methods of the ETL (`to_postgis` INSERT batches vs COPY).
+
+The processed tree dataset is loaded with each method of
+`DBController.insert_data` into a scratch copy of `sa.trees` (same columns
+and indexes, no trigger) and the rows per second are reported. Pass
+`--table sa.trees` to measure the real staging table, trigger included;
+that rewrites the production trees like a regular ETL load.
+
+Usage (from the repository root, with the ETL configuration filled in):
+    python greengrid_bench/etl_load.py --rows 200000 --repeat 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+ETL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "greengrid_etl")
+SCRATCH_TABLE = "sa.trees_bench"
+
+
+def sample(gdf, rows: int):
+    """Repeat the dataset up to `rows` rows, with unique tree ids."""
+    if not rows or rows == len(gdf):
+        return gdf
+    copies = -(-rows // len(gdf))
+    big = pd.concat([gdf] * copies, ignore_index=True).iloc[:rows].copy()
+    big["tree_id"] = range(1, len(big) + 1)
+    return big
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the ETL load methods")
+    parser.add_argument("--file", default="data/processed/trees.parquet", help="Processed dataset (relative to greengrid_etl)")
+    parser.add_argument("--config", default="config/00.yml", help="ETL configuration (relative to greengrid_etl)")
+    parser.add_argument("--rows", type=int, default=0, help="Rows to load (the dataset is repeated; default: as is)")
+    parser.add_argument("--chunksize", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3, help="Loads per method (median is reported)")
+    parser.add_argument("--table", default=SCRATCH_TABLE, help="Target schema.table")
+    args = parser.parse_args()
+
+    # Paths in the arguments and the configuration are relative to greengrid_etl
+    os.chdir(ETL_DIR)
+    sys.path.insert(0, ETL_DIR)
+    import etl as e
+    import sqlalchemy as sql
+
+    config = e.read_config(args.config)
+    db = e.DBController(**config["database"])
+    gdf = sample(e.read_data(args.file), args.rows)
+    schema, table = args.table.split(".")
+
+    engine = db.engine
+    if args.table == SCRATCH_TABLE:
+        with engine.begin() as con:
+            con.execute(sql.text(f"CREATE TABLE IF NOT EXISTS {SCRATCH_TABLE} (LIKE sa.trees INCLUDING ALL)"))
+
+    print(f"{len(gdf)} rows into {args.table} (chunksize {args.chunksize}, median of {args.repeat} runs)")
+    print(f"{'method':<8}{'seconds':>10}{'rows/s':>12}")
+    try:
+        for method in ("insert", "copy"):
+            runs = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                db.insert_data(gdf, schema, table, chunksize=args.chunksize, method=method)
+                runs.append(time.perf_counter() - started)
+            seconds = statistics.median(runs)
+            print(f"{method:<8}{seconds:>10.2f}{len(gdf) / seconds:>12.0f}")
+    finally:
+        if args.table == SCRATCH_TABLE:
+            with engine.begin() as con:
+                con.execute(sql.text(f"DROP TABLE IF EXISTS {SCRATCH_TABLE}"))
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
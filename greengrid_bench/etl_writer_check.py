@@ -0,0 +1,75 @@
+"""
+Regression check of the streamed GeoParquet output of the ETL transformation.
+
+`DataWriter` must give the file a schema that does not depend on the values
+of the first batch: a text column (or "pap") that is missing in every
+feature of the first batch and filled in a later one is written without
+error, keeps its type and reads back with every value. A batch that cannot
+be converted must end the run through `die()` and leave no partial file.
+
+The exit status is 1 if any check fails, so it can run in CI.
+
+Usage (from the repository root):
+    python greengrid_bench/etl_writer_check.py
+"""
+import os
+import sys
+import tempfile
+
+import geopandas as gpd
+import shapely
+
+ETL_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "greengrid_etl"))
+sys.path.insert(0, ETL_DIR)
+import etl as e
+
+
+def batch(tree_ids: list, morada: list, pap: list) -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame({"tree_id": tree_ids, "morada": morada, "pap": pap},
+                            geometry=[shapely.Point(-9.14, 38.71)] * len(tree_ids), crs=4326)
+
+
+def check_missing_first(fname: str) -> list:
+    """Write an all-missing column first and values later; return the problems found."""
+    with e.DataWriter(fname) as writer:
+        writer.write(batch([1, 2], [None, None], [None, None]))
+        writer.write(batch([3, 4], ["Rua da Palma, 1", "Rua de Berna, 2"], [80.0, 125.5]))
+    gdf = e.read_data(fname)
+    problems = []
+    if gdf["morada"].tolist()[2:] != ["Rua da Palma, 1", "Rua de Berna, 2"]:
+        problems.append(f"morada read back as {gdf['morada'].tolist()}")
+    if gdf["pap"].tolist()[2:] != [80.0, 125.5]:
+        problems.append(f"pap read back as {gdf['pap'].tolist()}")
+    if str(gdf["tree_id"].dtype) != "int64":
+        problems.append(f"tree_id read back as {gdf['tree_id'].dtype}")
+    return problems
+
+
+def check_bad_batch(fname: str) -> list:
+    """Write a batch that cannot be converted; return the problems found."""
+    try:
+        with e.DataWriter(fname) as writer:
+            writer.write(batch([1], ["Rua do Sol, 3"], [40.0]))
+            writer.write(batch(["not a tree id"], ["Rua do Sol, 4"], [41.0]))
+    except SystemExit:
+        return ["a partial file was left behind"] if os.path.exists(fname) else []
+    except Exception as err:
+        return [f"raised {type(err).__name__} instead of calling die(): {err}"]
+    return ["the bad batch was accepted"]
+
+
+def main() -> None:
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, check in [("missing column in first batch", check_missing_first),
+                            ("unconvertible batch", check_bad_batch)]:
+            problems = check(os.path.join(tmp, f"{check.__name__}.parquet"))
+            failed |= bool(problems)
+            print(f"{name:<32}[{'FAIL' if problems else 'ok'}]")
+            for problem in problems:
+                print(f"{'':<32}{problem}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Check that the API's proximity queries are answered through a spatial index.
+
+The radius filter of `/trees/near` and the KNN ordering of `/trees/nearest`
+are run under `EXPLAIN (FORMAT JSON)` against the database; the script fails
+(exit status 1) if a plan does not scan `idx_trees_geog`, e.g. because the
+index is missing or the query stopped matching its expression.
+
+On a near-empty development database the planner prefers a sequential scan
+whatever the indexes; pass `--no-seqscan` there to check that the index is
+at least usable.
+
+Usage:
+    python greengrid_bench/explain_spatial.py --dsn "dbname=lisbon_greengrid user=postgres password=postgres host=localhost"
+"""
+import argparse
+import json
+import os
+import sys
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from spatial import NEAR_WHERE, NEAREST_SQL, nearest_params  # noqa: E402
+
+INDEX = "idx_trees_geog"
+INDEX_NODES = ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+
+# Baixa, Lisbon
+LON, LAT = -9.1394, 38.7107
+
+
+def plan_nodes(plan: dict):
+    """Yield every node of an EXPLAIN (FORMAT JSON) plan tree."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def uses_index(cur, sql: str, params) -> tuple:
+    """Return (True if the plan scans INDEX, node types of the plan)."""
+    cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    document = cur.fetchone()[0]
+    if isinstance(document, str):
+        document = json.loads(document)
+    nodes = list(plan_nodes(document[0]["Plan"]))
+    found = any(n["Node Type"] in INDEX_NODES and n.get("Index Name") == INDEX for n in nodes)
+    return found, [n["Node Type"] + (f" on {n['Index Name']}" if "Index Name" in n else "") for n in nodes]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Assert index-assisted proximity queries")
+    parser.add_argument("--dsn", default="dbname=lisbon_greengrid user=postgres password=postgres host=localhost")
+    parser.add_argument("--radius", type=float, default=100, help="Radius of the /trees/near check, in meters")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours of the /trees/nearest check")
+    parser.add_argument("--no-seqscan", action="store_true", help="Discourage sequential scans (small databases)")
+    args = parser.parse_args()
+
+    checks = {
+        "/trees/near": (f"SELECT t.tree_id FROM pa.trees t WHERE {NEAR_WHERE}", (LON, LAT, args.radius)),
+        "/trees/nearest": (NEAREST_SQL, nearest_params(LON, LAT, args.k)),
+    }
+    failed = False
+    with psycopg2.connect(args.dsn) as conn, conn.cursor() as cur:
+        if args.no_seqscan:
+            cur.execute("SET LOCAL enable_seqscan = off")
+        for route, (sql, params) in checks.items():
+            found, nodes = uses_index(cur, sql, params)
+            failed |= not found
+            print(f"{'ok  ' if found else 'FAIL'} {route:<16}{' > '.join(nodes)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
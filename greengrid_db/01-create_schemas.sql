@@ -11,4 +11,7 @@ CREATE SCHEMA IF NOT EXISTS pa
     AUTHORIZATION postgres;
 
 -- PostGIS Extension
-CREATE EXTENSION IF NOT EXISTS postgis;
\ No newline at end of file
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+-- pg_trgm Extension (trigram indexes for substring search and autocomplete)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
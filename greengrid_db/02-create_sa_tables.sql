@@ -14,3 +14,35 @@ CREATE TABLE IF NOT EXISTS sa.trees
     freguesia VARCHAR(100),            -- Parish name
     geometry GEOMETRY(Point, 4326)	   -- Tree location coordinates in WGS'84 Coordinate Reference System
 );
+
+-- Table: sa.tree_fingerprints
+-- Content hash of every tree of the last successful ETL load; incremental runs
+-- compare against it to stage only the trees that are new or changed.
+DROP TABLE IF EXISTS sa.tree_fingerprints CASCADE;
+CREATE TABLE IF NOT EXISTS sa.tree_fingerprints
+(
+    tree_id INTEGER PRIMARY KEY,       -- Unique ID from the Lisbon City Council dataset
+    fingerprint BIGINT NOT NULL        -- 64-bit hash of the transformed record (attributes and geometry)
+);
+
+-- Table: sa.parish
+-- Staging copy of the parish boundaries Shapefile, merged into pa.parish by
+-- pa.merge_staged_parishes() so the production table keeps its keys and indexes.
+DROP TABLE IF EXISTS sa.parish CASCADE;
+CREATE TABLE IF NOT EXISTS sa.parish
+(
+    id VARCHAR(100) PRIMARY KEY,       -- geopackage name (dtmnfr)
+    freguesia VARCHAR(100),            -- Parish name
+    geometry GEOMETRY(Geometry, 4326)  -- Boundary shape (Polygon or MultiPolygon)
+);
+
+-- Table: sa.static_fingerprints
+-- SHA-256 of the static files (e.g. the parish Shapefile) last loaded into the
+-- database; the ETL reloads a file only when its digest changes.
+DROP TABLE IF EXISTS sa.static_fingerprints CASCADE;
+CREATE TABLE IF NOT EXISTS sa.static_fingerprints
+(
+    source VARCHAR(100) PRIMARY KEY,   -- Name of the loaded file (e.g. 'parish')
+    sha256 CHAR(64) NOT NULL,          -- Digest of the file contents
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP   -- Time of the last load
+);
@@ -87,3 +87,30 @@ CREATE TABLE IF NOT EXISTS pa.comments
         REFERENCES pa.trees(tree_id) 
         ON DELETE CASCADE		-- if a tree is deleted, comments are removed
 );
+
+-- Table: pa.data_version
+-- Generation counter per production table. Every write (API endpoints, ETL load)
+-- bumps it so the API knows when its cached responses and tiles are stale.
+DROP TABLE IF EXISTS pa.data_version CASCADE;
+CREATE TABLE IF NOT EXISTS pa.data_version
+(
+    table_name VARCHAR(100) PRIMARY KEY,                    -- Name of the table in the pa schema
+    generation BIGINT NOT NULL DEFAULT 0,                   -- Incremented on every change
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP   -- Time of the last change
+);
+
+INSERT INTO pa.data_version (table_name)
+VALUES ('trees'), ('stats'), ('parish')
+ON CONFLICT (table_name) DO NOTHING;
+
+-- Table: pa.search_vocabulary
+-- Distinct species, common names and parishes with their tree counts.
+-- Rebuilt by pa.refresh_search_vocabulary() after each ETL load; feeds /search/suggest.
+DROP TABLE IF EXISTS pa.search_vocabulary CASCADE;
+CREATE TABLE IF NOT EXISTS pa.search_vocabulary
+(
+    kind VARCHAR(20) NOT NULL,          -- 'species', 'common_name' or 'parish'
+    term VARCHAR(255) NOT NULL,         -- The distinct value found in pa.trees
+    tree_count INTEGER NOT NULL,        -- Number of trees carrying it
+    PRIMARY KEY (kind, term)
+);
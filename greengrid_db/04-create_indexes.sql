@@ -2,6 +2,11 @@
 CREATE INDEX IF NOT EXISTS idx_trees_geom 
     ON pa.trees USING GIST (geometry);
 
+-- Geography expression index: lets meter-based searches on geometry::geography
+-- (ST_DWithin radius filters and <-> nearest-neighbour ordering) use an index scan
+CREATE INDEX IF NOT EXISTS idx_trees_geog
+    ON pa.trees USING GIST ((geometry::geography));
+
 CREATE INDEX IF NOT EXISTS idx_parish_geom 
     ON pa.parish USING GIST (geometry);
 
@@ -19,4 +24,18 @@ CREATE INDEX IF NOT EXISTS idx_trees_freguesia
     ON pa.trees (freguesia);
 
 CREATE INDEX IF NOT EXISTS idx_trees_especie 
-    ON pa.trees (especie);
\ No newline at end of file
+    ON pa.trees (especie);
+
+
+-- Trigram (pg_trgm) indexes: let ILIKE '%text%' searches and fuzzy matching use an index
+CREATE INDEX IF NOT EXISTS idx_trees_freguesia_trgm
+    ON pa.trees USING GIN (freguesia gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_trees_especie_trgm
+    ON pa.trees USING GIN (especie gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_trees_nome_vulga_trgm
+    ON pa.trees USING GIN (nome_vulga gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_vocabulary_term_trgm
+    ON pa.search_vocabulary USING GIN (term gin_trgm_ops);
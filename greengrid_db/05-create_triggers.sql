@@ -28,7 +28,8 @@ BEGIN
 		UPDATE pa.trees SET
         	pap = new.pap,
             manutencao = new.manutencao,
-            ocupacao = new.ocupacao
+            ocupacao = new.ocupacao,
+            freguesia = new.freguesia
         WHERE tree_id = new.tree_id;
 	END IF;
 	RETURN NEW;
@@ -43,3 +44,109 @@ AFTER INSERT ON sa.trees
 FOR EACH ROW 
 EXECUTE FUNCTION sa.insert_trees_in_pa();
 
+
+-- Set-based alternative to the trigger, run by the ETL after a bulk load into sa.trees
+-- (which disables the trigger while it loads). One INSERT ... ON CONFLICT statement
+-- adds the new trees and updates pap/manutencao/ocupacao/freguesia only where they changed, so
+-- unchanged trees are neither rewritten nor re-indexed.
+-- Trees missing from the staged source are counted and, if remove_missing is set,
+-- deleted (with their comments and maintenance records); never when nothing was staged.
+CREATE OR REPLACE FUNCTION pa.merge_staged_trees(remove_missing BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (inserted BIGINT, updated BIGINT, missing BIGINT, removed BIGINT)
+AS
+$$
+BEGIN
+	WITH merged AS (
+		INSERT INTO pa.trees (
+			tree_id, nome_vulga, especie, tipologia, pap,
+			manutencao, ocupacao, local, morada, freguesia, geometry
+		)
+		SELECT tree_id, nome_vulga, especie, tipologia, pap,
+			manutencao, ocupacao, local, morada, freguesia, geometry
+		FROM sa.trees
+		ON CONFLICT (tree_id) DO UPDATE SET
+			pap = EXCLUDED.pap,
+			manutencao = EXCLUDED.manutencao,
+			ocupacao = EXCLUDED.ocupacao,
+			freguesia = EXCLUDED.freguesia
+		WHERE (pa.trees.pap, pa.trees.manutencao, pa.trees.ocupacao, pa.trees.freguesia)
+			IS DISTINCT FROM (EXCLUDED.pap, EXCLUDED.manutencao, EXCLUDED.ocupacao, EXCLUDED.freguesia)
+		RETURNING (xmax = 0) AS is_new		-- xmax is 0 for freshly inserted rows
+	)
+	SELECT count(*) FILTER (WHERE is_new), count(*) FILTER (WHERE NOT is_new)
+	INTO inserted, updated
+	FROM merged;
+
+	SELECT count(*) INTO missing
+	FROM pa.trees p
+	WHERE NOT EXISTS (SELECT 1 FROM sa.trees s WHERE s.tree_id = p.tree_id);
+
+	removed := 0;
+	IF remove_missing AND missing > 0 AND EXISTS (SELECT 1 FROM sa.trees) THEN
+		DELETE FROM pa.trees p
+		WHERE NOT EXISTS (SELECT 1 FROM sa.trees s WHERE s.tree_id = p.tree_id);
+		GET DIAGNOSTICS removed = ROW_COUNT;
+	END IF;
+	RETURN NEXT;
+END;
+$$
+LANGUAGE plpgsql;
+
+
+-- To merge the staged parish boundaries (sa.parish) into production (pa.parish).
+-- Parishes are upserted by id and only rewritten when their name or boundary
+-- changed, so pa.parish keeps its primary key and idx_parish_geom; parishes no
+-- longer in the Shapefile are removed (never when the staging table is empty).
+CREATE OR REPLACE FUNCTION pa.merge_staged_parishes()
+RETURNS TABLE (inserted BIGINT, updated BIGINT, removed BIGINT)
+AS
+$$
+BEGIN
+	removed := 0;
+	IF EXISTS (SELECT 1 FROM sa.parish) THEN
+		-- First, so a name moving to a new id does not hit the UNIQUE constraint
+		DELETE FROM pa.parish p
+		WHERE NOT EXISTS (SELECT 1 FROM sa.parish s WHERE s.id = p.id);
+		GET DIAGNOSTICS removed = ROW_COUNT;
+	END IF;
+
+	WITH merged AS (
+		INSERT INTO pa.parish (id, freguesia, geometry)
+		SELECT id, freguesia, ST_Multi(geometry)
+		FROM sa.parish
+		ON CONFLICT (id) DO UPDATE SET
+			freguesia = EXCLUDED.freguesia,
+			geometry = EXCLUDED.geometry
+		WHERE (pa.parish.freguesia, ST_AsBinary(pa.parish.geometry))
+			IS DISTINCT FROM (EXCLUDED.freguesia, ST_AsBinary(EXCLUDED.geometry))
+		RETURNING (xmax = 0) AS is_new		-- xmax is 0 for freshly inserted rows
+	)
+	SELECT count(*) FILTER (WHERE is_new), count(*) FILTER (WHERE NOT is_new)
+	INTO inserted, updated
+	FROM merged;
+	RETURN NEXT;
+END;
+$$
+LANGUAGE plpgsql;
+
+
+-- To rebuild the search vocabulary (pa.search_vocabulary) from the production trees
+CREATE OR REPLACE FUNCTION pa.refresh_search_vocabulary()
+RETURNS VOID
+AS
+$$
+BEGIN
+	-- Runs in the caller's transaction, so readers see either the old or the new vocabulary
+	DELETE FROM pa.search_vocabulary;
+	INSERT INTO pa.search_vocabulary (kind, term, tree_count)
+	SELECT 'species', especie, count(*) FROM pa.trees
+	WHERE especie IS NOT NULL AND especie <> '' GROUP BY especie
+	UNION ALL
+	SELECT 'common_name', nome_vulga, count(*) FROM pa.trees
+	WHERE nome_vulga IS NOT NULL AND nome_vulga <> '' GROUP BY nome_vulga
+	UNION ALL
+	SELECT 'parish', freguesia, count(*) FROM pa.trees
+	WHERE freguesia IS NOT NULL AND freguesia <> '' GROUP BY freguesia;
+END;
+$$
+LANGUAGE plpgsql;
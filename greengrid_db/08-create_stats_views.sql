@@ -0,0 +1,122 @@
+-- STATISTICS MATERIALIZED VIEWS
+-- Precomputed counts and PAP (perimeter at breast height) distributions over pa.trees.
+-- They are refreshed CONCURRENTLY by the ETL post-load step, so API reads never block;
+-- every view therefore has a unique index.
+
+-- Trees per parish
+DROP MATERIALIZED VIEW IF EXISTS pa.stats_trees_by_freguesia;
+CREATE MATERIALIZED VIEW pa.stats_trees_by_freguesia AS
+SELECT
+    COALESCE(NULLIF(freguesia, ''), 'Não identificada') AS freguesia,
+    count(*) AS tree_count,
+    count(DISTINCT especie) AS species_count,
+    round(avg(pap), 2)::float8 AS avg_pap,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY pap::float8) AS median_pap
+FROM pa.trees
+GROUP BY 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_stats_freguesia
+    ON pa.stats_trees_by_freguesia (freguesia);
+
+-- Trees per species (with the most frequent common name)
+DROP MATERIALIZED VIEW IF EXISTS pa.stats_trees_by_species;
+CREATE MATERIALIZED VIEW pa.stats_trees_by_species AS
+SELECT
+    COALESCE(NULLIF(especie, ''), 'Não identificada') AS especie,
+    mode() WITHIN GROUP (ORDER BY nome_vulga) AS nome_vulga,
+    count(*) AS tree_count,
+    round(avg(pap), 2)::float8 AS avg_pap,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY pap::float8) AS median_pap
+FROM pa.trees
+GROUP BY 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_stats_especie
+    ON pa.stats_trees_by_species (especie);
+
+-- Trees per typology
+DROP MATERIALIZED VIEW IF EXISTS pa.stats_trees_by_tipologia;
+CREATE MATERIALIZED VIEW pa.stats_trees_by_tipologia AS
+SELECT
+    COALESCE(NULLIF(tipologia, ''), 'Não identificada') AS tipologia,
+    count(*) AS tree_count,
+    round(avg(pap), 2)::float8 AS avg_pap
+FROM pa.trees
+GROUP BY 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_stats_tipologia
+    ON pa.stats_trees_by_tipologia (tipologia);
+
+-- Trees per maintenance authority
+DROP MATERIALIZED VIEW IF EXISTS pa.stats_trees_by_manutencao;
+CREATE MATERIALIZED VIEW pa.stats_trees_by_manutencao AS
+SELECT
+    COALESCE(NULLIF(manutencao, ''), 'Não identificada') AS manutencao,
+    count(*) AS tree_count,
+    count(DISTINCT freguesia) AS parish_count
+FROM pa.trees
+GROUP BY 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_stats_manutencao
+    ON pa.stats_trees_by_manutencao (manutencao);
+
+-- PAP histogram (25 cm classes, the last one open-ended) for the city and per parish
+DROP MATERIALIZED VIEW IF EXISTS pa.stats_pap_distribution;
+CREATE MATERIALIZED VIEW pa.stats_pap_distribution AS
+WITH classified AS (
+    SELECT
+        COALESCE(NULLIF(freguesia, ''), 'Não identificada') AS freguesia,
+        LEAST(floor(pap / 25)::INTEGER, 20) AS pap_class
+    FROM pa.trees
+    WHERE pap IS NOT NULL AND pap >= 0
+)
+SELECT
+    COALESCE(freguesia, 'Lisboa') AS scope,      -- 'Lisboa' is the whole city
+    pap_class,
+    pap_class * 25 AS pap_from,
+    CASE WHEN pap_class < 20 THEN (pap_class + 1) * 25 END AS pap_to,   -- NULL: no upper bound
+    count(*) AS tree_count
+FROM classified
+GROUP BY GROUPING SETS ((freguesia, pap_class), (pap_class));
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_stats_pap
+    ON pa.stats_pap_distribution (scope, pap_class);
+
+-- Parish choropleth: trees, species richness and tree density per parish, with
+-- the boundary simplified once per zoom band (ST_SimplifyPreserveTopology in
+-- PT-TM06 metres, then rendered as GeoJSON with the precision the band needs).
+-- Served by the API's /parishes endpoint, which picks the band of the requested zoom.
+DROP MATERIALIZED VIEW IF EXISTS pa.parish_choropleth;
+CREATE MATERIALIZED VIEW pa.parish_choropleth AS
+WITH counts AS (
+    SELECT
+        p.id,
+        count(t.tree_id) AS tree_count,
+        count(DISTINCT NULLIF(t.especie, '')) AS species_count
+    FROM pa.parish p
+    LEFT JOIN pa.trees t ON ST_Intersects(p.geometry, t.geometry)
+    GROUP BY p.id
+),
+bands (zoom_band, min_zoom, tolerance_m, digits) AS (
+    VALUES (0, 0, 50.0, 4),     -- city overview
+           (1, 12, 10.0, 5),    -- district
+           (2, 14, 2.0, 6)      -- street
+)
+SELECT
+    p.id,
+    p.freguesia,
+    b.zoom_band,
+    b.min_zoom,
+    c.tree_count,
+    c.species_count,
+    round((ST_Area(p.geometry::geography) / 1e6)::numeric, 3)::float8 AS area_km2,
+    round((c.tree_count / NULLIF(ST_Area(p.geometry::geography) / 1e6, 0))::numeric, 1)::float8 AS density_km2,
+    ST_AsGeoJSON(
+        ST_Transform(ST_SimplifyPreserveTopology(ST_Transform(p.geometry, 3763), b.tolerance_m), 4326),
+        b.digits
+    ) AS geometry
+FROM pa.parish p
+JOIN counts c ON c.id = p.id
+CROSS JOIN bands b;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_parish_choropleth
+    ON pa.parish_choropleth (zoom_band, id);
@@ -32,7 +32,8 @@ def build_structure():
         "02-create_sa_tables.sql",
         "03-create_pa_tables.sql",
         "04-create_indexes.sql",
-        "05-create_triggers.sql"
+        "05-create_triggers.sql",
+        "08-create_stats_views.sql"
     ]
 
     try:
@@ -6,16 +6,57 @@ for data processing, database operations, logging, and configuration management.
 
 Modules Imported:
 - logs: Provides logging utilities and helper functions for error, info, and completion messages.
-- data_process: Handles data extraction, transformation, and loading, including reading/writing
-  GeoJSON, shapefile operations, and normalization utilities.
+- data_process: Handles data transformation and loading, including reading/writing
+  GeoJSON (whole or in batches) and GeoParquet, shapefile operations, normalization utilities,
+  change detection (fingerprints) and the parish boundaries (cached, STRtree point-in-polygon join).
+- arcgis: Provides the paginated, concurrent and resumable ArcGIS FeatureServer downloader
+  and the plain streamed download of any other URL.
+- pipeline: Provides the stage-aware runner that skips stages whose inputs did not change.
+- metrics: Provides the per-step timings, row/byte counts and peak memory of a run,
+  written as JSON lines or a Prometheus textfile.
 - config: Provides functions to read and manage pipeline configuration files.
 - db_connect: Provides the database controller for establishing and managing DB connections.
+
+Only `logs`, `config` and `metrics` are imported with the package. The other names are
+resolved on first use (PEP 562 module `__getattr__`), so `import etl` does not
+pull in geopandas, pyarrow, SQLAlchemy or requests: each pipeline stage only
+imports the libraries of the module it calls. `python main.py --help` and an
+extraction-only run therefore start in milliseconds.
 """
 
+import importlib
+
 from .logs import die, info, done, init_logger
-from .data_process import write_geojson, read_geojson, load_shapefile, normalize_column_name, download_data
 from .config import read_config
-from .db_connect import DBController
+from .metrics import Metrics, run_metrics, step, iterate, count, file_size
+
+# Public names resolved lazily, by the submodule defining them
+_LAZY = {
+    "write_geojson": "data_process", "read_geojson": "data_process", "read_geojson_batches": "data_process",
+    "load_shapefile": "data_process", "normalize_column_name": "data_process",
+    "read_data": "data_process", "write_data": "data_process", "read_geoparquet": "data_process",
+    "write_geoparquet": "data_process", "DataWriter": "data_process",
+    "fingerprint": "data_process", "diff_fingerprints": "data_process",
+    "read_parishes": "data_process", "ParishIndex": "data_process", "assign_freguesia": "data_process",
+    "download_arcgis": "arcgis", "download_data": "arcgis",
+    "Pipeline": "pipeline", "Stage": "pipeline",
+    "DBController": "db_connect",
+}
+
+__all__ = ["die", "info", "done", "init_logger", "read_config",
+           "Metrics", "run_metrics", "step", "iterate", "count", "file_size", *_LAZY]
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    globals()[name] = value     # Later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> list:
+    return sorted(__all__)
 
 # Initialize package-wide logger to ensure all modules log consistently
 init_logger()
@@ -0,0 +1,307 @@
+# Import required modules and libraries
+from .logs import die, info
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+
+PAGE_SIZE = 2000      # Features requested per page (capped by the layer's maxRecordCount)
+WORKERS = 4           # Pages downloaded concurrently
+RETRIES = 5           # Attempts per request before giving up
+RETRY_STATUSES = (429, 500, 502, 503, 504)   # HTTP errors worth another attempt; other 4xx fail at once
+TIMEOUT = (10, 120)   # Connect and read timeouts, in seconds
+DOWNLOAD_CHUNK = 1024 * 1024   # Bytes written to disk per streamed chunk
+
+
+class ArcGISExtractor:
+    """
+    Page-aware, concurrent and resumable download of an ArcGIS FeatureServer query.
+
+    The query is split into pages, with `resultOffset`/`resultRecordCount`
+    when the layer supports pagination and with objectId ranges otherwise,
+    so no page is truncated by the server's `maxRecordCount`. Pages are
+    fetched by a bounded pool of threads, each with its own pooled HTTP
+    session, and streamed to disk. A page file is only renamed into place
+    once it is complete and valid, so an interrupted run resumes where it
+    stopped. Finally the pages are stitched into one GeoJSON
+    FeatureCollection.
+
+    Every request (metadata and pages) is retried by `_attempt` alone, up to
+    `retries` attempts in total with a 1, 2, 4... second backoff; the HTTP
+    adapter itself does not retry.
+
+    Args:
+        url (str): FeatureServer layer query URL (".../FeatureServer/<n>/query?...").
+        page_size (int): Features per page.
+        workers (int): Concurrent page downloads.
+        retries (int): Attempts per request.
+    """
+
+    def __init__(self, url: str, page_size: int=PAGE_SIZE, workers: int=WORKERS, retries: int=RETRIES):
+        parts = urlsplit(url)
+        path = parts.path.rstrip("/")
+        if path.endswith("/query"):
+            path = path[:-len("/query")]
+        self.layer_url = urlunsplit((parts.scheme, parts.netloc, path, "", ""))
+        self.params = dict(parse_qsl(parts.query))
+        self.params.setdefault("where", "1=1")
+        self.params.setdefault("outFields", "*")
+        self.params["f"] = "geojson"
+        self.page_size = page_size
+        self.workers = workers
+        self.retries = retries
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        """HTTP session of the calling thread, keeping its connections alive between pages."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            # No retries here: `_attempt` is the only retry layer
+            adapter = HTTPAdapter(max_retries=0, pool_connections=1, pool_maxsize=1)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+        return session
+
+    def _attempt(self, what: str, request):
+        """
+        Call `request()` until it succeeds, at most `retries` times, backing off 1, 2, 4... seconds.
+
+        Connection errors, timeouts, invalid or incomplete responses and the
+        HTTP statuses in RETRY_STATUSES are retried; other HTTP errors fail at once.
+
+        Raises:
+            RuntimeError: If the last attempt fails, naming `what` was requested.
+        """
+        for attempt in range(1, self.retries + 1):
+            try:
+                return request()
+            except (requests.RequestException, ValueError, RuntimeError) as err:
+                status = getattr(getattr(err, "response", None), "status_code", None)
+                if attempt >= self.retries or (status is not None and status not in RETRY_STATUSES):
+                    raise RuntimeError(f"{what}: {err}") from err
+                time.sleep(2 ** (attempt - 1))
+
+    def _get_json(self, url: str, params: dict) -> dict:
+        def request():
+            r = self._session().get(url, params=params, timeout=TIMEOUT)
+            r.raise_for_status()
+            doc = r.json()
+            if "error" in doc:
+                raise RuntimeError(f"ArcGIS error: {doc['error']}")
+            return doc
+
+        return self._attempt(url, request)
+
+    def version(self) -> str:
+        """
+        Last edit date of the layer's data, as reported by the service (None if not reported).
+
+        It changes whenever the features are edited, so it identifies the
+        version of the source without downloading it.
+        """
+        editing = self._get_json(self.layer_url, {"f": "json"}).get("editingInfo", {})
+        edited = editing.get("dataLastEditDate") or editing.get("lastEditDate")
+        return str(edited) if edited else None
+
+    def plan(self) -> list:
+        """
+        Split the query into pages.
+
+        Returns:
+            list: One dict per page with the query parameters selecting it
+            and the number of features it should hold ("expected").
+        """
+        layer = self._get_json(self.layer_url, {"f": "json"})
+        oid = layer.get("objectIdField") or next(
+            (f["name"] for f in layer.get("fields", []) if f.get("type") == "esriFieldTypeOID"), None)
+        page_size = min(self.page_size, layer.get("maxRecordCount") or self.page_size)
+        paginated = layer.get("advancedQueryCapabilities", {}).get("supportsPagination", False)
+
+        if paginated and oid:
+            count = self._get_json(f"{self.layer_url}/query",
+                                   {"where": self.params["where"], "returnCountOnly": "true", "f": "json"})["count"]
+            return [{"resultOffset": offset, "resultRecordCount": page_size, "orderByFields": f"{oid} ASC",
+                     "expected": min(page_size, count - offset)}
+                    for offset in range(0, count, page_size)]
+
+        if not oid:
+            raise RuntimeError("The layer has neither pagination nor an objectId field to split it by")
+        ids = self._get_json(f"{self.layer_url}/query",
+                             {"where": self.params["where"], "returnIdsOnly": "true", "f": "json"})["objectIds"] or []
+        ids.sort()
+        return [{"where": f"({self.params['where']}) AND {oid} >= {chunk[0]} AND {oid} <= {chunk[-1]}",
+                 "expected": len(chunk)}
+                for chunk in (ids[i:i + page_size] for i in range(0, len(ids), page_size))]
+
+    def fetch_page(self, page: dict, path: str) -> int:
+        """
+        Download one page to `path`, retrying until it is complete and valid.
+
+        A page is incomplete when it holds fewer features than the plan
+        expects. `exceededTransferLimit` is not looked at: with
+        `resultOffset` paging ArcGIS sets it on every page but the last,
+        meaning that more records follow.
+
+        Returns:
+            int: Number of features in the page.
+        """
+        params = {**self.params, **{k: v for k, v in page.items() if k != "expected"}}
+        partial = f"{path}.part"
+
+        def request():
+            with self._session().get(f"{self.layer_url}/query", params=params, stream=True, timeout=TIMEOUT) as r:
+                r.raise_for_status()
+                with open(partial, "wb") as f:
+                    for chunk in r.iter_content(DOWNLOAD_CHUNK):
+                        f.write(chunk)
+            with open(partial, encoding="utf-8") as f:
+                doc = json.load(f)
+            if "error" in doc or "features" not in doc:
+                raise RuntimeError(f"invalid page: {str(doc.get('error', doc))[:200]}")
+            if len(doc["features"]) < page["expected"]:
+                raise RuntimeError(f"page truncated: {len(doc['features'])} features, {page['expected']} expected")
+            os.replace(partial, path)
+            return len(doc["features"])
+
+        return self._attempt(f"page {page}", request)
+
+    def stitch(self, paths: list, fname: str) -> int:
+        """
+        Concatenate page files into one FeatureCollection, one page in memory at a time.
+
+        Features repeated across pages (the source changed while paging) are written once.
+
+        Returns:
+            int: Number of features written.
+        """
+        seen = set()
+        written = 0
+        with open(f"{fname}.part", "w", encoding="utf-8") as out:
+            out.write('{"type": "FeatureCollection", "features": [\n')
+            for path in paths:
+                with open(path, encoding="utf-8") as f:
+                    features = json.load(f)["features"]
+                for feature in features:
+                    key = feature.get("id")
+                    if key is not None:
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                    out.write((",\n" if written else "") + json.dumps(feature, ensure_ascii=False))
+                    written += 1
+            out.write("\n]}\n")
+        os.replace(f"{fname}.part", fname)
+        return written
+
+    def download(self, fname: str, parts_dir: str=None) -> int:
+        """
+        Download the whole query into `fname` as GeoJSON.
+
+        Pages are kept in `parts_dir` (default: "<fname>.parts") until the
+        dataset is stitched; rerunning after a failure only fetches the
+        missing pages, as long as the query and page plan are unchanged.
+
+        Returns:
+            int: Number of features written.
+        """
+        parts_dir = parts_dir or f"{fname}.parts"
+        pages = self.plan()
+        manifest = {"url": self.layer_url, "params": self.params, "pages": pages}
+        manifest_path = os.path.join(parts_dir, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                if json.load(f) != manifest:
+                    info("EXTRACTION: SOURCE OR PAGE PLAN CHANGED, DISCARDING PARTIAL DOWNLOAD")
+                    shutil.rmtree(parts_dir)
+        os.makedirs(parts_dir, exist_ok=True)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        paths = [os.path.join(parts_dir, f"page_{i:06d}.geojson") for i in range(len(pages))]
+        done = sum(os.path.exists(p) for p in paths)
+        info(f"EXTRACTION: {len(pages)} PAGES ({done} ALREADY DOWNLOADED), {self.workers} WORKERS")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.fetch_page, page, path): page
+                       for page, path in zip(pages, paths) if not os.path.exists(path)}
+            for future in as_completed(futures):
+                count = future.result()
+                done += 1
+                page = futures[future]
+                if count > page["expected"]:
+                    info(f"EXTRACTION: PAGE HAS {count} FEATURES, {page['expected']} EXPECTED")
+                info(f"EXTRACTION: PAGE {done}/{len(pages)} DOWNLOADED")
+
+        written = self.stitch(paths, fname)
+        shutil.rmtree(parts_dir)
+        return written
+
+
+def download_arcgis(url: str, fname: str, page_size: int=PAGE_SIZE, workers: int=WORKERS,
+                    retries: int=RETRIES, parts_dir: str=None) -> int:
+    """
+    Download an ArcGIS FeatureServer query page by page into one GeoJSON file.
+
+    See `ArcGISExtractor` for how pages are planned, fetched and resumed.
+
+    Args:
+        url (str): FeatureServer layer query URL.
+        fname (str): Output GeoJSON filename.
+        page_size (int): Features per page (capped by the layer's maxRecordCount).
+        workers (int): Concurrent page downloads.
+        retries (int): Attempts per request.
+        parts_dir (str): Directory holding the downloaded pages until they are stitched.
+
+    Returns:
+        int: Number of features written.
+
+    Raises:
+        SystemExit: If a page cannot be downloaded after all retries, the
+        function calls `die()`; the pages already on disk are kept for the next run.
+    """
+    try:
+        return ArcGISExtractor(url, page_size, workers, retries).download(fname, parts_dir)
+    except Exception as e:
+        die(f"download_arcgis: {e}")
+
+
+# ------------------------------------
+# -------Download Data Function-------
+
+def download_data(url: str, fname: str) -> None:
+    """
+    Download data from a given URL and save it to a local file.
+
+    This function performs an HTTP GET request to fetch the content from the 
+    specified URL and writes it to a local file in binary mode. If an error 
+    occurs during the download or file writing, the function calls `die()` 
+    with the exception message.
+
+    Args:
+        url (str): The URL of the data to download.
+        fname (str): The local filename (including path) where the downloaded 
+            data will be saved.
+    Returns:
+        None
+
+    Raises:
+        Exception: Any exception encountered during the HTTP request or file 
+            write operation is propagated via the `die()` function.
+
+    """
+    try:
+        # Stream the body to disk instead of holding it in memory
+        with requests.get(url, allow_redirects=True, stream=True, timeout=TIMEOUT) as r:
+            r.raise_for_status()
+            with open(fname, "wb") as f:
+                for chunk in r.iter_content(DOWNLOAD_CHUNK):
+                    f.write(chunk)
+    except Exception as e:
+        die(f"{e}")
@@ -1,85 +1,103 @@
 # Import required modules and libraries
 from .logs import die, info
-from .config import read_config
-import requests
+from .pipeline import file_fingerprint
+import hashlib
+import json
+import os
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from sqlalchemy import create_engine
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyogrio
+import shapely
 import re
 
-# Extract database info from the configuration file
-config = read_config("./config/00.yml")
-username= config["database"]["username"]
-password= config["database"]["password"]
-host= config["database"]["host"]
-port= config["database"]["port"]
-database= config["database"]["database"]
+# Files making up a Shapefile, hashed to detect changes of the parish boundaries
+SHAPEFILE_PARTS = ("shp", "shx", "dbf", "prj", "cpg")
+
+# Dataset formats understood by read_data/write_data, by file extension
+DATA_FORMATS = {
+    "geojson": (".geojson", ".json"),
+    "parquet": (".parquet", ".geoparquet"),
+}
+
+# Arrow types of the processed columns that are not text (see `processed_schema`)
+PROCESSED_TYPES = {
+    "tree_id": pa.int64(),
+    "pap": pa.float64(),
+}
 
 
 # ------------------------------------
-# -------Download Data Function-------
+# --------Read GeoJSON Function-------
 
-def download_data(url: str, fname: str) -> None:
+def read_geojson(fname: str, columns: list=None) -> gpd.GeoDataFrame:
     """
-    Download data from a given URL and save it to a local file.
+    Read a GeoJSON file into a GeoPandas GeoDataFrame.
 
-    This function performs an HTTP GET request to fetch the content from the 
-    specified URL and writes it to a local file in binary mode. If an error 
-    occurs during the download or file writing, the function calls `die()` 
-    with the exception message.
+    This function loads a GeoJSON file from disk and returns it
+    as a GeoDataFrame. If the file cannot be read or is invalid,
+    the function will terminate execution via the `die` handler.
 
     Args:
-        url (str): The URL of the data to download.
-        fname (str): The local filename (including path) where the downloaded 
-            data will be saved.
-    Returns:
-        None
+        fname (str): Path to the GeoJSON file to read.
+        columns (list[str], optional): Properties to keep (the geometry is always read).
 
-    Raises:
-        Exception: Any exception encountered during the HTTP request or file 
-            write operation is propagated via the `die()` function.
+    Return:
+        gpd.GeoDataFrame: A GeoPandas GeoDataFrame containing the features from the file.
 
+    Raises:
+        SystemExit: If reading the GeoJSON file fails, the `die` function is called
+        and the program exits with an error message.
     """
     try:
-        r = requests.get(url, allow_redirects=True)
-        with open(fname, "wb") as f:
-            f.write(r.content)
+        if columns is not None:
+            columns = [col for col in columns if col != "geometry"]
+        gdf = gpd.read_file(fname, columns=columns)
     except Exception as e:
-        die(f"{e}")
+        die(f"read_geojson: {e}")
+    return gdf
 
 
 # ------------------------------------
-# --------Read GeoJSON Function-------
+# ----Read GeoJSON Batches Function---
 
-def read_geojson(fname: str,) -> gpd.GeoDataFrame:
+def read_geojson_batches(fname: str, batch_size: int=50000):
     """
-    Read a GeoJSON file into a GeoPandas GeoDataFrame.
+    Read a GeoJSON file as a stream of GeoDataFrames of at most `batch_size` features.
 
-    This function loads a GeoJSON file from disk and returns it
-    as a GeoDataFrame. If the file cannot be read or is invalid,
-    the function will terminate execution via the `die` handler.
+    Features are read through pyogrio's Arrow stream, so only one batch is
+    held in memory at a time whatever the size of the file.
 
     Args:
         fname (str): Path to the GeoJSON file to read.
+        batch_size (int): Maximum number of features per GeoDataFrame.
 
-    Return:
-        gpd.GeoDataFrame: A GeoPandas GeoDataFrame containing the features from the file.
+    Yields:
+        gpd.GeoDataFrame: The next batch of features, with the file's CRS.
 
     Raises:
-        SystemExit: If reading the GeoJSON file fails, the `die` function is called
+        SystemExit: If the file cannot be opened or read, the `die` function is called
         and the program exits with an error message.
     """
     try:
-        gdf = gpd.read_file(fname)
+        with pyogrio.raw.open_arrow(fname, batch_size=batch_size, use_pyarrow=True) as (meta, reader):
+            geometry = meta["geometry_name"] or "wkb_geometry"
+            for batch in reader:
+                df = batch.to_pandas()
+                yield gpd.GeoDataFrame(
+                    df.drop(columns=geometry),
+                    geometry=gpd.GeoSeries.from_wkb(df[geometry].values, crs=meta["crs"]),
+                )
     except Exception as e:
-        die(f"read_geojson: {e}")
-    return gdf
+        die(f"read_geojson_batches: {e}")
 
 
 # ------------------------------------
 # -------Write GeoJSON Function-------
 
-def write_geojson(gdf: gpd.GeoDataFrame, fname: str) -> None:
+def write_geojson(gdf: gpd.GeoDataFrame, fname: str, append: bool=False) -> None:
     """
     Writes a GeoPandas GeoDataFrame to a GeoJSON file.
 
@@ -91,6 +109,8 @@ def write_geojson(gdf: gpd.GeoDataFrame, fname: str) -> None:
         gdf (gpd.GeoDataFrame): The GeoDataFrame to write to disk.
         fname (str): The full file path (including filename) where
             the GeoJSON should be saved.
+        append (bool): Add the features to an existing file written
+            with the same columns instead of replacing it.
 
     Raises:
         SystemExit: If an exception occurs during the file write,
@@ -105,59 +125,403 @@ def write_geojson(gdf: gpd.GeoDataFrame, fname: str) -> None:
         gdf.to_file(
             fname,
             driver="GeoJSON",
+            mode="a" if append else "w",
         )
     except Exception as e:
         die(f"write_geojson: {e}")
         
 
 # ------------------------------------
-# -------Load Shapefile Function------
+# ------GeoParquet I/O Functions------
+
+def geoparquet_metadata(gdf: gpd.GeoDataFrame) -> bytes:
+    """
+    Build the GeoParquet "geo" schema metadata of a GeoDataFrame (WKB-encoded geometry).
+
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame whose geometry column and CRS are described.
+
+    Returns:
+        bytes: JSON document stored under the "geo" key of the Parquet schema.
+    """
+    geometry = gdf.geometry.name
+    column = {"encoding": "WKB", "geometry_types": []}
+    if gdf.crs is not None:
+        column["crs"] = gdf.crs.to_json_dict()
+    return json.dumps({"version": "1.0.0", "primary_column": geometry, "columns": {geometry: column}}).encode()
+
+
+def processed_schema(gdf: gpd.GeoDataFrame) -> pa.Schema:
+    """
+    Arrow schema of the attributes of a processed dataset, independent of the values of any batch.
+
+    The columns of PROCESSED_TYPES get their type, other numeric and boolean
+    columns keep their pandas dtype and everything else is text, so a column
+    that happens to be all missing in a batch is still typed.
+    """
+    fields = []
+    for col, dtype in gdf.drop(columns=gdf.geometry.name).dtypes.items():
+        if col in PROCESSED_TYPES:
+            fields.append(pa.field(col, PROCESSED_TYPES[col]))
+        elif pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+            fields.append(pa.field(col, pa.from_numpy_dtype(getattr(dtype, "numpy_dtype", dtype))))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+def geoparquet_table(gdf: gpd.GeoDataFrame, schema: pa.Schema=None) -> pa.Table:
+    """
+    Convert a GeoDataFrame into an Arrow table ready to be written as GeoParquet.
+
+    The attributes are converted to `schema` (see `processed_schema`) or,
+    without it, keep their pandas dtypes; the geometry is stored as WKB.
+    """
+    geometry = gdf.geometry.name
+    table = pa.Table.from_pandas(pd.DataFrame(gdf.drop(columns=geometry)), schema=schema, preserve_index=False)
+    table = table.append_column(geometry, pa.array(gdf.geometry.to_wkb(), type=pa.binary()))
+    return table.replace_schema_metadata({**table.schema.metadata, b"geo": geoparquet_metadata(gdf)})
+
+
+def read_geoparquet(fname: str, columns: list=None) -> gpd.GeoDataFrame:
+    """
+    Read a GeoParquet file into a GeoPandas GeoDataFrame.
+
+    Args:
+        fname (str): Path to the GeoParquet file to read.
+        columns (list[str], optional): Columns to read (the geometry is always
+            read); the other columns are never decoded.
+
+    Return:
+        gpd.GeoDataFrame: The features of the file, with their stored dtypes and CRS.
+
+    Raises:
+        SystemExit: If reading the file fails, the `die` function is called
+        and the program exits with an error message.
+    """
+    try:
+        if columns is not None:
+            geometry = json.loads(pq.read_schema(fname).metadata[b"geo"])["primary_column"]
+            columns = list(dict.fromkeys(list(columns) + [geometry]))
+        gdf = gpd.read_parquet(fname, columns=columns)
+    except Exception as e:
+        die(f"read_geoparquet: {e}")
+    return gdf
+
+
+def write_geoparquet(gdf: gpd.GeoDataFrame, fname: str, compression: str="zstd") -> None:
+    """
+    Write a GeoPandas GeoDataFrame to a GeoParquet file.
+
+    The attributes are typed by `processed_schema`, as in `DataWriter`, so
+    the full and the streaming transformation write the same schema.
+
+    Args:
+        gdf (gpd.GeoDataFrame): The GeoDataFrame to write to disk.
+        fname (str): The full file path (including filename).
+        compression (str): Parquet compression codec ("zstd", "snappy", "gzip", "none", ...).
+
+    Raises:
+        SystemExit: If an exception occurs during the file write,
+            the function calls `die()` and exits the program.
+    """
+    try:
+        pq.write_table(geoparquet_table(gdf, schema=processed_schema(gdf)), fname, compression=compression)
+    except Exception as e:
+        die(f"write_geoparquet: {e}")
+
+
+# ------------------------------------
+# -----Format Dispatching Functions---
+
+def data_format(fname: str) -> str:
+    """
+    Return the format of a dataset file from its extension.
+
+    Raises:
+        ValueError: If the extension is not one of DATA_FORMATS.
+    """
+    extension = os.path.splitext(fname)[1].lower()
+    for fmt, extensions in DATA_FORMATS.items():
+        if extension in extensions:
+            return fmt
+    raise ValueError(f"Unsupported dataset format: '{extension}' (expected one of {sorted(DATA_FORMATS)})")
+
+
+def read_data(fname: str, columns: list=None) -> gpd.GeoDataFrame:
+    """
+    Read a GeoJSON or GeoParquet dataset, chosen by the file extension.
+
+    Args:
+        fname (str): Path to the dataset.
+        columns (list[str], optional): Columns to read (the geometry is always read).
+
+    Return:
+        gpd.GeoDataFrame: The features of the dataset.
+
+    Raises:
+        SystemExit: If the format is unsupported or reading fails, the `die`
+        function is called and the program exits with an error message.
+    """
+    try:
+        fmt = data_format(fname)
+    except ValueError as e:
+        die(f"read_data: {e}")
+    if fmt == "parquet":
+        return read_geoparquet(fname, columns=columns)
+    return read_geojson(fname, columns=columns)
+
+
+def write_data(gdf: gpd.GeoDataFrame, fname: str, compression: str="zstd") -> None:
+    """
+    Write a GeoDataFrame as GeoJSON or GeoParquet, chosen by the file extension.
+
+    Args:
+        gdf (gpd.GeoDataFrame): The GeoDataFrame to write to disk.
+        fname (str): The full file path (including filename).
+        compression (str): Parquet compression codec (ignored for GeoJSON).
+
+    Raises:
+        SystemExit: If the format is unsupported or writing fails, the `die`
+        function is called and the program exits with an error message.
+    """
+    try:
+        fmt = data_format(fname)
+    except ValueError as e:
+        die(f"write_data: {e}")
+    if fmt == "parquet":
+        write_geoparquet(gdf, fname, compression=compression)
+    else:
+        write_geojson(gdf, fname)
+
+
+class DataWriter:
+    """
+    Write a dataset batch by batch, as GeoJSON or GeoParquet (chosen by the file extension).
+
+    GeoJSON batches are appended to the file; GeoParquet batches become row
+    groups of a single file. The Parquet schema is set from the columns of
+    the first batch with `processed_schema`, not from its values, and every
+    batch is converted to it. Use it as a context manager so the Parquet
+    footer is written when the stream ends; if the stream fails, the partial
+    file is removed.
+
+    Args:
+        fname (str): The full file path (including filename).
+        compression (str): Parquet compression codec (ignored for GeoJSON).
+    """
+
+    def __init__(self, fname: str, compression: str="zstd"):
+        self.fname = fname
+        self.compression = compression
+        self.format = data_format(fname)
+        self.rows = 0
+        self._schema = None
+        self._writer = None
+
+    def write(self, gdf: gpd.GeoDataFrame) -> None:
+        """
+        Append a batch of features to the dataset.
+
+        Raises:
+            SystemExit: If a batch cannot be converted or written, the `die`
+            function is called and the program exits with an error message.
+        """
+        if self.format == "geojson":
+            write_geojson(gdf, self.fname, append=self.rows > 0)
+        else:
+            try:
+                if self._schema is None:
+                    self._schema = processed_schema(gdf)
+                table = geoparquet_table(gdf, schema=self._schema)
+                if self._writer is None:
+                    self._writer = pq.ParquetWriter(self.fname, table.schema, compression=self.compression)
+                self._writer.write_table(table.replace_schema_metadata(self._writer.schema.metadata))
+            except Exception as e:
+                die(f"DataWriter: batch starting at feature {self.rows}: {e}")
+        self.rows += len(gdf)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.close()
+        if exc_type is not None and os.path.exists(self.fname):
+            os.remove(self.fname)
+
+
+# ------------------------------------
+# ------Parish Boundary Functions-----
+
+def shapefile_fingerprint(fname: str) -> str:
+    """
+    SHA-256 over the files of a Shapefile (.shp, .shx, .dbf, .prj and .cpg, if present).
+
+    Args:
+        fname (str): Path to the .shp file.
+
+    Returns:
+        str: Hex digest that changes whenever any component of the Shapefile changes.
+    """
+    stem = os.path.splitext(fname)[0]
+    digest = hashlib.sha256()
+    for ext in SHAPEFILE_PARTS:
+        fingerprint = file_fingerprint(f"{stem}.{ext}")
+        if fingerprint is not None:
+            digest.update(f"{ext}:{fingerprint['sha256']};".encode())
+    return digest.hexdigest()
+
+
+def read_parishes(fname: str, cache: str=None) -> gpd.GeoDataFrame:
+    """
+    Read the parish boundaries Shapefile in EPSG:4326, through a GeoParquet cache.
+
+    Reprojecting the Shapefile is done once: the result is written to
+    `cache` and read from there as long as the cache is newer than every
+    file of the Shapefile.
+
+    Args:
+        fname (str): Path to the parish boundaries Shapefile (.shp).
+        cache (str, optional): GeoParquet file holding the reprojected boundaries.
+
+    Return:
+        gpd.GeoDataFrame: The parishes ("id", "freguesia", "geometry") in EPSG:4326.
+
+    Raises:
+        SystemExit: If reading or reprojecting fails, the `die` function is called
+        and the program exits with an error message.
+    """
+    stem = os.path.splitext(fname)[0]
+    parts = [f"{stem}.{ext}" for ext in SHAPEFILE_PARTS if os.path.exists(f"{stem}.{ext}")]
+    if cache and os.path.exists(cache) and all(os.path.getmtime(cache) >= os.path.getmtime(p) for p in parts):
+        return read_geoparquet(cache)
+    try:
+        gdf = gpd.read_file(fname).to_crs(epsg=4326)
+    except Exception as e:
+        die(f"read_parishes: {e}")
+    if cache:
+        write_geoparquet(gdf, cache)
+    return gdf
 
-def load_shapefile(fname: str, config: dict):
+
+class ParishIndex:
+    """
+    STRtree over the parish boundaries, finding the parish of many points at once.
+
+    The tree is built once per run; each lookup is a single vectorized
+    query over all the points of a batch instead of a per-point test
+    against every polygon.
+
+    Args:
+        parishes (gpd.GeoDataFrame): Parish boundaries, in the CRS of the points.
+        name (str): Column holding the parish name.
+    """
+
+    def __init__(self, parishes: gpd.GeoDataFrame, name: str="freguesia"):
+        self.crs = parishes.crs
+        self.names = parishes[name].to_numpy(dtype=object)
+        self.tree = shapely.STRtree(np.asarray(parishes.geometry.values))
+
+    def lookup(self, points: gpd.GeoSeries) -> np.ndarray:
+        """
+        Name of the parish containing each point (None outside every parish).
+
+        A point on a border shared by two parishes gets the first one.
+        """
+        geoms = np.asarray(points.values)
+        point_idx, parish_idx = self.tree.query(geoms, predicate="intersects")
+        names = np.full(len(geoms), None, dtype=object)
+        # Assign in reverse so that, for a point matching several parishes, the first one wins
+        names[point_idx[::-1]] = self.names[parish_idx[::-1]]
+        return names
+
+
+def assign_freguesia(gdf: gpd.GeoDataFrame, parishes: ParishIndex, mode: str="assign") -> tuple:
     """
-    Load a Shapefile into a PostgreSQL/PostGIS table.
+    Assign or validate the parish of every tree with a point-in-polygon join.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Trees with a "freguesia" column, in the CRS of `parishes`.
+        parishes (ParishIndex): Parish boundaries.
+        mode (str): "assign" replaces the source parish with the one the
+            tree lies in (trees outside every parish keep the source value);
+            "validate" only counts the disagreements.
+
+    Returns:
+        tuple: The GeoDataFrame, the number of trees whose source parish
+        differs from their spatial parish, and the number of trees outside every parish.
+    """
+    source = gdf["freguesia"]
+    spatial = pd.Series(parishes.lookup(gdf.geometry), index=gdf.index, dtype=object)
+    inside = spatial.notna()
+    differs = inside & (source.fillna("").astype(str).str.casefold() != spatial.fillna("").astype(str).str.casefold())
+    if mode == "assign":
+        gdf["freguesia"] = spatial.where(inside, source).astype(source.dtype)
+    return gdf, int(differs.sum()), int((~inside).sum())
 
-    This function reads a Shapefile using GeoPandas, transforms its coordinate
-    reference system to EPSG:4326, and loads the data into the 
-    "pa.parish" table in the configured PostgreSQL/PostGIS database.
-    Existing data in the table will be replaced.
+
+def load_shapefile(fname: str, config: dict, cache: str=None, db: "DBController"=None) -> bool:
+    """
+    Load the parish boundaries Shapefile into pa.parish, only when it changed.
+
+    The digest of the Shapefile is compared with the one recorded in
+    sa.static_fingerprints by the last load; if they match and pa.parish is
+    populated nothing is done. Otherwise the boundaries (reprojected to
+    EPSG:4326, see `read_parishes`) are copied into sa.parish and upserted
+    into pa.parish by `DBController.merge_staged_parishes`, which keeps the
+    table, its primary key and its GIST index instead of replacing them.
 
     Args:
         fname (str): Path to the Shapefile (.shp) to load.
         config (dict): Configuration dictionary containing database connection
             parameters.
+        cache (str, optional): GeoParquet cache of the reprojected boundaries.
+        db (DBController, optional): Controller to reuse (and its pooled
+            connections); by default one is opened for the call.
+
+    Returns:
+        bool: True if pa.parish changed.
 
     Raises:
         Exception: If reading the file, transforming, or loading into the
             database fails. Errors are logged before being raised.
             
     """
+    owned = db is None
     try:
-        info("Starting shapefile load into 'parish' table.")
-        gdf = gpd.read_file(fname)
+        if owned:
+            from .db_connect import DBController   # SQLAlchemy is only needed by the load
+            db = DBController(**config["database"])
+        digest = shapefile_fingerprint(fname)
+        loaded = db.select_data("""
+            SELECT (SELECT sha256 FROM sa.static_fingerprints WHERE source = 'parish') AS sha256,
+                   EXISTS (SELECT 1 FROM pa.parish) AS populated
+        """).iloc[0]
+        if loaded["sha256"] == digest and loaded["populated"]:
+            info("Parish shapefile unchanged, 'parish' table left as is.")
+            return False
 
-        # Transform shapefile data (similar to trees)
-        gdf = gdf.to_crs('EPSG:4326')
-
-        # Establish connection and load to database
-        engine = create_engine(
-           f"postgresql://{username}:{password}@{host}:{port}/{database}"
-        )
-        with engine.begin() as connection:
-            gdf.to_postgis(
-                name="parish",
-                con=connection,
-                schema="pa",
-                if_exists="replace",
-                index=False,
-            )
+        info("Starting shapefile load into 'parish' table.")
+        gdf = read_parishes(fname, cache=cache)
+        db.copy_data(gdf[["id", "freguesia", "geometry"]], "sa", "parish")
+        merged = db.merge_staged_parishes("parish", digest)
 
         info("Parish shapefile loaded successfully.")
-        info(f"Loaded {len(gdf)} records into 'parish' table.")
+        info(f"Parishes: {merged['inserted']} inserted, {merged['updated']} updated, "
+             f"{merged['removed']} removed in 'parish' table.")
+        return bool(merged["inserted"] or merged["updated"] or merged["removed"])
 
     except Exception as e:
         die(f"Error loading shapefile into 'parish' table: {e}")
         raise
+    finally:
+        if owned and db is not None:
+            db.close()
 
 
 # ------------------------------------
@@ -185,3 +549,58 @@ def normalize_column_name(column_name: str) -> str:
     column_name = re.sub(r"\s+", "_", column_name) # Replace any whitespace (spaces, tabs, etc.) with underscores
     column_name = re.sub(r"[^\w]", "", column_name) # Remove any character that is not a letter, number, or underscore
     return column_name
+
+
+# ------------------------------------
+# -----Change Detection Functions-----
+
+def fingerprint(gdf: gpd.GeoDataFrame, key: str, columns: list=None) -> pd.Series:
+    """
+    Compute a content hash for every record of a GeoDataFrame.
+
+    The columns are hashed together (the geometry as WKB) with pandas'
+    vectorized row hashing, which is deterministic across runs, so a record
+    keeps its fingerprint until one of the hashed values changes.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Transformed records.
+        key (str): Column identifying a record (e.g. "tree_id").
+        columns (list[str], optional): Columns to hash, e.g. only those the
+            load writes to existing records; those missing from `gdf` are
+            ignored. Default: all columns, including the geometry.
+
+    Returns:
+        pd.Series: Signed 64-bit fingerprints (they fit a BIGINT column) indexed by `key`.
+    """
+    geometry = gdf.geometry.name
+    if columns is None:
+        columns = list(gdf.columns)
+    values = pd.DataFrame(gdf[[col for col in gdf.columns if col in columns and col != geometry]])
+    if geometry in columns:
+        values[geometry] = gdf.geometry.to_wkb(hex=True)
+    hashes = pd.util.hash_pandas_object(values, index=False).values.view("int64")
+    return pd.Series(hashes, index=gdf[key].values, name="fingerprint")
+
+
+def diff_fingerprints(current: pd.Series, previous: pd.Series) -> dict:
+    """
+    Compare the fingerprints of this run with those of the last load.
+
+    Args:
+        current (pd.Series): Fingerprints of the transformed records, indexed by key.
+        previous (pd.Series): Stored fingerprints of the last load, indexed by key.
+
+    Returns:
+        dict: Lists of keys under "new", "changed" and "removed", and the
+        number of "unchanged" records.
+    """
+    known = current.index.isin(previous.index)
+    both = current[known]
+    changed = both.index[both.values != previous.reindex(both.index).values]
+    removed = previous.index[~previous.index.isin(current.index)]
+    return {
+        "new": current.index[~known].tolist(),
+        "changed": changed.tolist(),
+        "removed": removed.tolist(),
+        "unchanged": int(len(both) - len(changed)),
+    }
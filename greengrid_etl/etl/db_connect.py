@@ -1,12 +1,123 @@
 # Import required modules and libraries
 from .logs import die
+import io
 import sqlalchemy as sql
 import geoalchemy2
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
+
+
+# Ways of writing a GeoDataFrame into a table (see DBController.insert_data)
+LOAD_METHODS = ("insert", "copy")
+# Bytes handed to COPY per read of the streamed CSV
+COPY_BUFFER_SIZE = 1024 * 1024
+# Connection pool of the engine each DBController keeps for its lifetime
+ENGINE_CONFIG = {
+    "pool_size": 5,          # connections kept open
+    "max_overflow": 5,       # extra connections opened under load, closed when returned
+    "pool_pre_ping": True,   # check a pooled connection before using it
+    "pool_recycle": 1800,    # seconds before a connection is replaced
+}
+
+
+# ------------------------------------
+# -------COPY Streaming Helpers-------
+
+def _csv_column(series: pd.Series) -> pd.Series:
+    """
+    Render one column in PostgreSQL CSV syntax.
+
+    Text is always quoted (so an empty string stays an empty string) and
+    missing values are left unquoted and empty, which COPY reads as NULL.
+    """
+    nulls = series.isna()
+    if pd.api.types.is_bool_dtype(series):
+        text = series.map({True: "t", False: "f"})
+    elif pd.api.types.is_numeric_dtype(series):
+        text = series.astype(str)
+    else:
+        text = '"' + series.astype(str).str.replace('"', '""', regex=False) + '"'
+    return text.mask(nulls, "")
+
+
+def csv_chunks(gdf: pd.DataFrame, chunksize: int):
+    """
+    Yield a (Geo)DataFrame as PostgreSQL CSV, `chunksize` rows at a time.
+
+    Each chunk is rendered column by column (no per-row Python code) and the
+    geometry, if any, is written as hex EWKB carrying the GeoDataFrame's SRID,
+    which PostGIS parses directly. Only one chunk is held in memory at a time.
+
+    Args:
+        gdf (pd.DataFrame): Data to render, columns in table order.
+        chunksize (int): Rows per yielded chunk.
+
+    Yields:
+        bytes: UTF-8 encoded CSV lines.
+    """
+    geometry, srid = None, 0
+    if isinstance(gdf, gpd.GeoDataFrame):
+        geometry = gdf.geometry.name
+        srid = gdf.crs.to_epsg() if gdf.crs is not None else 0
+    for start in range(0, len(gdf), chunksize):
+        chunk = gdf.iloc[start:start + chunksize]
+        columns = []
+        for name in gdf.columns:
+            if name == geometry:
+                geoms = shapely.set_srid(np.asarray(chunk.geometry.values), srid)
+                ewkb = pd.Series(shapely.to_wkb(geoms, hex=True, include_srid=True), index=chunk.index)
+                columns.append(ewkb.fillna(""))
+            else:
+                columns.append(_csv_column(chunk[name]))
+        lines = columns[0].str.cat(columns[1:], sep=",")
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class CopyStream(io.RawIOBase):
+    """
+    Read-only file object over an iterator of byte chunks.
+
+    Lets `COPY ... FROM STDIN` pull the CSV as it is produced, so the whole
+    file is never materialized in memory.
+    """
+
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(chunk)
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
 
 
 class DBController:
+    """
+    Database access for the ETL, through one pooled SQLAlchemy engine.
+
+    The engine (and its connection pool) is created on first use and shared
+    by every method, so repeated calls reuse open connections instead of
+    building a new pool each time. Call `close()`, or use the controller as
+    a context manager, to release the connections when done.
+
+    Example:
+        >>> with DBController(**config["database"]) as db:
+        ...     for chunk in db.select_iter("SELECT * FROM pa.trees", chunksize=50000):
+        ...         chunk.to_csv("trees.csv", mode="a", header=False)
+    """
+
     def __init__(self, host: str, port: str, database: str, username: str, password: str):
         self.host = host
         self.port = port
@@ -14,6 +125,26 @@ class DBController:
         self.username = username
         self.password = password
         self.uri = f"postgresql+psycopg2://{username}:{password}@{host}:{port}/{database}"
+        self._engine = None
+
+    @property
+    def engine(self) -> sql.engine.Engine:
+        """The controller's pooled engine, created on first use."""
+        if self._engine is None:
+            self._engine = sql.create_engine(self.uri, **ENGINE_CONFIG)
+        return self._engine
+
+    def close(self) -> None:
+        """Dispose of the engine, closing its pooled connections (a later call opens a new one)."""
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
     def select_data(self, query: str) -> pd.DataFrame:
         """
@@ -35,14 +166,47 @@ class DBController:
             
         """
         try:
-            con = sql.create_engine(self.uri)
-            df = pd.read_sql(query, con)
+            df = pd.read_sql(query, self.engine)
         except Exception as e:
             die(f"select_data: {e}")
         return df
 
-    
-    def insert_data(self, gdf: gpd.GeoDataFrame, schema: str, table: str, chunksize: int=100) -> None:
+
+    def select_iter(self, query: str, chunksize: int=10000, params: dict=None, geom_col: str=None):
+        """
+        Execute a SQL SELECT query and yield the results `chunksize` rows at a time.
+
+        The query runs on a server-side cursor, so only one chunk is held in
+        memory whatever the size of the result: exports and QA queries over
+        pa.trees run in constant memory.
+
+        Args:
+            query (str): The SQL SELECT query to execute (":name" placeholders).
+            chunksize (int): Rows per yielded DataFrame. Default is 10000.
+            params (dict, optional): Values of the query placeholders.
+            geom_col (str, optional): Geometry column; if given, GeoDataFrames are yielded.
+
+        Yields:
+            pd.DataFrame: The next chunk of rows (gpd.GeoDataFrame with `geom_col`).
+
+        Raises:
+            SystemExit: If the query execution fails, the function calls `die()` with the error message.
+        """
+        try:
+            with self.engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as con:
+                if geom_col:
+                    chunks = gpd.read_postgis(sql.text(query), con, geom_col=geom_col, params=params,
+                                              chunksize=chunksize)
+                else:
+                    chunks = pd.read_sql(sql.text(query), con, params=params, chunksize=chunksize)
+                for chunk in chunks:
+                    yield chunk
+        except Exception as e:
+            die(f"select_iter: {e}")
+
+
+    def insert_data(self, gdf: gpd.GeoDataFrame, schema: str, table: str, chunksize: int=100,
+                    method: str="insert", triggers: bool=True) -> None:
         """
         Insert a GeoDataFrame into a PostGIS table, truncating the table beforehand.
 
@@ -55,24 +219,217 @@ class DBController:
             schema (str): The database schema where the table resides.
             table (str): The name of the target table.
             chunksize (int): Number of rows to insert per batch. Default is 100.
+            method (str): "insert" writes batches of INSERT statements through
+                `to_postgis`; "copy" streams the rows with `COPY ... FROM STDIN`
+                (CSV, hex EWKB geometry), which is several times faster.
+                The GeoDataFrame columns must then match the table columns by name.
+            triggers (bool): If False, the table's user triggers are disabled for
+                the duration of the load (within its transaction) and the caller
+                takes care of what they would have done, e.g. with `merge_staged_trees`.
 
         Raises:
             Exception: If any database operation fails, the transaction is rolled back
         and the exception is raised.
         
         """
+        if method not in LOAD_METHODS:
+            die(f"insert_data: unknown method '{method}', use one of {LOAD_METHODS}")
+        if method == "copy":
+            self.copy_data(gdf, schema, table, chunksize=chunksize, triggers=triggers)
+            return
         try:
-            engine = sql.create_engine(self.uri)
-            with engine.connect() as con:
+            with self.engine.connect() as con:
                 tran = con.begin()
                 con.execute(sql.text(f"TRUNCATE TABLE {schema}.{table} CASCADE;")) # Clears table without dropping it. Keeps the trigger alive
+                if not triggers:
+                    con.execute(sql.text(f"ALTER TABLE {schema}.{table} DISABLE TRIGGER USER;"))
                 gdf.to_postgis(
                     name=table, schema=schema,
                     con=con, if_exists="append", index=False,
                     chunksize=chunksize
                 )
+                if not triggers:
+                    con.execute(sql.text(f"ALTER TABLE {schema}.{table} ENABLE TRIGGER USER;"))
                 tran.commit()
         except Exception as e:
             if 'tran' in locals():
                 tran.rollback()
             die(f"{e}")
+
+
+    def copy_data(self, gdf: pd.DataFrame, schema: str, table: str, chunksize: int=10000,
+                  triggers: bool=True) -> None:
+        """
+        Replace the contents of a PostGIS table with a GeoDataFrame using COPY.
+
+        The table is truncated and refilled in one transaction. The rows are
+        rendered as CSV `chunksize` at a time and streamed to
+        `COPY ... FROM STDIN`, so memory use is bounded by one chunk and the
+        server parses the rows without per-statement overhead. Table triggers
+        fire for every row unless `triggers` is False.
+
+        Args:
+            gdf (pd.DataFrame): The (Geo)DataFrame to load; its columns must be table columns.
+            schema (str): The database schema where the table resides.
+            table (str): The name of the target table.
+            chunksize (int): Number of rows rendered per CSV chunk. Default is 10000.
+            triggers (bool): If False, the table's user triggers are disabled during the COPY.
+
+        Raises:
+            SystemExit: If the COPY fails, the transaction is rolled back and
+            the function calls `die()` with the error message.
+        """
+        columns = ", ".join(f'"{name}"' for name in gdf.columns)
+        statement = f"COPY {schema}.{table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+        try:
+            con = self.engine.raw_connection()
+            try:
+                with con.cursor() as cur:
+                    cur.execute(f"TRUNCATE TABLE {schema}.{table} CASCADE;") # Clears table without dropping it. Keeps the trigger alive
+                    if not triggers:
+                        cur.execute(f"ALTER TABLE {schema}.{table} DISABLE TRIGGER USER;")
+                    cur.copy_expert(statement, CopyStream(csv_chunks(gdf, chunksize)), size=COPY_BUFFER_SIZE)
+                    if not triggers:
+                        cur.execute(f"ALTER TABLE {schema}.{table} ENABLE TRIGGER USER;")
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            finally:
+                con.close()
+        except Exception as e:
+            die(f"copy_data: {e}")
+
+
+    def merge_staged_trees(self, remove_missing: bool=False) -> dict:
+        """
+        Merge the staged trees (sa.trees) into production (pa.trees) in one statement.
+
+        Runs `pa.merge_staged_trees()`: new trees are inserted, and existing
+        ones are updated only when pap, manutencao, ocupacao or freguesia
+        changed (the only columns the merge writes to existing trees).
+        Production trees absent from the staged data are counted and, with
+        `remove_missing`, deleted.
+
+        Args:
+            remove_missing (bool): Delete production trees missing from the source.
+
+        Returns:
+            dict: Row counts "inserted", "updated", "missing" and "removed".
+
+        Raises:
+            SystemExit: If the merge fails, the function calls `die()` with the error message.
+        """
+        try:
+            with self.engine.begin() as con:
+                result = con.execute(sql.text("SELECT * FROM pa.merge_staged_trees(:remove_missing)"),
+                                     {"remove_missing": remove_missing})
+                return dict(result.mappings().one())
+        except Exception as e:
+            die(f"merge_staged_trees: {e}")
+
+
+    def merge_staged_parishes(self, source: str, sha256: str) -> dict:
+        """
+        Merge the staged parish boundaries (sa.parish) into production (pa.parish).
+
+        Runs `pa.merge_staged_parishes()`, which upserts the parishes by id
+        (keeping the table, its keys and its GIST index) and removes those no
+        longer staged, and records the digest of the loaded file in
+        sa.static_fingerprints, all in one transaction.
+
+        Args:
+            source (str): Name the file is recorded under (e.g. "parish").
+            sha256 (str): Digest of the loaded file.
+
+        Returns:
+            dict: Row counts "inserted", "updated" and "removed".
+
+        Raises:
+            SystemExit: If the merge fails, the function calls `die()` with the error message.
+        """
+        try:
+            with self.engine.begin() as con:
+                merged = dict(con.execute(sql.text("SELECT * FROM pa.merge_staged_parishes()")).mappings().one())
+                con.execute(sql.text("""
+                    INSERT INTO sa.static_fingerprints (source, sha256, loaded_at)
+                    VALUES (:source, :sha256, CURRENT_TIMESTAMP)
+                    ON CONFLICT (source) DO UPDATE
+                        SET sha256 = EXCLUDED.sha256, loaded_at = EXCLUDED.loaded_at
+                """), {"source": source, "sha256": sha256})
+                return merged
+        except Exception as e:
+            die(f"merge_staged_parishes: {e}")
+
+
+    def delete_rows(self, schema: str, table: str, key: str, values: list) -> int:
+        """
+        Delete the rows of a table whose `key` column is in `values`, in one statement.
+
+        Args:
+            schema (str): The database schema where the table resides.
+            table (str): The name of the table.
+            key (str): The column matched against `values`.
+            values (list): Keys of the rows to delete.
+
+        Returns:
+            int: Number of rows deleted.
+
+        Raises:
+            SystemExit: If the delete fails, the function calls `die()` with the error message.
+        """
+        if not values:
+            return 0
+        try:
+            with self.engine.begin() as con:
+                result = con.execute(sql.text(f"DELETE FROM {schema}.{table} WHERE {key} = ANY(:values)"),
+                                     {"values": list(values)})
+                return result.rowcount
+        except Exception as e:
+            die(f"delete_rows: {e}")
+
+
+    def bump_generation(self, table: str) -> None:
+        """
+        Increment the generation counter of a production table in pa.data_version.
+
+        The API compares this counter with the one its cached responses and
+        vector tiles were built from, so bumping it after a load makes every
+        API process serve fresh data.
+
+        Args:
+            table (str): Name of the production table that changed (e.g. "trees").
+
+        Raises:
+            SystemExit: If the update fails, the function calls `die()` with the error message.
+        """
+        try:
+            with self.engine.begin() as con:
+                con.execute(sql.text("""
+                    INSERT INTO pa.data_version (table_name, generation, updated_at)
+                    VALUES (:table, 1, CURRENT_TIMESTAMP)
+                    ON CONFLICT (table_name) DO UPDATE
+                        SET generation = pa.data_version.generation + 1,
+                            updated_at = CURRENT_TIMESTAMP
+                """), {"table": table})
+        except Exception as e:
+            die(f"bump_generation: {e}")
+
+
+    def execute(self, statement: str) -> None:
+        """
+        Execute a SQL statement that returns no rows, in its own transaction.
+
+        Used for post-load maintenance such as rebuilding derived tables.
+
+        Args:
+            statement (str): The SQL statement to execute.
+
+        Raises:
+            SystemExit: If the statement fails, the function calls `die()` with the error message.
+        """
+        try:
+            with self.engine.begin() as con:
+                con.execute(sql.text(statement))
+        except Exception as e:
+            die(f"execute: {e}")
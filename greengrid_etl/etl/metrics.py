@@ -0,0 +1,227 @@
+# Import required modules and libraries
+from .logs import info
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# Counters a step can report, besides its timings and memory
+COUNTERS = ("rows_in", "rows_out", "bytes_read", "bytes_written")
+# Prometheus gauges written to the textfile: (record field, metric name, help)
+GAUGES = [
+    ("wall_s", "wall_seconds", "Wall-clock time of the step"),
+    ("cpu_s", "cpu_seconds", "CPU time (user and system) of the step"),
+    ("rows_in", "rows_in", "Rows read by the step"),
+    ("rows_out", "rows_out", "Rows written by the step"),
+    ("rows_per_s", "rows_per_second", "Rows written per second of wall-clock time"),
+    ("bytes_read", "bytes_read", "Bytes read by the step"),
+    ("bytes_written", "bytes_written", "Bytes written by the step"),
+    ("peak_rss_bytes", "peak_rss_bytes", "Peak resident memory of the process during the step"),
+    ("calls", "calls", "Times the step ran (streamed steps run once per batch)"),
+]
+PROMETHEUS_PREFIX = "greengrid_etl_step"
+
+
+# ------------------------------------
+# -----------Peak Memory--------------
+
+def _peak_rss() -> int:
+    """Peak resident memory of the process in bytes (since the last `_reset_peak_rss`, on Linux)."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:   # Windows
+        return 0
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS, and cannot be reset
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _reset_peak_rss() -> None:
+    """Reset the peak resident memory to the current one, where the kernel allows it (Linux >= 4.0)."""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+# ------------------------------------
+# ----------Metrics Collector---------
+
+class Metrics:
+    """
+    Collect the timings, row and byte counts and peak memory of the ETL steps of a run.
+
+    A step is a pipeline stage ("load") or a sub-step of one ("load", "merge").
+    Running the same step again, as the streaming transformation does once
+    per batch, adds to its record instead of creating a new one. The records
+    are appended to a JSON lines file, one line per step and run, and/or
+    written as a Prometheus textfile for node_exporter's textfile collector.
+
+    Steps are measured on the calling thread; nested steps are allowed, and a
+    stage's peak memory includes the peaks of its sub-steps.
+    """
+
+    def __init__(self):
+        self.run = datetime.now().isoformat(timespec="seconds")
+        self.records = {}
+        self._stack = []
+
+    def record(self, stage: str, name: str="total") -> dict:
+        """The record of a step, created empty if the step has not run yet."""
+        key = (stage, name)
+        if key not in self.records:
+            self.records[key] = {"run": self.run, "stage": stage, "step": name,
+                                 "started": datetime.now().isoformat(timespec="seconds"),
+                                 "status": "ok", "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_bytes": 0,
+                                 **{counter: None for counter in COUNTERS}}
+        return self.records[key]
+
+    @contextmanager
+    def step(self, stage: str, name: str="total"):
+        """
+        Measure a step.
+
+        Yields:
+            dict: The step's record; set or add to its "rows_in", "rows_out",
+            "bytes_read" and "bytes_written" with `count`, or set its "status".
+        """
+        record = self.record(stage, name)
+        if self._stack:
+            # Keep the parent's peak before the kernel counter is reset for this step
+            self._stack[-1]["peak_rss_bytes"] = max(self._stack[-1]["peak_rss_bytes"], _peak_rss())
+        _reset_peak_rss()
+        self._stack.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except SystemExit as err:
+            # die() exits with 1 and done() with 0
+            if err.code not in (None, 0):
+                record["status"] = "failed"
+            raise
+        except BaseException:
+            record["status"] = "failed"
+            raise
+        finally:
+            record["calls"] += 1
+            record["wall_s"] += time.perf_counter() - wall
+            record["cpu_s"] += time.process_time() - cpu
+            record["peak_rss_bytes"] = max(record["peak_rss_bytes"], _peak_rss())
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["peak_rss_bytes"] = max(self._stack[-1]["peak_rss_bytes"], record["peak_rss_bytes"])
+            else:
+                info(f"METRICS: {stage.upper()} {record['wall_s']:.3f}s WALL, {record['cpu_s']:.3f}s CPU, "
+                     f"PEAK RSS {record['peak_rss_bytes'] / 2**20:.0f} MB")
+
+    def iterate(self, iterable, stage: str, name: str):
+        """
+        Measure the production of each item of `iterable` as one call of a step.
+
+        The length of every item (a batch) is added to the step's "rows_out".
+        """
+        items = iter(iterable)
+        while True:
+            with self.step(stage, name) as record:
+                item = next(items, None)
+                if item is not None:
+                    count(record, rows_out=len(item))
+            if item is None:
+                return
+            yield item
+
+    def skipped(self, stage: str) -> None:
+        """Record a stage the pipeline skipped because its inputs did not change."""
+        self.record(stage, "total")["status"] = "skipped"
+
+    def results(self) -> list:
+        """The records of the run, with the rows per second of each step."""
+        results = []
+        for record in self.records.values():
+            rows_per_s = record["rows_out"] / record["wall_s"] if record["rows_out"] and record["wall_s"] else None
+            results.append({**record, "wall_s": round(record["wall_s"], 6), "cpu_s": round(record["cpu_s"], 6),
+                            "rows_per_s": round(rows_per_s, 1) if rows_per_s else None})
+        return results
+
+    def write_jsonl(self, fname: str) -> None:
+        """Append one JSON line per step of the run to `fname`."""
+        os.makedirs(os.path.dirname(fname) or ".", exist_ok=True)
+        with open(fname, "a", encoding="utf-8") as f:
+            for record in self.results():
+                f.write(json.dumps(record) + "\n")
+
+    def write_prometheus(self, fname: str) -> None:
+        """
+        Write the steps of the run as Prometheus gauges, labelled by stage and step.
+
+        The file is written next to its destination and renamed into place,
+        so the textfile collector never reads a partial file.
+        """
+        results = self.results()
+        lines = []
+        for field, metric, help_text in GAUGES:
+            lines += [f"# HELP {PROMETHEUS_PREFIX}_{metric} {help_text}.",
+                      f"# TYPE {PROMETHEUS_PREFIX}_{metric} gauge"]
+            lines += [f'{PROMETHEUS_PREFIX}_{metric}{{stage="{r["stage"]}",step="{r["step"]}"}} {r[field]}'
+                      for r in results if r[field] is not None]
+        lines += [f"# HELP {PROMETHEUS_PREFIX}_success Whether the step succeeded (1), was skipped (1) or failed (0).",
+                  f"# TYPE {PROMETHEUS_PREFIX}_success gauge"]
+        lines += [f'{PROMETHEUS_PREFIX}_success{{stage="{r["stage"]}",step="{r["step"]}"}} {int(r["status"] != "failed")}'
+                  for r in results]
+        lines += ["# HELP greengrid_etl_last_run_timestamp_seconds Start of the last ETL run.",
+                  "# TYPE greengrid_etl_last_run_timestamp_seconds gauge",
+                  f"greengrid_etl_last_run_timestamp_seconds {datetime.fromisoformat(self.run).timestamp():.0f}"]
+        os.makedirs(os.path.dirname(fname) or ".", exist_ok=True)
+        with open(f"{fname}.part", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(f"{fname}.part", fname)
+
+    def write(self, settings: dict) -> None:
+        """
+        Write the run's metrics where the "metrics" configuration asks for.
+
+        Args:
+            settings (dict): "jsonl" and/or "prometheus" file paths; a missing
+            or empty path disables that output.
+        """
+        if settings.get("jsonl"):
+            self.write_jsonl(settings["jsonl"])
+        if settings.get("prometheus"):
+            self.write_prometheus(settings["prometheus"])
+
+
+def count(record: dict, **counters) -> None:
+    """Add to the counters ("rows_in", "rows_out", "bytes_read", "bytes_written") of a step record."""
+    for counter, value in counters.items():
+        if value is not None:
+            record[counter] = (record[counter] or 0) + int(value)
+
+
+def file_size(path: str) -> int:
+    """Size of a file in bytes, or None if it does not exist."""
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+# Collector shared by the pipeline stages of the current run
+run_metrics = Metrics()
+
+
+def step(stage: str, name: str="total"):
+    """Measure a step with the run's collector (see `Metrics.step`)."""
+    return run_metrics.step(stage, name)
+
+
+def iterate(iterable, stage: str, name: str):
+    """Measure each item of `iterable` with the run's collector (see `Metrics.iterate`)."""
+    return run_metrics.iterate(iterable, stage, name)
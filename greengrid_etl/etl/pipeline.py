@@ -0,0 +1,219 @@
+# Import required modules and libraries
+from .logs import die, info
+from .metrics import run_metrics
+import hashlib
+import json
+import os
+from datetime import datetime
+
+
+HASH_CHUNK = 1024 * 1024   # Bytes read per step when hashing a file
+
+
+# ------------------------------------
+# --------Fingerprint Functions-------
+
+def file_fingerprint(path: str, previous: dict=None) -> dict:
+    """
+    Fingerprint a file by its size, modification time and SHA-256 digest.
+
+    The digest is only recomputed when the size or modification time differ
+    from `previous`, so checking an untouched multi-gigabyte file is free.
+
+    Args:
+        path (str): File to fingerprint.
+        previous (dict, optional): Fingerprint recorded for the same path by an earlier run.
+
+    Returns:
+        dict: "size", "mtime_ns" and "sha256" of the file, or None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return previous
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+
+
+def config_fingerprint(config: dict, keys: list) -> str:
+    """
+    SHA-256 digest of the given configuration keys (missing keys count as None).
+
+    Only the digest is stored, so secrets such as the database password never reach the state file.
+    """
+    subset = {key: config.get(key) for key in keys}
+    return hashlib.sha256(json.dumps(subset, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def source_fingerprint(url: str) -> str:
+    """
+    Version of a remote source without downloading it.
+
+    ArcGIS FeatureServer layers report the date of their last data edit;
+    other URLs are asked for their ETag or Last-Modified header.
+
+    Returns:
+        str: The source version, or None if the server does not tell (the
+        extraction then always runs).
+    """
+    # Imported here so that runs without an extraction stage never load requests
+    import requests
+    from .arcgis import ArcGISExtractor
+    try:
+        if "/FeatureServer/" in url:
+            return ArcGISExtractor(url).version()
+        r = requests.head(url, allow_redirects=True, timeout=30)
+        r.raise_for_status()
+        return r.headers.get("ETag") or r.headers.get("Last-Modified")
+    except (requests.RequestException, ValueError, RuntimeError) as err:
+        info(f"PIPELINE: SOURCE VERSION UNAVAILABLE ({err})")
+        return None
+
+
+def _sha256(fingerprint: dict) -> str:
+    return fingerprint["sha256"] if fingerprint else None
+
+
+def _contents(inputs: dict) -> dict:
+    """Input fingerprints reduced to what matters: file contents, not their modification times."""
+    return {**inputs, "files": {path: _sha256(fp) for path, fp in inputs.get("files", {}).items()}}
+
+
+# ------------------------------------
+# ---------Stage-Aware Runner---------
+
+class Stage:
+    """
+    One step of the pipeline and what it depends on.
+
+    Args:
+        name (str): Stage name, as given on the command line.
+        run (Callable[[dict], None]): Runs the stage with the configuration.
+        config_keys (list[str]): Configuration keys the stage's result depends on.
+        inputs (Callable[[dict], list[str]]): Files the stage reads.
+        outputs (Callable[[dict], list[str]]): Files the stage writes.
+        source (Callable[[dict], str]): Remote URL the stage reads, if any.
+    """
+
+    def __init__(self, name: str, run, config_keys: list=(), inputs=None, outputs=None, source=None):
+        self.name = name
+        self.run = run
+        self.config_keys = list(config_keys)
+        self.inputs = inputs or (lambda config: [])
+        self.outputs = outputs or (lambda config: [])
+        self.source = source
+
+
+class Pipeline:
+    """
+    Run a sequence of stages, skipping those whose inputs did not change.
+
+    Before a stage runs, its inputs are fingerprinted: the configuration
+    keys it depends on, the files it reads and, for a remote source, the
+    version reported by the server. If they match the fingerprints recorded
+    by its last successful run and its output files are still the ones it
+    wrote, the stage is skipped. After a stage succeeds, its input and output
+    fingerprints are recorded in `state_file`.
+
+    Stages run in the order given; each stage's outputs are the next ones'
+    inputs, so re-running an upstream stage that produces a new file makes
+    the downstream stages run again, while a byte-identical file does not.
+
+    Args:
+        stages (list[Stage]): Stages in execution order.
+        state_file (str): JSON file keeping the fingerprints between runs.
+    """
+
+    def __init__(self, stages: list, state_file: str):
+        self.stages = stages
+        self.state_file = state_file
+        self.state = {}
+        if os.path.exists(state_file):
+            with open(state_file, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def names(self) -> list:
+        return [stage.name for stage in self.stages]
+
+    def select(self, names: list=None, start: str=None, until: str=None) -> list:
+        """
+        Stages to run: the ones named in `names` (default: all), limited to
+        those from `start` to `until` inclusive, in pipeline order.
+
+        Raises:
+            ValueError: If a stage name is unknown.
+        """
+        known = self.names()
+        for name in (names or []) + [n for n in (start, until) if n]:
+            if name not in known:
+                raise ValueError(f"Unknown stage '{name}' (expected one of {known})")
+        first = known.index(start) if start else 0
+        last = known.index(until) if until else len(known) - 1
+        return [stage for i, stage in enumerate(self.stages)
+                if first <= i <= last and (not names or stage.name in names)]
+
+    def fingerprint(self, stage: Stage, config: dict) -> dict:
+        """Current fingerprints of a stage's inputs."""
+        recorded = self.state.get(stage.name, {}).get("inputs", {}).get("files", {})
+        fingerprints = {
+            "config": config_fingerprint(config, stage.config_keys),
+            "files": {path: file_fingerprint(path, recorded.get(path)) for path in stage.inputs(config)},
+        }
+        if stage.source:
+            fingerprints["source"] = source_fingerprint(stage.source(config))
+        return fingerprints
+
+    def is_fresh(self, stage: Stage, config: dict, inputs: dict) -> bool:
+        """True if the stage already ran on these inputs and its outputs are untouched."""
+        recorded = self.state.get(stage.name)
+        if not recorded or _contents(recorded["inputs"]) != _contents(inputs):
+            return False
+        if "source" in inputs and inputs["source"] is None:
+            return False
+        for path in stage.outputs(config):
+            written = recorded.get("outputs", {}).get(path)
+            if written is None or _sha256(file_fingerprint(path, written)) != written["sha256"]:
+                return False
+        return True
+
+    def record(self, stage: Stage, config: dict, inputs: dict) -> None:
+        """Store the fingerprints of a successful run of the stage."""
+        self.state[stage.name] = {
+            "inputs": inputs,
+            "outputs": {path: file_fingerprint(path) for path in stage.outputs(config)},
+            "finished": datetime.now().isoformat(timespec="seconds"),
+        }
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        with open(f"{self.state_file}.part", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(f"{self.state_file}.part", self.state_file)
+
+    def run(self, config: dict, names: list=None, start: str=None, until: str=None, force: bool=False) -> None:
+        """
+        Run the selected stages, skipping the fresh ones unless `force` is set.
+
+        Each stage is measured as the "total" step of its name in `run_metrics`.
+
+        Raises:
+            SystemExit: If the stage selection is invalid, `die()` is called;
+            a failing stage exits through its own error handling, leaving its
+            fingerprints unrecorded so it runs again next time.
+        """
+        try:
+            stages = self.select(names, start, until)
+        except ValueError as err:
+            die(f"PIPELINE: {err}")
+        info(f"PIPELINE: STAGES {', '.join(stage.name for stage in stages) or 'NONE'}")
+        for stage in stages:
+            inputs = self.fingerprint(stage, config)
+            if not force and self.is_fresh(stage, config, inputs):
+                info(f"PIPELINE: SKIPPING {stage.name.upper()} (INPUTS UNCHANGED)")
+                run_metrics.skipped(stage.name)
+                continue
+            with run_metrics.step(stage.name):
+                stage.run(config)
+            self.record(stage, config, inputs)
@@ -1,8 +1,9 @@
 # Import required packages and libraries
 import etl as e
 import argparse
+import json
+import os
 import time
-import pandas as pd
 import sys
 from datetime import datetime
 
@@ -14,16 +15,44 @@ DOWNLOAD_DIR = "data/original"  # For reproducibility replace with correct direc
 PROCESSED_DIR = "data/processed"  # For reproducibility replace with correct directory path
 STATIC_DIR = "data/static"   # For reproducibility replace with correct directory path
 TARGET_SRID = 4326    # For reproducibility replace with desired EPSG code.
+FINGERPRINT_TABLE = "tree_fingerprints"   # Content hashes of the last load, in DB_SCHEMA
+# Columns pa.merge_staged_trees() updates on existing trees (greengrid_db/05); only they are fingerprinted,
+# so a tree counts as changed exactly when the merge would write it
+MERGED_COLUMNS = ["pap", "manutencao", "ocupacao", "freguesia"]
+DELTA_REPORT = "delta_report.json"        # Written to PROCESSED_DIR at the end of every load
+PARISH_SHAPEFILE = f"{STATIC_DIR}/lisbon_parishes.shp"   # Parish boundaries
+PARISH_CACHE = f"{PROCESSED_DIR}/lisbon_parishes.parquet"   # Parish boundaries reprojected to TARGET_SRID
+STATE_FILE = "data/pipeline_state.json"   # Fingerprints of the last successful run of each stage
+STAGE_NAMES = ["extraction", "transformation", "load", "post_load"]
+# Words replacing empty ("") and missing (NaN) values of descriptive columns
+EMPTY_WORDS = {"manutencao": "Não identificada", "local": "Não identificado", "tipologia": "Não identificada"}
+MISSING_WORDS = {"ocupacao": "Não identificada", "local": "Não identificado", "tipologia": "Não identificada",
+                 "nome_vulga": "Não identificado"}
+# Materialized views in the pa schema behind the API's /stats and /parishes endpoints
+STATS_VIEWS = [
+    "stats_trees_by_freguesia",
+    "stats_trees_by_species",
+    "stats_trees_by_tipologia",
+    "stats_trees_by_manutencao",
+    "stats_pap_distribution",
+    "parish_choropleth",
+]
 
 
 def extraction(config: dict) -> None:
     """
     Download raw data in GEOJSON from an API into the .data/original directory.
 
+    ArcGIS FeatureServer queries are downloaded page by page, several pages
+    at a time, and stitched into one file; an interrupted download resumes
+    from the pages already on disk. Any other URL is streamed as is.
+
     Args:
         config (dict): Dictionary containing:
             - "url" (str): Source API.
             - "fname" (str): Output filename.
+            - "extraction" (dict, optional): "page_size", "workers" and
+              "retries" of the ArcGIS download.
 
     Raises:
         KeyError: If required configuration keys are missing.
@@ -34,45 +63,68 @@ def extraction(config: dict) -> None:
     fname = config["fname"]
     fname = f"{DOWNLOAD_DIR}/{fname}"
     e.info("EXTRACTION: DOWNLOADING DATA")
-    e.download_data(url, fname)
+    with e.step("extraction", "download") as metrics:
+        if "/FeatureServer/" in url:
+            count = e.download_arcgis(url, fname, **config.get("extraction", {}))
+            e.info(f"EXTRACTION: {count} FEATURES DOWNLOADED")
+            e.count(metrics, rows_out=count)
+        else:
+            e.download_data(url, fname)
+        e.count(metrics, bytes_written=e.file_size(fname))
     e.info("EXTRACTION: COMPLETED")
 
 
-def transformation(config: dict) -> None:
+def processed_path(config: dict) -> str:
     """
-    Execute the transformation stage of the ETL pipeline.
+    Path of the processed dataset handed from the transformation to the load stage.
 
-    This function performs data cleaning, normalization, schema alignment,
-    CRS validation, and prepares a GeoDataFrame for database loading.
-    The transformed dataset is written to the ./data/processed directory
-    as a GeoJSON file.
+    It is named after the downloaded file, with the extension of the
+    configured "processed_format": GeoParquet ("parquet", default) keeps the
+    column dtypes and is much smaller and faster to read than GeoJSON ("geojson").
 
     Args:
         config : dict
-            Configuration dictionary containing:
-            - "fname" (str): Name of the GeoJSON file to process.
-            - "columns" (list[str]): Ordered list of columns to retain
-              in the transformed dataset.
+            Configuration dictionary containing "fname" and optionally "processed_format".
 
     Returns:
-        None
-            The function writes the transformed GeoDataFrame to disk and
-            does not return a value.
+        str
+            The processed dataset path, e.g. "data/processed/trees.parquet".
+    """
+    stem = os.path.splitext(config["fname"])[0]
+    fmt = config.get("processed_format", "parquet")
+    return f"{PROCESSED_DIR}/{stem}.{fmt}"
 
-    Raises:
-        KeyError: If required keys ("fname", "columns") are missing from config.
-        FileNotFoundError: If the specified input file does not exist.
-        ValueError: If CRS transformation fails or required columns are missing.
+
+def transform_batch(gdf, columns: list, parishes=None, freguesia_mode: str="assign"):
     """
-    
-    e.info("TRANSFORMATION: START TRANSFORMATION")
-    e.info("TRANSFORMATION: READING DATA")
-    fname = config["fname"]
-    # Read the GEOJSON file into a Geodatabase
-    gdf = e.read_geojson(f"{DOWNLOAD_DIR}/{fname}")
-    e.info("TRANSFORMATION: DATA READING COMPLETED")
+    Clean a batch of raw tree records and align it with the database model.
 
-    e.info("TRANSFORMATION: START DATA CLEANING")
+    Normalizes the column names, ensures the CRS is EPSG:4326, renames and
+    selects the configured columns, replaces empty and missing values with
+    a better word and converts "pap" to numeric. Only the selected columns
+    are touched, and each rule is applied in one vectorized pass, so the
+    same function serves a whole dataset and a single batch of it.
+    Given the parish boundaries, it also assigns (or validates) each tree's
+    freguesia with a point-in-polygon join.
+
+    Args:
+        gdf : gpd.GeoDataFrame
+            Raw records, as read from the downloaded GeoJSON.
+        columns : list[str]
+            Ordered list of columns to retain.
+        parishes : e.ParishIndex, optional
+            Parish boundaries; without them the source freguesia is kept as is.
+        freguesia_mode : str, optional
+            "assign" (default) or "validate", see `e.assign_freguesia`.
+
+    Returns:
+        gpd.GeoDataFrame
+            The transformed records.
+
+    Raises:
+        KeyError: If a configured column is missing from the records.
+        ValueError: If CRS transformation fails.
+    """
     # Normalize column names for postgresql database
     gdf.columns = [e.normalize_column_name(col) for col in gdf.columns]
 
@@ -81,23 +133,9 @@ def transformation(config: dict) -> None:
         e.info("CRS not defined. Setting to EPSG:4326.")
         gdf.set_crs(epsg=TARGET_SRID, inplace=True)
 
-    if gdf.crs.to_epsg() != 4326:
-        e.info("Reprojecting to EPSG:%s.", 4326)
-        gdf = gdf.to_crs(epsg=4326)
-
-    # For specific columns, Replace empty records with a better word
-    gdf["manutencao"]= gdf["manutencao"].replace("", "Não identificada")
-    gdf["local"]= gdf["local"].replace("", "Não identificado")
-    gdf["tipologia"]= gdf["tipologia"].replace("", "Não identificada")
-
-    # Fill NaN with better word
-    gdf["ocupacao"]= gdf["ocupacao"].fillna("Não identificada")
-    gdf["local"]= gdf["local"].fillna("Não identificado")
-    gdf["tipologia"]= gdf["tipologia"].fillna("Não identificada")
-    gdf["nome_vulga"]= gdf["nome_vulga"].fillna("Não identificado")
-
-    # Convert "pap" column to numeric
-    gdf["pap"] = (pd.to_numeric(gdf["pap"], errors="coerce"))
+    if gdf.crs.to_epsg() != TARGET_SRID:
+        e.info(f"Reprojecting to EPSG:{TARGET_SRID}.")
+        gdf = gdf.to_crs(epsg=TARGET_SRID)
 
     # Rename columns to match the database model
     gdf= gdf.rename(
@@ -109,38 +147,171 @@ def transformation(config: dict) -> None:
         }
     )
     # Ensure the geometry is taken from the geometry column
-    gdf.set_geometry("geometry", inplace=True)
+    gdf = gdf.set_geometry("geometry")
+
+    # Keep only the desired columns before cleaning them
+    gdf = gdf[columns].copy()
 
+    # For specific columns, Replace empty records with a better word
+    empty = {col: {"": word} for col, word in EMPTY_WORDS.items() if col in gdf.columns}
+    # Fill NaN with better word
+    missing = {col: word for col, word in MISSING_WORDS.items() if col in gdf.columns}
+    gdf[list(empty)] = gdf[list(empty)].replace(empty)
+    gdf[list(missing)] = gdf[list(missing)].fillna(missing)
+
+    # Convert "pap" column to numeric
+    if "pap" in gdf.columns:
+        import pandas as pd   # Only the transformation needs pandas; keeps the CLI startup light
+        gdf["pap"] = pd.to_numeric(gdf["pap"], errors="coerce")
+
+    # Take the parish from where the tree stands, so parish-level queries match the boundaries
+    if parishes is not None and "freguesia" in gdf.columns:
+        gdf, differs, outside = e.assign_freguesia(gdf, parishes, mode=freguesia_mode)
+        if differs or outside:
+            action = "REASSIGNED" if freguesia_mode == "assign" else "WITH ANOTHER SPATIAL PARISH"
+            e.info(f"TRANSFORMATION: {differs} TREES {action}, {outside} OUTSIDE EVERY PARISH")
+    return gdf
+
+
+def transformation(config: dict, mode: str="streaming", batch_size: int=50000) -> None:
+    """
+    Execute the transformation stage of the ETL pipeline.
+
+    This function performs data cleaning, normalization, schema alignment,
+    CRS validation, and prepares a GeoDataFrame for database loading.
+    The transformed dataset is written to the ./data/processed directory
+    as GeoParquet (default) or GeoJSON, see `processed_path`.
+
+    In streaming mode the raw GeoJSON is read in batches of `batch_size`
+    features, each batch goes through `transform_batch` and is appended to
+    the output file, so memory stays bounded by the batch size instead of
+    growing with the inventory. Full mode transforms the whole dataset at once.
+
+    Args:
+        config : dict
+            Configuration dictionary containing:
+            - "fname" (str): Name of the GeoJSON file to process.
+            - "columns" (list[str]): Ordered list of columns to retain
+              in the transformed dataset.
+            - "processed_format" (str, optional): "parquet" (default) or "geojson".
+            - "processed_compression" (str, optional): Parquet codec (default: "zstd").
+            - "freguesia_mode" (str, optional): "assign" (default) takes each
+              tree's parish from the boundaries, "validate" only reports
+              disagreements, "off" keeps the source parish unchecked.
+        mode : str, optional
+        "streaming" transforms the features batch by batch (default),
+        "full" reads the whole file into one GeoDataFrame.
+        batch_size : int, optional
+        Features per batch in streaming mode (default: 50000).
+
+    Returns:
+        None
+            The function writes the transformed GeoDataFrame to disk and
+            does not return a value.
+
+    Raises:
+        KeyError: If required keys ("fname", "columns") are missing from config.
+        FileNotFoundError: If the specified input file does not exist.
+        ValueError: If CRS transformation fails or required columns are missing.
+    """
+    
+    e.info("TRANSFORMATION: START TRANSFORMATION")
+    fname = config["fname"]
     # Obtain the desired columns from the configuration file
     cols = config["columns"]
-    gdf = gdf[cols] # Create a geodataframe using the desired columns
 
+    output = processed_path(config)
+    compression = config.get("processed_compression", "zstd")
+    freguesia_mode = config.get("freguesia_mode", "assign")
+    parishes = None
+    if freguesia_mode != "off":
+        with e.step("transformation", "parishes") as metrics:
+            boundaries = e.read_parishes(PARISH_SHAPEFILE, cache=PARISH_CACHE)
+            # One STRtree over the boundaries serves every batch
+            parishes = e.ParishIndex(boundaries)
+            e.count(metrics, rows_out=len(boundaries))
+
+    if mode == "streaming":
+        e.info(f"TRANSFORMATION: STREAMING DATA IN BATCHES OF {batch_size} FEATURES")
+        e.count(e.run_metrics.record("transformation", "read"), bytes_read=e.file_size(f"{DOWNLOAD_DIR}/{fname}"))
+        # The first batch creates the file, the next ones are appended to it
+        with e.DataWriter(output, compression=compression) as writer:
+            # Each step adds up over the batches
+            batches = e.read_geojson_batches(f"{DOWNLOAD_DIR}/{fname}", batch_size=batch_size)
+            for batch in e.iterate(batches, "transformation", "read"):
+                with e.step("transformation", "clean") as metrics:
+                    e.count(metrics, rows_in=len(batch))
+                    batch = transform_batch(batch, cols, parishes, freguesia_mode)
+                    e.count(metrics, rows_out=len(batch))
+                with e.step("transformation", "write") as metrics:
+                    writer.write(batch)
+                    e.count(metrics, rows_out=len(batch))
+                e.info(f"TRANSFORMATION: {writer.rows} FEATURES TRANSFORMED")
+        e.count(e.run_metrics.record("transformation", "write"), bytes_written=e.file_size(output))
+        if not writer.rows:
+            e.die(f"TRANSFORMATION: NO FEATURES IN {DOWNLOAD_DIR}/{fname}")
+        e.info(f"TRANSFORMATION: SAVED {output}")
+        e.info("TRANSFORMATION: COMPLETED")
+        return
+
+    e.info("TRANSFORMATION: READING DATA")
+    with e.step("transformation", "read") as metrics:
+        # Read the GEOJSON file into a Geodatabase
+        gdf = e.read_geojson(f"{DOWNLOAD_DIR}/{fname}")
+        e.count(metrics, rows_out=len(gdf), bytes_read=e.file_size(f"{DOWNLOAD_DIR}/{fname}"))
+    e.info("TRANSFORMATION: DATA READING COMPLETED")
+
+    e.info("TRANSFORMATION: START DATA CLEANING")
+    with e.step("transformation", "clean") as metrics:
+        e.count(metrics, rows_in=len(gdf))
+        gdf = transform_batch(gdf, cols, parishes, freguesia_mode)
+        e.count(metrics, rows_out=len(gdf))
     e.info("TRANSFORMATION: DATA CLEANING COMPLETED")
     
     e.info("TRANSFORMATION: SAVING TRANSFORMED DATA")
 
-    # Write the Geodataframe into the .data/processed folder as a GEOJSON file
-    e.write_geojson(gdf, fname=f"{PROCESSED_DIR}/{fname}")
-    e.info("TRANSFORMATION: SAVED")
+    # Write the Geodataframe into the .data/processed folder (GeoParquet or GeoJSON)
+    with e.step("transformation", "write") as metrics:
+        e.write_data(gdf, fname=output, compression=compression)
+        e.count(metrics, rows_out=len(gdf), bytes_written=e.file_size(output))
+    e.info(f"TRANSFORMATION: SAVED {output}")
     e.info("TRANSFORMATION: COMPLETED")
 
 
-def load(config: dict, chunksize: int=1000) -> None:
+def load(config: dict, chunksize: int=1000, method: str="copy", mode: str="full") -> None:
     """
     Executes the load phase of the ETL pipeline.
     
-    This function reads the processed GeoJSON dataset and inserts it
-    into the configured PostGIS trees table in the database.
-    It also loads an auxiliary shapefile into the parish table in the database.
+    This function reads the configured columns of the processed dataset, stages it in the
+    sa.trees table and merges it into the production pa.trees table with a
+    single set-based statement (new trees are inserted, changed ones updated).
+    It also upserts the parish boundaries shapefile into the parish table in
+    the database, when the shapefile changed since the last load.
+
+    Every record is fingerprinted (content hash) and the fingerprints of a
+    successful load are stored in sa.tree_fingerprints. In incremental mode
+    only the trees whose fingerprint is new or changed are staged, and trees
+    that disappeared from the source are reported (and deleted if
+    "remove_missing_trees" is set); an unchanged source stages nothing.
+    The run ends with a delta report, logged and written to PROCESSED_DIR.
 
     Args:
         config : dict
             Configuration dictionary containing:
-            - "fname" (str): Processed filename.
+            - "fname" (str): Source filename (see `processed_path`).
+            - "columns" (list[str]): Columns read from the processed dataset.
+            - "processed_format" (str, optional): "parquet" (default) or "geojson".
             - "database" (dict): Database connection parameters
               (host, port, user, password, database).
+            - "remove_missing_trees" (bool, optional): Delete production
+              trees that are no longer in the source (default: False).
         chunksize : int, optional
         Number of rows inserted per batch (default: 1000).
+        method : str, optional
+        "copy" streams the rows with COPY FROM STDIN (default), "insert"
+        uses the chunked INSERTs of GeoDataFrame.to_postgis.
+        mode : str, optional
+        "full" stages every tree (default), "incremental" only new and changed ones.
 
     Returns:
         None
@@ -152,36 +323,140 @@ def load(config: dict, chunksize: int=1000) -> None:
         via the logging/exit handler.
     """
     try:
-        fname = config["fname"]
-        db = e.DBController(**config["database"])
-        e.info("LOAD: READING DATA")
-        gdf = e.read_geojson(f"{PROCESSED_DIR}/{fname}")
-        e.info("LOAD: DATA READ")
-        e.info("LOAD: INSERTING DATA INTO DATABASE")
-        # Insert data into the trees table in the database
-        db.insert_data(gdf, DB_SCHEMA, TABLE, chunksize=chunksize)
-        # Insert the shapefile into the parish table in the database
-        e.load_shapefile(fname=f"{STATIC_DIR}/lisbon_parishes.shp", config=config)
-        e.done("LOAD: DONE")
+        remove_missing = config.get("remove_missing_trees", False)
+        with e.DBController(**config["database"]) as db:
+            e.info("LOAD: READING DATA")
+            with e.step("load", "read") as metrics:
+                # Only the configured columns are read back from the processed dataset
+                gdf = e.read_data(processed_path(config), columns=config["columns"])
+                e.count(metrics, rows_out=len(gdf), bytes_read=e.file_size(processed_path(config)))
+            e.info("LOAD: DATA READ")
+            fingerprints = e.fingerprint(gdf, "tree_id", columns=MERGED_COLUMNS)
+            report = {"run": datetime.now().isoformat(timespec="seconds"), "mode": mode, "source_trees": len(gdf)}
+
+            if mode == "incremental":
+                e.info("LOAD: COMPARING FINGERPRINTS WITH THE LAST LOAD")
+                previous = db.select_data(f"SELECT tree_id, fingerprint FROM {DB_SCHEMA}.{FINGERPRINT_TABLE}")
+                delta = e.diff_fingerprints(fingerprints, previous.set_index("tree_id")["fingerprint"])
+                staged = gdf[gdf["tree_id"].isin(delta["new"] + delta["changed"])]
+                report.update(new=len(delta["new"]), changed=len(delta["changed"]),
+                              removed_from_source=len(delta["removed"]), unchanged=delta["unchanged"])
+            else:
+                delta = None
+                staged = gdf
+
+            changed = False
+            if len(staged):
+                e.info(f"LOAD: STAGING {len(staged)} TREES")
+                with e.step("load", "staging") as metrics:
+                    # Stage the data in the sa.trees table, without firing its per-row trigger
+                    db.insert_data(staged, DB_SCHEMA, TABLE, chunksize=chunksize, method=method, triggers=False)
+                    e.count(metrics, rows_in=len(staged), rows_out=len(staged))
+                e.info("LOAD: MERGING STAGED TREES INTO PRODUCTION")
+                with e.step("load", "merge") as metrics:
+                    # Staging only holds the delta in incremental mode, so it cannot tell which trees are missing
+                    merged = db.merge_staged_trees(remove_missing=remove_missing and delta is None)
+                    e.count(metrics, rows_in=len(staged),
+                            rows_out=merged["inserted"] + merged["updated"] + merged["removed"])
+                report.update(inserted=merged["inserted"], updated=merged["updated"], deleted=merged["removed"])
+                if delta is None:
+                    report["removed_from_source"] = merged["missing"]
+                changed = bool(merged["inserted"] or merged["updated"] or merged["removed"])
+            else:
+                e.info("LOAD: NO NEW OR CHANGED TREES")
+                report.update(inserted=0, updated=0, deleted=0)
+
+            if delta is not None:
+                if remove_missing and delta["removed"]:
+                    report["deleted"] = db.delete_rows("pa", TABLE, "tree_id", delta["removed"])
+                    changed = changed or report["deleted"] > 0
+                report["ids"] = {k: delta[k] for k in ("new", "changed", "removed")}
+
+            if delta is None or delta["new"] or delta["changed"] or delta["removed"]:
+                with e.step("load", "fingerprints") as metrics:
+                    # Remember what this load saw, for the next incremental run
+                    db.copy_data(fingerprints.rename_axis("tree_id").reset_index(), DB_SCHEMA, FINGERPRINT_TABLE)
+                    e.count(metrics, rows_out=len(fingerprints))
+            if changed:
+                # Tell the API that the production trees changed so it drops cached responses
+                db.bump_generation(TABLE)
+
+            e.info(f"LOAD: DELTA {report.get('new', '-')} NEW, {report.get('changed', '-')} CHANGED, "
+                   f"{report.get('unchanged', '-')} UNCHANGED, {report.get('removed_from_source', 0)} MISSING FROM SOURCE; "
+                   f"PRODUCTION {report['inserted']} INSERTED, {report['updated']} UPDATED, {report['deleted']} DELETED")
+            with open(f"{PROCESSED_DIR}/{DELTA_REPORT}", "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+            # Upsert the parish boundaries into the parish table, only if the shapefile changed
+            with e.step("load", "parishes"):
+                parishes_changed = e.load_shapefile(fname=PARISH_SHAPEFILE, config=config, cache=PARISH_CACHE, db=db)
+            if parishes_changed:
+                db.bump_generation("parish")
+        e.info("LOAD: DONE")
     except Exception as err:
         e.die(f"LOAD: {err}")
 
 
-def parse_args() -> str:
+def post_load(config: dict) -> None:
+    """
+    Executes the post-load phase of the ETL pipeline.
+
+    Rebuilds the data derived from the production trees table: the search
+    vocabulary behind the API's /search/suggest and the statistics
+    materialized views behind its /stats and /parishes endpoints (including
+    the parish choropleth and its simplified boundaries). The views are refreshed
+    CONCURRENTLY (each has a unique index), so the API keeps reading the
+    previous figures until the new ones are committed.
+
+    Args:
+        config : dict
+            Configuration dictionary containing:
+            - "database" (dict): Database connection parameters
+              (host, port, user, password, database).
+
+    Returns:
+        None
+
+    Raises
+        Exception: Any database error triggers termination
+        via the logging/exit handler.
+    """
+    try:
+        with e.DBController(**config["database"]) as db:
+            e.info("POST-LOAD: REFRESHING SEARCH VOCABULARY")
+            with e.step("post_load", "vocabulary"):
+                db.execute("SELECT pa.refresh_search_vocabulary();")
+            e.info("POST-LOAD: REFRESHING STATISTICS VIEWS")
+            for view in STATS_VIEWS:
+                with e.step("post_load", view):
+                    db.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY pa.{view};")
+            # Tell the API that the statistics changed so it drops cached /stats responses
+            db.bump_generation("stats")
+        e.info("POST-LOAD: DONE")
+    except Exception as err:
+        e.die(f"POST-LOAD: {err}")
+
+
+def parse_args() -> argparse.Namespace:
     """
     Parse command-line arguments for the Lisbon_GreenGrid application.
 
-    This function defines and parses CLI arguments using argparse and
-    returns the path to the configuration file provided by the user.
-    If no configuration file is specified, a default path is used.
+    This function defines and parses CLI arguments using argparse: the
+    configuration file (a default path is used if none is given) and the
+    stages to run. `--stages` picks stages by name, `--from`/`--until`
+    restrict the run to a range of the pipeline and `--force` runs the
+    selected stages even if their inputs did not change.
 
     Returns:
-        str: Path to the configuration file to be used by the application.
+        argparse.Namespace: The parsed arguments (config_file, stages, start, until, force).
     """
     parser = argparse.ArgumentParser(description="Runnning Lisbon_GreenGrid")
     parser.add_argument("--config_file", required=False, help="The configuration file", default="./config/00.yml")
-    args = parser.parse_args()
-    return args.config_file
+    parser.add_argument("--stages", nargs="+", choices=STAGE_NAMES, help="Stages to run (default: all)")
+    parser.add_argument("--from", dest="start", choices=STAGE_NAMES, help="First stage to run")
+    parser.add_argument("--until", choices=STAGE_NAMES, help="Last stage to run")
+    parser.add_argument("--force", action="store_true", help="Run the selected stages even if their inputs are unchanged")
+    return parser.parse_args()
 
 
 def time_this_function(func, **kwargs) -> str:
@@ -211,20 +486,76 @@ def time_this_function(func, **kwargs) -> str:
     return f"'{func.__name__}' EXECUTED IN {t1-t0:.3f} SECONDS"
 
 
-def main(config_file: str) -> None:
+def build_pipeline() -> e.Pipeline:
     """
-    Orchestrates the ETL pipeline: extraction, transformation, and loading of data.
+    Declare the ETL stages, in execution order, with the inputs each depends on.
 
-    This function serves as the entry point for the ETL process. It performs the following steps in order:
-    1. Reads configuration from the specified file.
-    2. Executes the data extraction step and logs execution time.
-    3. Executes the data transformation step and logs execution time.
-    4. Executes the data loading step (with configurable chunk size) and logs execution time.
+    - extraction: the source URL (its ETag, Last-Modified or ArcGIS edit date)
+      and the download settings; writes the raw GeoJSON.
+    - transformation: the raw GeoJSON, the parish shapefile and the cleaning
+      settings; writes the processed dataset.
+    - load: the processed dataset, the parish shapefile and the database
+      settings; writes the delta report.
+    - post_load: the delta report of the load.
 
-    Each ETL step is wrapped with `time_this_function` to measure execution duration and logged via the logger `e`.
+    Returns:
+        e.Pipeline
+            The pipeline, with its fingerprints kept in STATE_FILE.
+    """
+    raw = lambda config: [f"{DOWNLOAD_DIR}/{config['fname']}"]
+    processed = lambda config: [processed_path(config)]
+    report = lambda config: [f"{PROCESSED_DIR}/{DELTA_REPORT}"]
+    parishes = [f"{STATIC_DIR}/lisbon_parishes.{ext}" for ext in ("shp", "shx", "dbf", "prj")]
+
+    def run_transformation(config):
+        e.info(time_this_function(transformation, config=config, mode=config.get("transform_mode", "streaming"),
+                                  batch_size=config.get("transform_batch_size", 50000)))
+
+    def run_load(config):
+        e.info(time_this_function(load, config=config, chunksize=1000, method=config.get("load_method", "copy"),
+                                  mode=config.get("load_mode", "full")))
+
+    stages = [
+        e.Stage("extraction", lambda config: e.info(time_this_function(extraction, config=config)),
+                config_keys=["url", "fname", "extraction"], outputs=raw, source=lambda config: config["url"]),
+        e.Stage("transformation", run_transformation,
+                config_keys=["columns", "processed_format", "processed_compression", "freguesia_mode"],
+                inputs=lambda config: raw(config) + parishes, outputs=processed),
+        e.Stage("load", run_load,
+                config_keys=["database", "columns", "load_method", "load_mode", "remove_missing_trees"],
+                inputs=lambda config: processed(config) + parishes, outputs=report),
+        e.Stage("post_load", lambda config: e.info(time_this_function(post_load, config=config)),
+                config_keys=["database"], inputs=report),
+    ]
+    return e.Pipeline(stages, state_file=STATE_FILE)
+
+
+def main(config_file: str, stages: list=None, start: str=None, until: str=None, force: bool=False) -> None:
+    """
+    Orchestrates the ETL pipeline: extraction, transformation, loading and post-loading of data.
+
+    This function serves as the entry point for the ETL process. It reads the
+    configuration from the specified file and runs the stages declared in
+    `build_pipeline` in order:
+    1. Extraction of the raw data.
+    2. Transformation (streaming or full) into the processed dataset.
+    3. Loading (with configurable chunk size, method and mode).
+    4. Refresh of the search vocabulary and statistics views.
+
+    A stage is skipped when its inputs (files, configuration keys and source
+    version) are the same as on its last successful run, so iterating on the
+    load neither downloads nor transforms the dataset again. Each stage that
+    runs is wrapped with `time_this_function` and its duration logged via the logger `e`.
+    The wall and CPU time, rows, bytes and peak memory of every stage and
+    sub-step are then written where the "metrics" settings ask for (JSON
+    lines and/or a Prometheus textfile), whether the run succeeded or not.
 
     Args:
         config_file (str): Path to the configuration file used to parameterize the ETL pipeline.
+        stages (list[str], optional): Stages to run (default: all).
+        start (str, optional): First stage to run.
+        until (str, optional): Last stage to run.
+        force (bool, optional): Run the selected stages even if their inputs are unchanged.
 
     Returns:
         None
@@ -232,20 +563,16 @@ def main(config_file: str) -> None:
     Raises:
         FileNotFoundError: If the specified configuration file does not exist.
         ValueError: If configuration is invalid or missing required parameters.
-        Exception: Propagates exceptions raised by `extraction`, `transformation`, or `load` functions.
+        Exception: Propagates exceptions raised by `extraction`, `transformation`, `load` or `post_load` functions.
     """
     config = e.read_config(config_file)
-    # extraction(config)
-    msg = time_this_function(extraction, config=config)
-    e.info(msg)
-    # transformation(config)
-    msg = time_this_function(transformation, config=config)
-    e.info(msg)
-    # load(config, chunksize=10000)
-    msg = time_this_function(load, config=config, chunksize=1000)
-    e.info(msg)
+    try:
+        build_pipeline().run(config, names=stages, start=start, until=until, force=force)
+    finally:
+        # Written for failed runs too, so a regression or a failing stage shows in the trend
+        e.run_metrics.write(config.get("metrics", {}))
 
 
 if __name__ == "__main__":
-    config_file = parse_args()
-    main(config_file)
+    args = parse_args()
+    main(args.config_file, stages=args.stages, start=args.start, until=args.until, force=args.force)
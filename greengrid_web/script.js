@@ -41,47 +41,71 @@ const AllTrees = {
 L.control.layers(baseMaps, AllTrees).addTo(map);
 
 // --- 1.3. All Trees LOADING ---
-function loadAllTrees() {
-    fetch(`${API_BASE_URL}/trees`)
-        .then(response => response.json())
-        .then(data => {
-            treeLayer.clearLayers();
-
-            data.forEach(tree => {
-                // Parse geometry
-                const geom = JSON.parse(tree.geometry);
-                const lat = geom.coordinates[1];
-                const lon = geom.coordinates[0];
+// Trees are drawn from vector tiles (/tiles/{z}/{x}/{y}.mvt). At low zooms the
+// tiles carry aggregated clusters with a tree_count instead of individual trees,
+// and individual trees only carry a few attributes, so details are fetched on click.
+let tileVersion = Date.now();
+
+function treePopup(tree) {
+    return `
+        <div style="font-family: sans-serif;">
+            <h4 style="margin:0; color:#2d5a27;">${tree.nome_vulga}</h4>
+            <hr>
+            <b>ID:</b> ${tree.tree_id}<br>
+            <b>Common Name:</b> ${tree.nome_vulga}<br>
+            <b>Species:</b> <i>${tree.especie}</i><br>
+            <b>Typology:</b> ${tree.tipologia}<br>
+            <b>PAP:</b> ${tree.pap}<br>
+            <b>Authority:</b> ${tree.manutencao}<br>
+            <b>Occupation:</b> ${tree.ocupacao}<br>
+            <b>Local:</b> ${tree.local}<br>
+            <b>Address:</b> ${tree.morada}<br>
+            <b>Freguesia:</b> ${tree.freguesia}
+        </div>
+    `;
+}
 
-                const marker = L.circleMarker([lat, lon], {
-                    radius: 6,
-                    fillColor: "#2d5a27",
-                    color: "#ffffff",
-                    weight: 1,
-                    fillOpacity: 0.9
-                });
+function loadAllTrees() {
+    treeLayer.clearLayers();
+
+    // A new version after edits makes the browser skip tiles it cached earlier
+    const tiles = L.vectorGrid.protobuf(`${API_BASE_URL}/tiles/{z}/{x}/{y}.mvt?v=${tileVersion++}`, {
+        rendererFactory: L.canvas.tile,
+        interactive: true,
+        maxNativeZoom: 18,
+        vectorTileLayerStyles: {
+            trees: props => props.tree_count ? {
+                radius: Math.min(4 + Math.sqrt(props.tree_count), 18),
+                fill: true,
+                fillColor: "#2d5a27",
+                color: "#ffffff",
+                weight: 1,
+                fillOpacity: 0.7
+            } : {
+                radius: 6,
+                fill: true,
+                fillColor: "#2d5a27",
+                color: "#ffffff",
+                weight: 1,
+                fillOpacity: 0.9
+            }
+        }
+    });
 
-                marker.bindPopup(`
-                    <div style="font-family: sans-serif;">
-                        <h4 style="margin:0; color:#2d5a27;">${tree.nome_vulga}</h4>
-                        <hr>
-                        <b>ID:</b> ${tree.tree_id}<br>
-                        <b>Common Name:</b> ${tree.nome_vulga}<br>
-                        <b>Species:</b> <i>${tree.especie}</i><br>
-                        <b>Typology:</b> ${tree.tipologia}<br>
-                        <b>PAP:</b> ${tree.pap}<br>
-                        <b>Authority:</b> ${tree.manutencao}<br>
-                        <b>Occupation:</b> ${tree.ocupacao}<br>
-                        <b>Local:</b> ${tree.local}<br>
-                        <b>Address:</b> ${tree.morada}<br>
-                        <b>Freguesia:</b> ${tree.freguesia}
-                    </div>
-                `);
+    tiles.on('click', e => {
+        const props = e.layer.properties;
+        if (props.tree_count) {
+            // Clicking a cluster zooms into it
+            map.setView(e.latlng, Math.min(map.getZoom() + 2, 18));
+            return;
+        }
+        fetch(`${API_BASE_URL}/tree/${props.tree_id}`)
+            .then(response => response.json())
+            .then(tree => L.popup().setLatLng(e.latlng).setContent(treePopup(tree)).openOn(map))
+            .catch(err => console.error("Error loading tree details:", err));
+    });
 
-                marker.addTo(treeLayer);
-            });
-        })
-        .catch(err => console.error("Error loading trees:", err));
+    tiles.addTo(treeLayer);
 }
 
 loadAllTrees();
@@ -119,34 +143,46 @@ document.querySelectorAll(".nav-link").forEach(link => {
 // --- 3. SECTION HANDLERS ---
 // --- 3.1. SEARCH BY SPECIES OR FREGUESIA ---
 // --- 1. POPULATE BOTH RECOMMENDATIONS ON LOAD ---
-function setupRecommendations() {
-    fetch(`${API_BASE_URL}/trees`)
+// Suggestions come from the precomputed vocabulary behind /search/suggest,
+// so the datalists no longer need the full /trees download.
+function fillDatalist(datalistId, kind, query = "", limit = 1000) {
+    const params = new URLSearchParams({ kind: kind, q: query, limit: limit });
+    return fetch(`${API_BASE_URL}/search/suggest?${params}`)
         .then(res => res.json())
-        .then(data => {
-            // 1. Handle Species Recommendations
-            const speciesDatalist = document.getElementById('treeNamesList');
-            const uniqueSpecies = [...new Set(data.map(tree => tree.especie).filter(Boolean))];
-            
-            speciesDatalist.innerHTML = uniqueSpecies
-                .map(name => `<option value="${name}">`)
+        .then(suggestions => {
+            document.getElementById(datalistId).innerHTML = suggestions
+                .map(s => `<option value="${s.term}">${s.tree_count} trees</option>`)
                 .join('');
+        });
+}
 
-            // 2. Handle Freguesia Recommendations
-            const fregDatalist = document.getElementById('fregList');
-            // Extract unique Freguesia names
-            const uniqueFreg = [...new Set(data.map(tree => tree.freguesia).filter(Boolean))];
-            
-            fregDatalist.innerHTML = uniqueFreg
-                .map(name => `<option value="${name}">`)
-                .join('');
-                
-            console.log("Recommendations loaded for Species and Parishes!");
-        })
+function setupRecommendations() {
+    Promise.all([
+        // 1. Handle Species Recommendations
+        fillDatalist('treeNamesList', 'species'),
+        // 2. Handle Freguesia Recommendations
+        fillDatalist('fregList', 'parish')
+    ])
+        .then(() => console.log("Recommendations loaded for Species and Parishes!"))
         .catch(err => console.error("Could not load recommendations:", err));
 }
 // Call the function to populate both datalists on page load 
 setupRecommendations();
 
+// Refine the suggestions (ranked, typo-tolerant) while the user types
+function suggestWhileTyping(inputId, datalistId, kind) {
+    let timer;
+    document.getElementById(inputId).addEventListener('input', e => {
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            fillDatalist(datalistId, kind, e.target.value.trim(), 20)
+                .catch(err => console.error("Could not load suggestions:", err));
+        }, 200);
+    });
+}
+suggestWhileTyping('nameFilter', 'treeNamesList', 'species');
+suggestWhileTyping('fregFilter', 'fregList', 'parish');
+
 // --- 2. COMBINED FILTER LOGIC ---
 document.getElementById('filterBySpeciesORFraguesiaButton').onclick = function() {
     const speciesVal = document.getElementById('nameFilter').value.trim();